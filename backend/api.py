@@ -0,0 +1,1544 @@
+"""
+REST API: пространства имен Flask-RESTX, маршруты Flask и обработчики
+запросов (метрики, фазы, профилирование). К приложению подключается
+в create_app через init_api.
+"""
+from flask import Blueprint, Response, g, jsonify, request
+from flask_restx import Api, Resource, fields, Namespace
+from datetime import datetime
+import requests
+import os
+import io
+import logging
+import pstats
+import time
+from models import (
+    BazarLog, BazarStatus, db, NotificationFingerprint, NotificationOutbox, TelegramChatId, TelegramSettings,
+    TelegramStatusMessage
+)
+from observability import (
+    current_request_timer, finish_request_timing, get_logging_stats, get_startup_info, http_request_duration,
+    http_requests_total, is_internal_request, item_logger, list_request_profiles, metrics, PROFILE_DIR,
+    PROFILE_ID_PATTERN, profiling_requested, PROFILING_TOKEN, profiling_token_valid, request_path_for_log,
+    request_phase, save_request_profile, SLOW_REQUEST_THRESHOLD, slow_requests, start_request_timing, stop_profile,
+    try_start_profile
+)
+from state import cached_json_response, get_camera_snapshot, get_state_version, response_cache, update_camera_snapshot
+from scheduling import job_scheduler, scheduler_leader
+from probes import aggregate_camera_statistics, fetch_bazar_info, log_status_change, _service_endpoint
+from telegram import (
+    bazar_card_cache, bazar_card_stats, bazars_keyboard_cache, chat_routing_index, check_and_notify_camera_changes,
+    get_bot_tokens, normalize_chat_id, notification_digest, notification_outbox, send_telegram_message,
+    send_telegram_notification, shard_bot_token, status_push_jobs, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN,
+    telegram_delivery, telegram_updates
+)
+from reports import REPORT_FORMATS, REPORT_LABELS, stream_report
+
+logger = logging.getLogger(__name__)
+
+# Swagger документация
+# Отключаем CORS в Flask-RESTX (cors=False), так как используем Flask-CORS
+api = Api(
+    version='1.0',
+    title='Bazar Monitoring API',
+    description='API для мониторинга базаров Узбекистана с автоматическим логированием событий',
+    doc='/docs/',  # Swagger UI будет доступен по /docs/
+    contact='Bazar Monitoring Team',
+    contact_email='admin@bazar-monitoring.uz',
+    license='MIT',
+    license_url='https://opensource.org/licenses/MIT',
+    cors=False  # Отключаем CORS в Flask-RESTX, используем только Flask-CORS
+)
+
+# Маршруты вне Flask-RESTX (статус, статистика, отчеты, /metrics) и обработчики всех запросов
+routes = Blueprint('monitoring', __name__)
+
+_default_output_json = api.representations['application/json']
+
+@api.representation('application/json')
+def output_json_timed(data, code, headers=None):
+    """Сериализация ответов Flask-RESTX - отдельной фазой"""
+    with request_phase('serialization'):
+        return _default_output_json(data, code, headers)
+
+# Swagger модели для документации
+bazar_ns = Namespace('bazars', description='Операции с базарами')
+logs_ns = Namespace('logs', description='Операции с логами')
+services_ns = Namespace('services', description='Управление сервисами')
+admin_ns = Namespace('admin', description='Административные операции')
+telegram_ns = Namespace('telegram', description='Настройки Telegram уведомлений')
+
+api.add_namespace(bazar_ns, path='/api')
+api.add_namespace(logs_ns, path='/api')
+api.add_namespace(services_ns, path='/api')
+api.add_namespace(admin_ns, path='/api')
+api.add_namespace(telegram_ns, path='/api')
+
+# Модели для Swagger
+bazar_model = api.model('Bazar', {
+    'name': fields.String(required=True, description='Название базара'),
+    'city': fields.String(description='Город'),
+    'status': fields.String(enum=['online', 'offline'], description='Статус базара'),
+    'endpoint': fields.Raw(description='Информация об endpoint'),
+    'contact_click': fields.String(description='Контакт Click'),
+    'contact_click_name': fields.String(description='Имя контакта Click'),
+    'contact_scc': fields.String(description='Контакт SCC'),
+    'contact_scc_name': fields.String(description='Имя контакта SCC'),
+    'latitude': fields.Float(description='Широта'),
+    'longitude': fields.Float(description='Долгота'),
+    'timestamp': fields.DateTime(description='Время последней проверки')
+})
+
+bazar_response_model = api.model('BazarResponse', {
+    'success': fields.Boolean(description='Успешность операции'),
+    'data': fields.List(fields.Nested(bazar_model), description='Список базаров'),
+    'total': fields.Integer(description='Общее количество'),
+    'online': fields.Integer(description='Количество онлайн'),
+    'offline': fields.Integer(description='Количество офлайн')
+})
+
+log_model = api.model('Log', {
+    'id': fields.Integer(description='ID записи'),
+    'bazar_name': fields.String(description='Название базара'),
+    'bazar_ip': fields.String(description='IP адрес'),
+    'bazar_port': fields.Integer(description='Порт'),
+    'city': fields.String(description='Город'),
+    'status': fields.String(enum=['online', 'offline'], description='Статус'),
+    'previous_status': fields.String(description='Предыдущий статус'),
+    'error_message': fields.String(description='Сообщение об ошибке'),
+    'timestamp': fields.DateTime(description='Время события')
+})
+
+service_model = api.model('Service', {
+    'name': fields.String(required=True, description='Название сервиса'),
+    'ip': fields.String(required=True, description='IP адрес'),
+    'port': fields.Integer(required=True, description='Порт фронтенда'),
+    'backend_port': fields.Integer(required=True, description='Порт backend API'),
+    'pg_port': fields.Integer(required=True, description='Порт PostgreSQL'),
+    'stream_port': fields.Integer(description='Порт Stream'),
+    'city': fields.String(description='Город'),
+    'contact_click': fields.String(description='Контакт Click (+998XXXXXXXXX)'),
+    'contact_click_name': fields.String(description='Имя контакта Click'),
+    'contact_scc': fields.String(description='Контакт SCC (+998XXXXXXXXX)'),
+    'contact_scc_name': fields.String(description='Имя контакта SCC'),
+    'latitude': fields.Float(description='Широта (например: 41.291173)'),
+    'longitude': fields.Float(description='Долгота (например: 69.274854)')
+})
+
+service_response_model = api.model('ServiceResponse', {
+    'id': fields.Integer(description='ID сервиса'),
+    'name': fields.String(description='Название сервиса'),
+    'ip': fields.String(description='IP адрес'),
+    'port': fields.Integer(description='Порт фронтенда'),
+    'backend_port': fields.Integer(description='Порт backend API'),
+    'pg_port': fields.Integer(description='Порт PostgreSQL'),
+    'stream_port': fields.Integer(description='Порт Stream'),
+    'city': fields.String(description='Город'),
+    'status': fields.String(description='Статус'),
+    'last_online': fields.DateTime(description='Время последнего online'),
+    'last_offline': fields.DateTime(description='Время последнего offline'),
+    'last_check': fields.DateTime(description='Время последней проверки'),
+    'uptime_percentage': fields.Float(description='Процент доступности'),
+    'contact_click': fields.String(description='Контакт Click'),
+    'contact_click_name': fields.String(description='Имя контакта Click'),
+    'contact_scc': fields.String(description='Контакт SCC'),
+    'contact_scc_name': fields.String(description='Имя контакта SCC'),
+    'latitude': fields.Float(description='Широта'),
+    'longitude': fields.Float(description='Долгота')
+})
+
+error_model = api.model('Error', {
+    'success': fields.Boolean(description='Успешность операции'),
+    'error': fields.String(description='Сообщение об ошибке')
+})
+
+def log_admin_action(service, action_type, details=None):
+    """Логировать административное действие (добавление/изменение/удаление сервиса)"""
+    import json
+    
+    log = BazarLog(
+        bazar_name=service.get('name', f"{service['ip']}:{service['port']}"),
+        bazar_ip=service['ip'],
+        bazar_port=service['port'],
+        city=service.get('city', 'Unknown'),
+        status=action_type,  # added/updated/deleted
+        action_type=f'service_{action_type}',
+        action_details=json.dumps(details) if details else None,
+        timestamp=datetime.utcnow()
+    )
+    db.session.add(log)
+    db.session.commit()
+
+def _build_bazar_entry(service, endpoint, status, error=None, timestamp=None):
+    """Сформировать элемент списка /api/bazars (название и город всегда из БД)"""
+    entry = {
+        'id': service.id,
+        'name': service.bazar_name,
+        'city': service.city,
+        'status': status,
+        'endpoint': endpoint,
+        'contact_click': service.contact_click,
+        'contact_click_name': service.contact_click_name,
+        'contact_scc': service.contact_scc,
+        'contact_scc_name': service.contact_scc_name,
+        'latitude': service.latitude,
+        'longitude': service.longitude,
+        'telegram_notifications_enabled': service.telegram_notifications_enabled or False,
+        'timestamp': (timestamp or datetime.utcnow()).isoformat()
+    }
+    if status != 'online':
+        entry['error'] = error
+    return entry
+
+def _bazars_response(results):
+    return {
+        'success': True,
+        'data': results,
+        'total': len(results),
+        'online': len([r for r in results if r['status'] == 'online']),
+        'offline': len([r for r in results if r['status'] == 'offline'])
+    }
+
+def build_bazars_snapshot_payload():
+    """Ответ /api/bazars по данным из БД, без опроса базаров"""
+    services = BazarStatus.query.all()
+    results = [
+        _build_bazar_entry(service, _service_endpoint(service), service.status, timestamp=service.last_check)
+        for service in services
+    ]
+    return _bazars_response(results)
+
+# API Routes
+@bazar_ns.route('/bazars')
+class BazarsResource(Resource):
+    @bazar_ns.doc('get_bazars')
+    @bazar_ns.param('mode', 'live - опросить базары, snapshot - последние сохраненные данные (кэшируется)', enum=['live', 'snapshot'], default='live')
+    def get(self):
+        """Получить статус всех базаров (проверяет напрямую и логирует изменения)"""
+        if request.args.get('mode') == 'snapshot':
+            return cached_json_response('bazars_snapshot', build_bazars_snapshot_payload)
+        
+        try:
+            logger.debug("/api/bazars: probing all services")
+            results = []
+            
+            # Получаем все сервисы из БД
+            try:
+                services = BazarStatus.query.all()
+                logger.debug("Found %s services in database", len(services))
+            except Exception as db_error:
+                logger.error(f"Database error: {db_error}", exc_info=True)
+                return {
+                    'success': False,
+                    'error': f'Database error: {str(db_error)}',
+                    'data': [],
+                    'total': 0,
+                    'online': 0,
+                    'offline': 0
+                }, 500
+            
+            # Если БД пустая, возвращаем пустой список
+            if not services:
+                return {
+                    'success': True,
+                    'data': [],
+                    'total': 0,
+                    'online': 0,
+                    'offline': 0,
+                    'message': 'Нет добавленных сервисов. Используйте админскую панель для добавления.'
+                }
+            
+            with notification_digest():
+                for service in services:
+                    endpoint = _service_endpoint(service)
+                
+                    try:
+                        result = fetch_bazar_info(endpoint)
+                    
+                        if result['success']:
+                            data = result['data']
+                            log_status_change(data, endpoint, 'online')
+                        
+                            # Проверяем изменения камер и отправляем уведомления если нужно
+                            try:
+                                # Получаем статистику камер из ответа
+                                camera_stats = data if isinstance(data, dict) else {}
+                                update_camera_snapshot(service.id, camera_stats)
+                                check_and_notify_camera_changes(service, camera_stats)
+                            except Exception as e:
+                                item_logger.error("Error checking camera changes for %s: %s", service.bazar_name, e, exc_info=True)
+                        
+                            results.append(_build_bazar_entry(service, endpoint, 'online'))
+                        else:
+                            log_status_change(None, endpoint, 'offline', result.get('error'))
+                            update_camera_snapshot(service.id, None)
+                            results.append(_build_bazar_entry(service, endpoint, 'offline', result.get('error')))
+                    except Exception as e:
+                        item_logger.error("Error processing service %s: %s", service.bazar_name, e, exc_info=True)
+                        # В случае ошибки добавляем базар как офлайн
+                        results.append(_build_bazar_entry(service, endpoint, 'offline', str(e)))
+            
+            response_data = _bazars_response(results)
+            logger.debug("Returning response with %s results", len(results))
+            return response_data
+        except Exception as e:
+            logger.error(f"Error in /api/bazars: {e}", exc_info=True)
+            import traceback
+            traceback.print_exc()
+            # Возвращаем словарь - Flask-RESTX автоматически сериализует его
+            return {
+                'success': False,
+                'error': str(e),
+                'data': [],
+                'total': 0,
+                'online': 0,
+                'offline': 0
+            }, 500
+    
+
+@logs_ns.route('/logs')
+class LogsResource(Resource):
+    @logs_ns.doc('get_logs')
+    @logs_ns.param('limit', 'Количество записей', type='integer', default=100)
+    @logs_ns.param('status', 'Фильтр по статусу', enum=['online', 'offline'])
+    def get(self):
+        """Получить все логи"""
+        limit = request.args.get('limit', 100, type=int)
+        status_filter = request.args.get('status', None)
+        
+        query = BazarLog.query
+        
+        if status_filter:
+            query = query.filter_by(status=status_filter)
+        
+        logs = query.order_by(BazarLog.timestamp.desc()).limit(limit).all()
+        
+        return {
+            'success': True,
+            'data': [log.to_dict() for log in logs],
+            'total': len(logs)
+        }
+
+@logs_ns.route('/logs/<ip>/<int:port>')
+class BazarLogsResource(Resource):
+    @logs_ns.doc('get_bazar_logs')
+    @logs_ns.param('ip', 'IP адрес базара')
+    @logs_ns.param('port', 'Порт базара', type='integer')
+    @logs_ns.param('limit', 'Количество записей', type='integer', default=50)
+    def get(self, ip, port):
+        """Получить логи конкретного базара"""
+        limit = request.args.get('limit', 50, type=int)
+        
+        logs = BazarLog.query.filter_by(
+            bazar_ip=ip, 
+            bazar_port=port
+        ).order_by(BazarLog.timestamp.desc()).limit(limit).all()
+        
+        return {
+            'success': True,
+            'data': [log.to_dict() for log in logs],
+            'total': len(logs)
+        }
+
+# Поля BazarStatus.to_dict(), доступные для выборки через ?fields=
+STATUS_FIELDS = (
+    'id', 'name', 'ip', 'port', 'backend_port', 'pg_port', 'stream_port', 'city', 'status',
+    'last_online', 'last_offline', 'last_check', 'uptime_percentage',
+    'contact_click', 'contact_click_name', 'contact_scc', 'contact_scc_name',
+    'latitude', 'longitude', 'telegram_notifications_enabled'
+)
+# Поля с малым числом различных значений - в колоночном формате кодируются словарем
+COLUMNAR_DICTIONARY_FIELDS = ('city', 'status')
+
+def parse_fields_param(value, allowed):
+    """Разобрать параметр ?fields=a,b,c. Возвращает (fields, error)"""
+    if not value:
+        return list(allowed), None
+    fields_list = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields_list if f not in allowed]
+    if unknown:
+        return None, f"Неизвестные поля: {', '.join(unknown)}. Доступные: {', '.join(allowed)}"
+    return fields_list, None
+
+def to_columnar(rows, fields_list):
+    """Преобразовать список словарей в колонки (по массиву на поле).
+
+    Поля из COLUMNAR_DICTIONARY_FIELDS заменяются индексами в словаре значений.
+    """
+    columns = {}
+    dictionaries = {}
+    for field in fields_list:
+        if field in COLUMNAR_DICTIONARY_FIELDS:
+            dictionary = []
+            codes = {}
+            column = []
+            for row in rows:
+                value = row.get(field)
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(dictionary)
+                    dictionary.append(value)
+                column.append(code)
+            columns[field] = column
+            dictionaries[field] = dictionary
+        else:
+            columns[field] = [row.get(field) for row in rows]
+    return columns, dictionaries
+
+def build_status_payload():
+    bazars = BazarStatus.query.all()
+    rows = [bazar.to_dict() for bazar in bazars]
+    fields_list, _ = parse_fields_param(request.args.get('fields'), STATUS_FIELDS)
+    
+    if request.args.get('format') == 'columnar':
+        columns, dictionaries = to_columnar(rows, fields_list)
+        return {
+            'success': True,
+            'format': 'columnar',
+            'fields': fields_list,
+            'columns': columns,
+            'dictionaries': dictionaries,
+            'total': len(rows)
+        }
+    
+    if request.args.get('fields'):
+        rows = [{field: row[field] for field in fields_list} for row in rows]
+    return {
+        'success': True,
+        'data': rows,
+        'total': len(rows)
+    }
+
+@routes.route('/api/status', methods=['GET'])
+def get_status():
+    """Получить текущий статус всех базаров из БД
+
+    ?fields=id,latitude,longitude,status - вернуть только указанные поля
+    ?format=columnar - по массиву на поле, city/status кодируются словарем
+    """
+    _, error = parse_fields_param(request.args.get('fields'), STATUS_FIELDS)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    if request.args.get('format', 'rows') not in ('rows', 'columnar'):
+        return jsonify({'success': False, 'error': 'format должен быть rows или columnar'}), 400
+    return cached_json_response('status', build_status_payload)
+
+@routes.route('/api/statistics', methods=['GET'])
+def get_statistics():
+    """Получить статистику"""
+    total_bazars = BazarStatus.query.count()
+    online_bazars = BazarStatus.query.filter_by(status='online').count()
+    offline_bazars = BazarStatus.query.filter_by(status='offline').count()
+    
+    # Последние изменения статуса
+    recent_changes = BazarLog.query.order_by(BazarLog.timestamp.desc()).limit(10).all()
+    
+    # Подсчет проблемных базаров
+    problem_bazars = BazarLog.query.filter_by(status='offline').group_by(
+        BazarLog.bazar_ip, BazarLog.bazar_port
+    ).all()
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'total': total_bazars,
+            'online': online_bazars,
+            'offline': offline_bazars,
+            'uptime_percentage': (online_bazars / total_bazars * 100) if total_bazars > 0 else 0,
+            'recent_changes': [log.to_dict() for log in recent_changes],
+            'problem_count': len(problem_bazars)
+        }
+    })
+
+def build_camera_statistics_snapshot_payload():
+    """Статистика камер по последнему снимку, без опроса базаров"""
+    services = BazarStatus.query.all()
+    stats_by_service = {}
+    for service in services:
+        snapshot = get_camera_snapshot(service.id)
+        stats_by_service[service.id] = snapshot['stats'] if snapshot else None
+    return {
+        'success': True,
+        'data': aggregate_camera_statistics(services, stats_by_service)
+    }
+
+@routes.route('/api/cameras/statistics', methods=['GET'])
+def get_cameras_statistics():
+    """Получить общую статистику по камерам всех базаров"""
+    if request.args.get('mode') == 'snapshot':
+        return cached_json_response('cameras_statistics_snapshot', build_camera_statistics_snapshot_payload)
+    
+    try:
+        # Получаем все сервисы из БД
+        services = BazarStatus.query.all()
+        stats_by_service = {}
+        
+        # Собираем статистику по каждому базару
+        with notification_digest():
+            for service in services:
+                stats = None
+                try:
+                    # Проверяем доступность API камер
+                    camera_api_url = f"http://{service.bazar_ip}:{service.backend_port}/api/cameras/statistics"
+                
+                    with request_phase('network'):
+                        response = requests.get(camera_api_url, timeout=3)
+                
+                    if response.ok:
+                        stats = response.json()
+                    
+                        # Проверяем изменения камер и отправляем уведомления если нужно
+                        check_and_notify_camera_changes(service, stats)
+                    
+                except Exception as e:
+                    item_logger.error("Ошибка получения статистики камер для %s: %s", service.bazar_name, e, exc_info=True)
+            
+                stats_by_service[service.id] = stats
+                update_camera_snapshot(service.id, stats)
+        
+        data = aggregate_camera_statistics(services, stats_by_service)
+        with request_phase('serialization'):
+            return jsonify({
+                'success': True,
+                'data': data
+            })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@routes.route('/api/reports/export', methods=['GET'])
+def export_report():
+    """Скачать отчет по базарам (?format=xlsx|csv, ?lang=ru|uz)"""
+    export_format = request.args.get('format', 'xlsx')
+    lang = request.args.get('lang', 'ru')
+    if export_format not in REPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'format должен быть xlsx или csv'}), 400
+    if lang not in REPORT_LABELS:
+        return jsonify({'success': False, 'error': 'lang должен быть ru или uz'}), 400
+    
+    render, mimetype = REPORT_FORMATS[export_format]
+    file_name = f"bazar_statistics_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')}_{lang}.{export_format}"
+    response = Response(stream_report(render, lang), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@services_ns.route('/services')
+class ServicesResource(Resource):
+    @services_ns.doc('get_services')
+    def get(self):
+        """Получить список всех сервисов из БД"""
+        services = BazarStatus.query.all()
+        return {
+            'success': True,
+            'data': [service.to_dict() for service in services],
+            'total': len(services)
+        }
+
+    @services_ns.doc('add_service')
+    @services_ns.expect(service_model)
+    @services_ns.marshal_with(service_response_model, code=201)
+    @services_ns.marshal_with(error_model, code=400)
+    def post(self):
+        """Добавить новый сервис"""
+        try:
+            data = request.get_json()
+            
+            # Проверяем обязательные поля
+            required_fields = ['ip', 'port', 'backend_port', 'pg_port']
+            for field in required_fields:
+                if field not in data:
+                    return {
+                        'success': False,
+                        'error': f'Поле {field} обязательно'
+                    }, 400
+            
+            # Проверяем что сервис с таким IP:port не существует
+            existing = BazarStatus.query.filter_by(
+                bazar_ip=data['ip'],
+                bazar_port=data['port']
+            ).first()
+            
+            if existing:
+                return {
+                    'success': False,
+                    'error': f'Сервис {data["ip"]}:{data["port"]} уже существует'
+                }, 409
+            
+            # Создаем новый сервис
+            new_service = BazarStatus(
+                bazar_name=data.get('name', f"{data['ip']}:{data['port']}"),
+                bazar_ip=data['ip'],
+                bazar_port=data['port'],
+                backend_port=data['backend_port'],
+                pg_port=data['pg_port'],
+                stream_port=data.get('stream_port'),
+                city=data.get('city', 'Unknown'),
+                contact_click=data.get('contact_click'),
+                contact_click_name=data.get('contact_click_name'),
+                contact_scc=data.get('contact_scc'),
+                contact_scc_name=data.get('contact_scc_name'),
+                latitude=data.get('latitude'),
+                longitude=data.get('longitude'),
+                status='offline',
+                last_check=datetime.utcnow(),
+                last_offline=datetime.utcnow()
+            )
+            
+            db.session.add(new_service)
+            db.session.commit()
+            
+            # Логируем добавление сервиса
+            log_admin_action(
+                service={
+                    'name': new_service.bazar_name,
+                    'ip': new_service.bazar_ip,
+                    'port': new_service.bazar_port,
+                    'city': new_service.city
+                },
+                action_type='added',
+                details={
+                    'backend_port': new_service.backend_port,
+                    'pg_port': new_service.pg_port
+                }
+            )
+            
+            return new_service.to_dict(), 201
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@services_ns.route('/services/<int:service_id>')
+class ServiceResource(Resource):
+    @services_ns.doc('update_service')
+    @services_ns.expect(service_model)
+    def put(self, service_id):
+        """Обновить сервис"""
+        try:
+            service = BazarStatus.query.get_or_404(service_id)
+            data = request.get_json()
+            
+            # Сохраняем старые значения для логирования
+            old_values = {
+                'name': service.bazar_name,
+                'city': service.city,
+                'backend_port': service.backend_port,
+                'pg_port': service.pg_port,
+                'stream_port': service.stream_port,
+                'contact_click': service.contact_click,
+                'contact_click_name': service.contact_click_name,
+                'contact_scc': service.contact_scc,
+                'contact_scc_name': service.contact_scc_name,
+                'latitude': service.latitude,
+                'longitude': service.longitude
+            }
+            
+            # Обновляем поля
+            changes = {}
+            if 'name' in data and data['name'] != service.bazar_name:
+                changes['name'] = {'old': service.bazar_name, 'new': data['name']}
+                service.bazar_name = data['name']
+            if 'city' in data and data['city'] != service.city:
+                changes['city'] = {'old': service.city, 'new': data['city']}
+                service.city = data['city']
+            if 'ip' in data and data['ip'] != service.bazar_ip:
+                changes['ip'] = {'old': service.bazar_ip, 'new': data['ip']}
+                service.bazar_ip = data['ip']
+            if 'port' in data and data['port'] != service.bazar_port:
+                changes['port'] = {'old': service.bazar_port, 'new': data['port']}
+                service.bazar_port = data['port']
+            if 'backend_port' in data and data['backend_port'] != service.backend_port:
+                changes['backend_port'] = {'old': service.backend_port, 'new': data['backend_port']}
+                service.backend_port = data['backend_port']
+            if 'pg_port' in data and data['pg_port'] != service.pg_port:
+                changes['pg_port'] = {'old': service.pg_port, 'new': data['pg_port']}
+                service.pg_port = data['pg_port']
+            if 'stream_port' in data and data['stream_port'] != service.stream_port:
+                changes['stream_port'] = {'old': service.stream_port, 'new': data['stream_port']}
+                service.stream_port = data['stream_port']
+            
+            # Обновляем контакты
+            if 'contact_click' in data:
+                new_val = data['contact_click']
+                if new_val != service.contact_click:
+                    changes['contact_click'] = {'old': service.contact_click, 'new': new_val}
+                    service.contact_click = new_val
+            if 'contact_click_name' in data:
+                new_val = data['contact_click_name']
+                if new_val != service.contact_click_name:
+                    changes['contact_click_name'] = {'old': service.contact_click_name, 'new': new_val}
+                    service.contact_click_name = new_val
+            if 'contact_scc' in data:
+                new_val = data['contact_scc']
+                if new_val != service.contact_scc:
+                    changes['contact_scc'] = {'old': service.contact_scc, 'new': new_val}
+                    service.contact_scc = new_val
+            if 'contact_scc_name' in data:
+                new_val = data['contact_scc_name']
+                if new_val != service.contact_scc_name:
+                    changes['contact_scc_name'] = {'old': service.contact_scc_name, 'new': new_val}
+                    service.contact_scc_name = new_val
+            
+            # Обновляем координаты
+            if 'latitude' in data:
+                new_val = data['latitude']
+                if new_val != service.latitude:
+                    changes['latitude'] = {'old': service.latitude, 'new': new_val}
+                    service.latitude = new_val
+            if 'longitude' in data:
+                new_val = data['longitude']
+                if new_val != service.longitude:
+                    changes['longitude'] = {'old': service.longitude, 'new': new_val}
+                    service.longitude = new_val
+            
+            # Обновляем настройки Telegram уведомлений
+            if 'telegram_notifications_enabled' in data:
+                service.telegram_notifications_enabled = bool(data['telegram_notifications_enabled'])
+            
+            service.last_check = datetime.utcnow()
+            db.session.commit()
+            
+            # Логируем изменение сервиса
+            if changes:
+                log_admin_action(
+                    service={
+                        'name': service.bazar_name,
+                        'ip': service.bazar_ip,
+                        'port': service.bazar_port,
+                        'city': service.city
+                    },
+                    action_type='updated',
+                    details={'changes': changes}
+                )
+            
+            return {
+                'success': True,
+                'message': f'Сервис {service.bazar_ip}:{service.bazar_port} обновлен',
+                'data': service.to_dict()
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+    @services_ns.doc('delete_service')
+    def delete(self, service_id):
+        """Удалить сервис"""
+        try:
+            service = BazarStatus.query.get_or_404(service_id)
+            service_info = f"{service.bazar_ip}:{service.bazar_port}"
+            
+            # Сохраняем информацию для логирования перед удалением
+            service_data = {
+                'name': service.bazar_name,
+                'ip': service.bazar_ip,
+                'port': service.bazar_port,
+                'city': service.city
+            }
+            
+            # Логируем удаление сервиса ПЕРЕД удалением
+            log_admin_action(
+                service=service_data,
+                action_type='deleted',
+                details={
+                    'backend_port': service.backend_port,
+                    'pg_port': service.pg_port,
+                    'last_status': service.status
+                }
+            )
+            
+            # Удаляем старые логи статуса (но НЕ лог удаления)
+            BazarLog.query.filter(
+                BazarLog.bazar_ip == service.bazar_ip,
+                BazarLog.bazar_port == service.bazar_port,
+                BazarLog.action_type == 'status_change'
+            ).delete()
+            
+            # Удаляем статусные сообщения этого базара в чатах
+            TelegramStatusMessage.query.filter_by(scope='bazar', scope_key=str(service.id)).delete()
+            
+            # Удаляем сам сервис
+            db.session.delete(service)
+            db.session.commit()
+            
+            return {
+                'success': True,
+                'message': f'Сервис {service_info} удален'
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+
+@telegram_ns.route('/telegram/setup')
+class TelegramSetupResource(Resource):
+    @telegram_ns.doc('setup_telegram')
+    @telegram_ns.expect(api.model('TelegramSetup', {
+        'bot_token': fields.String(required=True, description='Токен Telegram бота'),
+        'extra_bot_tokens': fields.List(fields.String(), description='Дополнительные токены ботов для рассылки уведомлений (опционально)'),
+        'chat_id': fields.String(description='Chat ID для отправки уведомлений (опционально)')
+    }))
+    def post(self):
+        """Настроить Telegram бота для уведомлений"""
+        try:
+            data = request.json
+            bot_token = data.get('bot_token')
+            chat_id = data.get('chat_id')
+            
+            if not bot_token:
+                return {
+                    'success': False,
+                    'error': 'Токен бота обязателен'
+                }, 400
+            
+            # Проверяем, есть ли уже настройки
+            telegram_settings = TelegramSettings.query.first()
+            
+            if telegram_settings:
+                # Обновляем существующие настройки
+                telegram_settings.bot_token = bot_token
+                if chat_id:
+                    telegram_settings.chat_id = chat_id
+                if 'extra_bot_tokens' in data:
+                    telegram_settings.set_extra_bot_tokens(data['extra_bot_tokens'])
+                telegram_settings.enabled = True
+                telegram_settings.updated_at = datetime.utcnow()
+            else:
+                # Создаем новые настройки
+                telegram_settings = TelegramSettings(
+                    bot_token=bot_token,
+                    chat_id=chat_id,
+                    enabled=True
+                )
+                telegram_settings.set_extra_bot_tokens(data.get('extra_bot_tokens'))
+                db.session.add(telegram_settings)
+            
+            db.session.commit()
+            
+            return {
+                'success': True,
+                'message': 'Настройки Telegram бота сохранены',
+                'data': telegram_settings.to_dict()
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+    @telegram_ns.doc('get_telegram_settings')
+    def get(self):
+        """Получить настройки Telegram бота"""
+        try:
+            telegram_settings = TelegramSettings.query.first()
+            
+            if not telegram_settings:
+                return {
+                    'success': True,
+                    'data': None,
+                    'message': 'Настройки Telegram не найдены'
+                }
+            
+            return {
+                'success': True,
+                'data': telegram_settings.to_dict()
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@telegram_ns.route('/telegram/chat-ids')
+class TelegramChatIdsResource(Resource):
+    @telegram_ns.doc('get_telegram_chat_ids')
+    def get(self):
+        """Получить список всех chat ID для уведомлений"""
+        try:
+            chat_ids = TelegramChatId.query.order_by(TelegramChatId.created_at.desc()).all()
+            return {
+                'success': True,
+                'data': [chat.to_dict() for chat in chat_ids]
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+    
+    @telegram_ns.doc('add_telegram_chat_id')
+    @telegram_ns.expect(api.model('TelegramChatId', {
+        'chat_id': fields.String(required=True, description='Chat ID (только числовой ID, например: -1001234567890 или 123456789)'),
+        'chat_type': fields.String(enum=['channel', 'group', 'user'], description='Тип чата', default='channel'),
+        'description': fields.String(description='Описание (например, "Основной канал")'),
+        'allowed_regions': fields.List(fields.String(), description='Список разрешенных областей (если пусто - все области)')
+    }))
+    def post(self):
+        """Добавить новый chat ID для уведомлений"""
+        try:
+            data = request.json
+            chat_id = data.get('chat_id')
+            chat_type = data.get('chat_type', 'channel')
+            description = data.get('description', '')
+            allowed_regions = data.get('allowed_regions', [])
+            
+            if not chat_id:
+                return {
+                    'success': False,
+                    'error': 'Chat ID обязателен'
+                }, 400
+            
+            # Проверяем, что это числовой ID (не username)
+            chat_id_str = str(chat_id).strip()
+            if chat_id_str.startswith('@') or not (chat_id_str.startswith('-') or chat_id_str.lstrip('-').isdigit()):
+                return {
+                    'success': False,
+                    'error': 'Поддерживаются только числовые Chat ID. Username не поддерживаются. Получите числовой Chat ID через бота или используйте @userinfobot в Telegram'
+                }, 400
+            
+            # Нормализуем chat_id (только числовые ID)
+            normalized_chat_id = normalize_chat_id(chat_id)
+            if not normalized_chat_id:
+                return {
+                    'success': False,
+                    'error': 'Некорректный Chat ID. Используйте только числовые ID'
+                }, 400
+            
+            # Проверяем, не существует ли уже такой chat ID
+            existing = TelegramChatId.query.filter_by(chat_id=normalized_chat_id).first()
+            if existing:
+                return {
+                    'success': False,
+                    'error': 'Такой chat ID уже существует'
+                }, 400
+            
+            # Создаем новый chat ID (используем нормализованный числовой ID)
+            new_chat = TelegramChatId(
+                chat_id=normalized_chat_id,
+                chat_type=chat_type,
+                description=description,
+                enabled=True
+            )
+            new_chat.set_allowed_regions(allowed_regions if allowed_regions else None)
+            db.session.add(new_chat)
+            db.session.commit()
+            chat_routing_index.invalidate()
+            
+            # Текущее состояние базаров отправляется в новый chat ID фоновой задачей
+            status_job_id = status_push_jobs.submit(new_chat.id)
+            
+            return {
+                'success': True,
+                'message': 'Chat ID добавлен',
+                'data': new_chat.to_dict(),
+                'status_job_id': status_job_id
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@telegram_ns.route('/telegram/chat-ids/<int:chat_id_id>')
+class TelegramChatIdResource(Resource):
+    @telegram_ns.doc('update_telegram_chat_id')
+    @telegram_ns.expect(api.model('TelegramChatIdUpdate', {
+        'enabled': fields.Boolean(description='Включен/выключен'),
+        'description': fields.String(description='Описание'),
+        'allowed_regions': fields.List(fields.String(), description='Список разрешенных областей (если пусто - все области)')
+    }))
+    def put(self, chat_id_id):
+        """Обновить chat ID"""
+        try:
+            chat = TelegramChatId.query.get_or_404(chat_id_id)
+            data = request.json
+            
+            # Запоминаем предыдущее состояние enabled
+            was_enabled = chat.enabled
+            
+            if 'enabled' in data:
+                chat.enabled = bool(data['enabled'])
+            if 'description' in data:
+                chat.description = data['description']
+            if 'allowed_regions' in data:
+                regions = data['allowed_regions']
+                chat.set_allowed_regions(regions if regions else None)
+            
+            chat.updated_at = datetime.utcnow()
+            db.session.commit()
+            chat_routing_index.invalidate()
+            
+            # Если chat ID был включен (был выключен, а теперь включен), отправляем текущее состояние в фоне
+            status_job_id = None
+            if not was_enabled and chat.enabled:
+                status_job_id = status_push_jobs.submit(chat.id)
+            
+            return {
+                'success': True,
+                'message': 'Chat ID обновлен',
+                'data': chat.to_dict(),
+                'status_job_id': status_job_id
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+    
+    @telegram_ns.doc('delete_telegram_chat_id')
+    def delete(self, chat_id_id):
+        """Удалить chat ID"""
+        try:
+            chat = TelegramChatId.query.get_or_404(chat_id_id)
+            TelegramStatusMessage.query.filter_by(chat_row_id=chat.id).delete()
+            NotificationOutbox.query.filter_by(chat_row_id=chat.id).delete()
+            NotificationFingerprint.query.filter_by(chat_row_id=chat.id).delete()
+            db.session.delete(chat)
+            db.session.commit()
+            chat_routing_index.invalidate()
+            
+            return {
+                'success': True,
+                'message': 'Chat ID удален'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@telegram_ns.route('/telegram/status-jobs/<string:job_id>')
+class TelegramStatusJobResource(Resource):
+    @telegram_ns.doc('get_telegram_status_job')
+    def get(self, job_id):
+        """Состояние фоновой отправки текущего состояния в chat ID"""
+        job = status_push_jobs.get(job_id)
+        if job is None:
+            return {
+                'success': False,
+                'error': 'Задача не найдена'
+            }, 404
+        return {
+            'success': True,
+            'data': job
+        }
+
+@telegram_ns.route('/telegram/webhook')
+class TelegramWebhookResource(Resource):
+    @telegram_ns.doc('telegram_webhook')
+    def post(self):
+        """Webhook для обработки сообщений от Telegram бота
+
+        Обновление ставится в очередь и обрабатывается в фоне, ответ отправляется сразу.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+            return {'ok': False, 'error': 'Invalid update'}, 400
+        
+        if telegram_updates.submit(data) == 'dropped':
+            # Telegram повторит доставку позже
+            return {'ok': False, 'error': 'Update queue is full'}, 503
+        return {'ok': True}
+
+@telegram_ns.route('/telegram/set-webhook')
+class TelegramSetWebhookResource(Resource):
+    @telegram_ns.doc('set_telegram_webhook')
+    def post(self):
+        """Настроить webhook для Telegram бота"""
+        try:
+            data = request.json
+            webhook_url = data.get('webhook_url')
+            
+            if not webhook_url:
+                return {
+                    'success': False,
+                    'error': 'URL webhook обязателен'
+                }, 400
+            
+            # Получаем токен бота
+            bot_token = TELEGRAM_BOT_TOKEN
+            if not bot_token:
+                telegram_settings = TelegramSettings.query.filter_by(enabled=True).first()
+                if telegram_settings:
+                    bot_token = telegram_settings.bot_token
+            
+            if not bot_token:
+                return {
+                    'success': False,
+                    'error': 'Bot token not configured'
+                }, 400
+            
+            # Устанавливаем webhook
+            url = f"{TELEGRAM_API_URL}/bot{bot_token}/setWebhook"
+            params = {
+                'url': webhook_url
+            }
+            
+            response = requests.post(url, json=params, timeout=5)
+            
+            if response.ok:
+                result = response.json()
+                return {
+                    'success': True,
+                    'message': 'Webhook установлен',
+                    'data': result
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': response.text
+                }, 400
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@telegram_ns.route('/telegram/test')
+class TelegramTestResource(Resource):
+    @telegram_ns.doc('test_telegram')
+    def post(self):
+        """Отправить тестовое сообщение в Telegram (во все настроенные chat ID)"""
+        try:
+            logger.info("Test Telegram notification endpoint called")
+            # Используем статичный bot token
+            bot_token = TELEGRAM_BOT_TOKEN
+            logger.debug(f"Bot token present: {bool(bot_token)}")
+            
+            # Если статичный токен не задан, пытаемся получить из БД
+            if not bot_token:
+                telegram_settings = TelegramSettings.query.filter_by(enabled=True).first()
+                if not telegram_settings or not telegram_settings.bot_token:
+                    return {
+                        'success': False,
+                        'error': 'Telegram бот не настроен'
+                    }, 400
+                bot_token = telegram_settings.bot_token
+            
+            if not bot_token:
+                return {
+                    'success': False,
+                    'error': 'Telegram бот не настроен'
+                }, 400
+            
+            # Получаем все активные chat ID из БД
+            telegram_chats = TelegramChatId.query.filter_by(enabled=True).all()
+            if not telegram_chats:
+                return {
+                    'success': False,
+                    'error': 'Нет настроенных Chat ID. Добавьте Chat ID через UI.'
+                }, 400
+            
+            chat_ids = [chat.chat_id for chat in telegram_chats]
+            
+            # Отправляем тестовое сообщение во все настроенные chat ID
+            message = "✅ *Тестовое уведомление*\n\nЭто тестовое сообщение от системы мониторинга базаров."
+            success_count = 0
+            errors = []
+            
+            logger.info(f"Attempting to send test message to {len(chat_ids)} chat ID(s): {chat_ids}")
+            # Каждый чат проверяем через бота, за которым он закреплен в пуле токенов
+            bot_tokens = get_bot_tokens()
+            for chat_id in chat_ids:
+                logger.debug(f"Attempting to send test message to chat_id: {chat_id}")
+                success, message_id, error_detail = send_telegram_message(shard_bot_token(chat_id, bot_tokens), chat_id, message)
+                if success:
+                    success_count += 1
+                    logger.info(f"Successfully sent to {chat_id}")
+                else:
+                    error_msg = f"Failed to send to {chat_id}"
+                    if error_detail:
+                        error_msg += f": {error_detail}"
+                    errors.append(error_msg)
+                    logger.error(f"Failed to send to {chat_id}: {error_detail}")
+            
+            if success_count > 0:
+                return {
+                    'success': True,
+                    'message': f'Тестовое сообщение отправлено в {success_count} из {len(chat_ids)} chat ID',
+                    'sent_to': success_count,
+                    'total': len(chat_ids),
+                    'errors': errors if errors else None
+                }
+            else:
+                error_details = ", ".join(errors) if errors else "Неизвестная ошибка"
+                return {
+                    'success': False,
+                    'error': f'Не удалось отправить сообщение ни в один chat ID. Ошибки: {error_details}',
+                    'chat_ids_attempted': chat_ids,
+                    'errors': errors
+                }, 400
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@telegram_ns.route('/telegram/delivery/stats')
+class TelegramDeliveryStatsResource(Resource):
+    @telegram_ns.doc('get_telegram_delivery_stats')
+    def get(self):
+        """Состояние очереди доставки Telegram (в очереди, отправлено, повторы, 429) и обработки webhook"""
+        return {
+            'success': True,
+            'data': dict(
+                telegram_delivery.get_stats(),
+                routing_index=chat_routing_index.stats(),
+                outbox=notification_outbox.get_stats(),
+                webhook=telegram_updates.get_stats()
+            )
+        }
+
+@services_ns.route('/services/<int:service_id>/telegram-notifications')
+class ServiceTelegramNotificationsResource(Resource):
+    @services_ns.doc('toggle_telegram_notifications')
+    @services_ns.expect(api.model('TelegramNotificationsToggle', {
+        'enabled': fields.Boolean(required=True, description='Включить/выключить уведомления')
+    }))
+    def put(self, service_id):
+        """Включить/выключить Telegram уведомления для конкретного базара"""
+        try:
+            service = BazarStatus.query.get_or_404(service_id)
+            data = request.json
+            enabled = data.get('enabled', False)
+            check_interval = data.get('check_interval')  # Опциональный интервал проверки в секундах
+            
+            # Проверяем наличие токена и chat ID перед включением
+            if enabled:
+                bot_token = TELEGRAM_BOT_TOKEN
+                
+                if not bot_token:
+                    telegram_settings = TelegramSettings.query.filter_by(enabled=True).first()
+                    if telegram_settings:
+                        bot_token = telegram_settings.bot_token
+                
+                # Проверяем наличие активных chat ID в БД
+                telegram_chats = TelegramChatId.query.filter_by(enabled=True).all()
+                if not bot_token:
+                    return {
+                        'success': False,
+                        'error': 'Telegram bot token не настроен. Проверьте настройки бота.'
+                    }, 400
+                
+                if not telegram_chats:
+                    return {
+                        'success': False,
+                        'error': 'Нет настроенных Chat ID. Добавьте Chat ID через UI перед включением уведомлений.'
+                    }, 400
+            
+            service.telegram_notifications_enabled = bool(enabled)
+            
+            # Устанавливаем интервал проверки если указан
+            if check_interval is not None:
+                service.notification_check_interval = int(check_interval)
+            
+            db.session.commit()
+            
+            # Если уведомления включены, сразу проверяем статус камер и отправляем уведомление
+            if enabled:
+                try:
+                    # Получаем статистику камер
+                    endpoint = {
+                        'ip': service.bazar_ip,
+                        'port': service.bazar_port,
+                        'backendPort': service.backend_port,
+                        'pgPort': service.pg_port
+                    }
+                    
+                    result = fetch_bazar_info(endpoint)
+                    if result['success']:
+                        camera_stats = result['data'] if isinstance(result['data'], dict) else {}
+                        offline_cameras = camera_stats.get('offlineCameras', 0)
+                        total_cameras = camera_stats.get('totalCameras', 0)
+                        online_cameras = camera_stats.get('onlineCameras', 0)
+                        
+                        # Отправляем текущую статистику
+                        if total_cameras > 0:
+                            notification_type = 'offline' if offline_cameras > 0 else 'online'
+                            # Вычисляем время до следующего уведомления (только для офлайн)
+                            next_notification_in = None
+                            if notification_type == 'offline':
+                                check_interval = service.notification_check_interval or 3600
+                                next_notification_in = check_interval
+                            
+                            send_telegram_notification(
+                                service.bazar_name,
+                                service.city,
+                                offline_cameras,
+                                total_cameras,
+                                notification_type,
+                                service=service,
+                                next_notification_in=next_notification_in
+                            )
+                            
+                            # Обновляем счетчики
+                            service.last_offline_cameras_count = offline_cameras
+                            service.last_notification_time = datetime.utcnow()
+                            db.session.commit()
+                except Exception as e:
+                    logger.error(f"Error sending initial notification: {e}", exc_info=True)
+                    # Не блокируем включение уведомлений из-за ошибки отправки
+            
+            return {
+                'success': True,
+                'message': f'Уведомления для {service.bazar_name} {"включены" if enabled else "выключены"}',
+                'data': service.to_dict()
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@admin_ns.route('/cache/stats')
+class CacheStatsResource(Resource):
+    @admin_ns.doc('get_cache_stats')
+    def get(self):
+        """Метрики кэша готовых ответов (попадания, промахи, инвалидации)"""
+        return {
+            'success': True,
+            'data': {
+                'state_version': get_state_version(),
+                'response_cache': response_cache.stats(),
+                'bazar_card_cache': dict(bazar_card_cache.stats(), **bazar_card_stats),
+                'bazars_keyboard_cache': bazars_keyboard_cache.stats()
+            }
+        }
+
+@admin_ns.route('/scheduler/lease')
+class SchedulerLeaseResource(Resource):
+    @admin_ns.doc('get_scheduler_lease')
+    def get(self):
+        """Владелец фонового планировщика и состояние аренды этого процесса"""
+        try:
+            return {
+                'success': True,
+                'data': scheduler_leader.get_stats()
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }, 500
+
+@admin_ns.route('/scheduler/jobs')
+class SchedulerJobsResource(Resource):
+    @admin_ns.doc('get_scheduler_jobs')
+    def get(self):
+        """Фоновые задачи процесса: расписание, длительность и задержка последнего запуска"""
+        return {
+            'success': True,
+            'data': job_scheduler.get_stats()
+        }
+
+@admin_ns.route('/logging/stats')
+class LoggingStatsResource(Resource):
+    @admin_ns.doc('get_logging_stats')
+    def get(self):
+        """Настройки логирования процесса, очередь записей, отброшенные и прореженные записи"""
+        return {
+            'success': True,
+            'data': get_logging_stats()
+        }
+
+def _require_profiling_token():
+    """None, если токен профилирования верный, иначе ответ с ошибкой"""
+    if not PROFILING_TOKEN:
+        return {'success': False, 'error': 'Профилирование выключено (PROFILING_TOKEN не задан)'}, 404
+    if not profiling_token_valid(request.headers.get('X-Profile-Token') or request.args.get('token')):
+        return {'success': False, 'error': 'Неверный токен профилирования'}, 403
+    return None
+
+@admin_ns.route('/profiling/slow-requests')
+class SlowRequestsResource(Resource):
+    @admin_ns.doc('get_slow_requests')
+    def get(self):
+        """Последние медленные запросы с разбивкой времени по фазам"""
+        return {
+            'success': True,
+            'threshold_ms': SLOW_REQUEST_THRESHOLD * 1000,
+            'data': list(reversed(slow_requests))
+        }
+
+@admin_ns.route('/profiling/profiles')
+class RequestProfilesResource(Resource):
+    @admin_ns.doc('list_request_profiles')
+    @admin_ns.param('token', 'PROFILING_TOKEN (или заголовок X-Profile-Token)')
+    def get(self):
+        """Сохраненные профили запросов"""
+        error = _require_profiling_token()
+        if error:
+            return error
+        return {'success': True, 'data': list_request_profiles()}
+
+@admin_ns.route('/profiling/profiles/<profile_id>')
+class RequestProfileResource(Resource):
+    @admin_ns.doc('get_request_profile')
+    @admin_ns.param('token', 'PROFILING_TOKEN (или заголовок X-Profile-Token)')
+    @admin_ns.param('format', 'prof - файл для pstats/snakeviz, text - отчет pstats', enum=['prof', 'text'], default='prof')
+    @admin_ns.param('sort', 'Сортировка отчета text', default='cumulative')
+    @admin_ns.param('limit', 'Строк в отчете text', type='integer', default=50)
+    def get(self, profile_id):
+        """Скачать профиль запроса"""
+        error = _require_profiling_token()
+        if error:
+            return error
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+        if not PROFILE_ID_PATTERN.match(profile_id) or not os.path.exists(path):
+            return {'success': False, 'error': 'Профиль не найден'}, 404
+        if request.args.get('format') == 'text':
+            output = io.StringIO()
+            try:
+                stats = pstats.Stats(path, stream=output)
+                stats.sort_stats(request.args.get('sort', 'cumulative'))
+            except (KeyError, ValueError) as e:
+                return {'success': False, 'error': f'Неверная сортировка: {e}'}, 400
+            stats.print_stats(request.args.get('limit', 50, type=int))
+            return Response(output.getvalue(), content_type='text/plain; charset=utf-8')
+        with open(path, 'rb') as f:
+            data = f.read()
+        response = Response(data, content_type='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename="{profile_id}.prof"'
+        return response
+
+@api.route('/health', '/api/health')
+class HealthResource(Resource):
+    @api.doc('health_check')
+    def get(self):
+        """Проверка работоспособности API и время готовности процесса"""
+        return {
+            'success': True,
+            'message': 'Bazar Monitoring API is running',
+            'timestamp': datetime.utcnow().isoformat(),
+            'startup': get_startup_info()
+        }
+
+@api.route('/')
+class IndexResource(Resource):
+    @api.doc('api_info')
+    def get(self):
+        """Информация об API"""
+        return {
+            'name': 'Bazar Monitoring API',
+            'version': '1.0',
+            'description': 'API для мониторинга базаров Узбекистана',
+            'swagger_docs': '/docs/',
+            'endpoints': {
+                '/api/bazars': 'GET: Получить статус всех базаров',
+                '/api/logs': 'GET: Получить все логи',
+                '/api/logs/<ip>/<port>': 'GET: Получить логи конкретного базара',
+                '/api/status': 'GET: Получить текущий статус из БД',
+                '/api/statistics': 'GET: Получить статистику',
+                '/api/services': 'GET: получить все сервисы, POST: добавить сервис',
+                '/api/services/<id>': 'PUT: обновить сервис, DELETE: удалить сервис',
+                '/api/cache/stats': 'GET: Метрики кэша ответов',
+                '/api/scheduler/lease': 'GET: Владелец фонового планировщика',
+                '/api/scheduler/jobs': 'GET: Фоновые задачи и их статистика',
+                '/api/logging/stats': 'GET: Очередь и прореживание логов',
+                '/api/profiling/slow-requests': 'GET: Последние медленные запросы по фазам',
+                '/api/profiling/profiles': 'GET: Профили запросов (нужен PROFILING_TOKEN)',
+                '/metrics': 'GET: Метрики в формате Prometheus',
+                '/api/health': 'GET: Проверка работоспособности'
+            }
+        }
+
+# Обработчик ошибок для Flask-RESTX
+@api.errorhandler(Exception)
+def handle_error(e):
+    """Обработчик ошибок для Flask-RESTX"""
+    logger.error(f"Flask-RESTX error handler: {e}", exc_info=True)
+    return {
+        'success': False,
+        'error': str(e)
+    }, 500
+
+@routes.before_app_request
+def before_request():
+    """Выполняется перед каждым запросом"""
+    # Прогрев кэшей: без метрик, разбивки по фазам и профилирования
+    if is_internal_request():
+        return
+    g.request_started = time.perf_counter()
+    start_request_timing()
+    if profiling_requested():
+        profiler = try_start_profile()
+        if profiler is not None:
+            g.profiler = profiler
+
+@routes.after_app_request
+def record_request_metrics(response):
+    """Время и статус запроса по шаблону маршрута (не по конкретному URL, чтобы не плодить метки)"""
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_duration.observe(time.perf_counter() - started, endpoint, request.method)
+        http_requests_total.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+@routes.after_app_request
+def record_request_timing(response):
+    """Разбивка времени запроса по фазам: заголовок Server-Timing, профиль, журнал медленных запросов"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        stop_profile(profiler)
+    timer = current_request_timer()
+    if timer is None:
+        return response
+    duration_ms, phases = timer.breakdown()
+    response.headers['Server-Timing'] = ', '.join(f'{name};dur={value}' for name, value in phases.items())
+    if profiler is not None:
+        try:
+            response.headers['X-Profile-Id'] = save_request_profile(profiler, response, duration_ms, phases)
+        except OSError as e:
+            logger.error(f"Failed to save request profile: {e}")
+    if SLOW_REQUEST_THRESHOLD > 0 and duration_ms >= SLOW_REQUEST_THRESHOLD * 1000:
+        entry = {
+            'method': request.method,
+            'path': request_path_for_log(),
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'phases': phases,
+            'queries': timer.counts.get('db', 0),
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        slow_requests.append(entry)
+        logger.warning(
+            f"Slow request {entry['method']} {entry['path']} -> {entry['status']} in {duration_ms} ms: "
+            + ', '.join(f'{name}={value}ms' for name, value in phases.items())
+            + f" ({entry['queries']} SQL)"
+        )
+    return response
+
+@routes.teardown_app_request
+def teardown_request_timing(exc):
+    # after_request не вызывается при необработанном исключении - профилировщик освобождаем здесь
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        stop_profile(profiler)
+    finish_request_timing()
+
+@routes.route('/metrics')
+def prometheus_metrics():
+    """Метрики всех процессов приложения в текстовом формате Prometheus"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def init_api(app):
+    """Подключить к приложению Flask-RESTX API, маршруты и обработчики запросов"""
+    api.init_app(app)
+    app.register_blueprint(routes)
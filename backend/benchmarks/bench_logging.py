@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+Влияние логирования на время цикла проверки камер.
+
+Для каждой конфигурации логирования запускается отдельный процесс: он
+создает временную SQLite базу с N базарами и выполняет K циклов
+background_check_cameras. Опрос базаров заменен заглушкой: каждый
+--offline-every базар недоступен, остальные отвечают без изменений.
+По умолчанию процесс не владелец планировщика: цикл - это опрос, снимок
+камер и строки лога по каждому базару. С --leader добавляется проверка
+переходов с коммитом по каждому базару, а с --flapping - еще и уведомления
+в каждом втором цикле; тогда время цикла определяют коммиты SQLite, а не
+логирование. Логи
+пишутся в файл или в канал, который читается медленно (--sink pipe, как
+stderr контейнера при загруженном драйвере логов или терминале). Печатает
+время цикла (среднее/минимум/максимум; лучший из --repeat раундов), время
+дозаписи очереди логов после последнего цикла, объем лога и отношение
+времени цикла к конфигурации legacy.
+
+    python benchmarks/bench_logging.py --bazars 1000 --cycles 10
+    python benchmarks/bench_logging.py --configs legacy,default --sink pipe --pipe-delay 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# legacy - как было до настройки логирования: DEBUG, текст, синхронная запись, без прореживания
+CONFIGS = {
+    'legacy': {'LOG_LEVEL': 'DEBUG', 'LOG_FORMAT': 'text', 'LOG_ASYNC': 'false', 'LOG_SAMPLE_BURST': '0'},
+    'debug-sync-json': {'LOG_LEVEL': 'DEBUG', 'LOG_FORMAT': 'json', 'LOG_ASYNC': 'false', 'LOG_SAMPLE_BURST': '0'},
+    'debug-async': {'LOG_LEVEL': 'DEBUG', 'LOG_FORMAT': 'json', 'LOG_ASYNC': 'true', 'LOG_SAMPLE_BURST': '0'},
+    'debug-async-sampled': {'LOG_LEVEL': 'DEBUG', 'LOG_FORMAT': 'json', 'LOG_ASYNC': 'true', 'LOG_SAMPLE_BURST': '20'},
+    'default': {'LOG_LEVEL': 'INFO', 'LOG_FORMAT': 'json', 'LOG_ASYNC': 'true', 'LOG_SAMPLE_BURST': '20'},
+    'off': {'LOG_LEVEL': 'CRITICAL', 'LOG_FORMAT': 'json', 'LOG_ASYNC': 'true', 'LOG_SAMPLE_BURST': '20'}
+}
+DEFAULT_CONFIGS = 'legacy,debug-async,debug-async-sampled,default,off'
+
+
+def run_cycles(args):
+    """Дочерний процесс: заполнить базу и выполнить циклы проверки (конфигурация логирования - в окружении)"""
+    from fake_telegram_api import start_server
+
+    server = None
+    if args.chats:
+        server, _, base_url = start_server(latency=0)
+        os.environ['TELEGRAM_API_URL'] = base_url
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': 'bench:token',
+        'TELEGRAM_GLOBAL_RATE': '100000',
+        'TELEGRAM_CHAT_RATE': '100000',
+        'BACKGROUND_SCHEDULER': 'false',
+        # Один процесс - выбор владельца планировщика не нужен
+        'SCHEDULER_LEADER_ELECTION': 'false'
+    })
+    from app import create_app
+    from models import BazarStatus, TelegramChatId, db
+    from observability import get_logging_stats, stop_log_listener
+    from scheduling import scheduler_leader
+    from telegram import chat_routing_index
+    import jobs
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_save_objects([
+            BazarStatus(
+                bazar_name=f'Bench bazar {i}',
+                bazar_ip=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+                bazar_port=80,
+                backend_port=8000,
+                pg_port=5432,
+                city='Toshkent shahri',
+                status='online',
+                telegram_notifications_enabled=True,
+                last_offline_cameras_count=0
+            )
+            for i in range(args.bazars)
+        ])
+        db.session.bulk_save_objects([
+            TelegramChatId(chat_id=str(100000 + i), chat_type='user', enabled=True)
+            for i in range(args.chats)
+        ])
+        db.session.commit()
+        chat_routing_index.invalidate()
+    if args.leader:
+        scheduler_leader.start()
+
+    cycle = [0]
+
+    def fake_fetch(endpoint):
+        index = int(endpoint['ip'].split('.')[-1]) + 256 * int(endpoint['ip'].split('.')[-2])
+        if args.offline_every and index % args.offline_every == 0:
+            return {'success': False, 'status': 'offline', 'error': 'Connection refused', 'endpoint': endpoint}
+        offline = 3 if args.flapping and cycle[0] % 2 else 0
+        return {
+            'success': True,
+            'status': 'online',
+            'data': {'totalCameras': 20, 'onlineCameras': 20 - offline, 'offlineCameras': offline},
+            'endpoint': endpoint
+        }
+
+    jobs.fetch_bazar_info = fake_fetch
+    durations = []
+    cpu_times = []
+    for i in range(args.cycles + 1):
+        cycle[0] = i
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        jobs.background_check_cameras()
+        if i:
+            # Первый цикл - прогрев
+            durations.append(time.perf_counter() - started)
+            # Процессорное время всех потоков процесса, включая поток QueueListener
+            cpu_times.append(time.process_time() - cpu_started)
+    started = time.perf_counter()
+    stop_log_listener()
+    flush_seconds = time.perf_counter() - started
+    stats = get_logging_stats()
+    if server:
+        server.shutdown()
+    print(json.dumps({
+        'cycle_mean': round(statistics.mean(durations), 4),
+        'cycle_min': round(min(durations), 4),
+        'cycle_max': round(max(durations), 4),
+        'cycle_cpu_mean': round(statistics.mean(cpu_times), 4),
+        'log_flush_seconds': round(flush_seconds, 4),
+        'log_dropped': stats['dropped'],
+        'log_sampled_out': stats['sampled_out']
+    }))
+
+
+def run_with_slow_pipe(command, env, log_file, delay):
+    """Запустить процесс, читая его stderr по 4 КБ с паузой delay - запись в канал начинает блокироваться"""
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def drain():
+        while True:
+            chunk = process.stderr.read1(4096)
+            if not chunk:
+                return
+            log_file.write(chunk)
+            time.sleep(delay)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    stdout = process.stdout.read()
+    process.wait()
+    reader.join()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return stdout
+
+
+def run_config(name, args):
+    """Один дочерний процесс с конфигурацией логирования name"""
+    workdir = tempfile.mkdtemp(prefix='bench-logging-')
+    log_path = os.path.join(workdir, 'app.log')
+    db_dir = tempfile.mkdtemp(prefix='bench-logging-db-', dir=args.db_dir)
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        **CONFIGS[name]
+    )
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--bazars', str(args.bazars),
+               '--chats', str(args.chats), '--cycles', str(args.cycles), '--offline-every', str(args.offline_every)]
+    if args.leader:
+        command.append('--leader')
+    if args.flapping:
+        command.append('--flapping')
+    try:
+        with open(log_path, 'wb') as log_file:
+            if args.sink == 'file':
+                completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE,
+                                           stderr=log_file, check=True)
+                stdout = completed.stdout
+            else:
+                stdout = run_with_slow_pipe(command, env, log_file, args.pipe_delay / 1000)
+        result = json.loads(stdout.decode('utf-8').strip().splitlines()[-1])
+        with open(log_path, 'rb') as log_file:
+            result['log_lines'] = sum(1 for _ in log_file)
+        result['log_bytes'] = os.path.getsize(log_path)
+        result['settings'] = CONFIGS[name]
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время цикла проверки камер при разных настройках логирования')
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help=f"Через запятую: {', '.join(CONFIGS)}")
+    parser.add_argument('--bazars', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=0, help='Чатов для уведомлений (0 - уведомления не пишутся, в лог идет предупреждение по каждому базару)')
+    parser.add_argument('--repeat', type=int, default=3, help='Раундов по всем конфигурациям')
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--leader', action='store_true', help='Процесс - владелец планировщика (проверка переходов и коммиты)')
+    parser.add_argument('--flapping', action='store_true', help='Менять состояние камер каждый цикл (уведомления в каждом втором цикле)')
+    parser.add_argument('--offline-every', type=int, default=10, help='Каждый N-й базар недоступен (0 - все доступны)')
+    # Коммиты SQLite на диске (fsync) дают разброс больше, чем само логирование
+    parser.add_argument('--db-dir', default='/dev/shm' if os.path.isdir('/dev/shm') else None,
+                        help='Каталог временной базы (по умолчанию tmpfs /dev/shm, если есть)')
+    parser.add_argument('--sink', choices=('file', 'pipe'), default='file', help='Куда пишется stderr процесса')
+    parser.add_argument('--pipe-delay', type=float, default=5, help='Для --sink pipe: пауза перед чтением очередных 4 КБ, мс')
+    parser.add_argument('--output', help='Сохранить результат в JSON файл')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_cycles(args)
+        return 0
+
+    results = {
+        'bazars': args.bazars,
+        'chats': args.chats,
+        'cycles': args.cycles,
+        'repeat': args.repeat,
+        'offline_every': args.offline_every,
+        'leader': args.leader,
+        'flapping': args.flapping,
+        'sink': args.sink,
+        'configs': {}
+    }
+    names = args.configs.split(',')
+    # Конфигурации чередуются по раундам, для каждой берется лучший раунд - так меньше влияет фоновая нагрузка
+    for round_index in range(args.repeat):
+        for name in names:
+            result = run_config(name, args)
+            best = results['configs'].get(name)
+            if best is None or result['cycle_mean'] < best['cycle_mean']:
+                results['configs'][name] = result
+            print(f"[{round_index + 1}/{args.repeat}] {name:>20}: cycle {result['cycle_mean'] * 1000:.1f} ms, "
+                  f"{result['log_lines']} log lines, flush {result['log_flush_seconds'] * 1000:.1f} ms", file=sys.stderr)
+    baseline = results['configs'].get('legacy')
+    for name, result in results['configs'].items():
+        if baseline and name != 'legacy':
+            result['vs_legacy'] = round(result['cycle_mean'] / baseline['cycle_mean'], 3)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Бенчмарк рассылки уведомлений: N чатов x M базаров через локальный Bot API.
+
+Создает временную SQLite базу с базарами и чатами, поднимает
+fake_telegram_api, выполняет один цикл background_check_cameras, в котором
+у всех базаров появляются офлайн камеры, и ждет, пока outbox будет доставлен.
+Печатает время цикла, время доставки, задержку уведомлений (p50/p95/max)
+и число вызовов Bot API.
+
+    python benchmarks/bench_notifications.py --chats 1000 --bazars 500 --global-rate 1000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram_api import start_server  # noqa: E402
+
+REGIONS = [
+    'Toshkent shahri', 'Toshkent viloyati', "Farg'ona", 'Namangan', 'Andijon',
+    'Sirdaryo', 'Surxondaryo', 'Samarqand', 'Buxoro', 'Xorazm'
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed(app, chats, bazars, region_count, bots=1):
+    """Заполнить базу базарами и чатами (каждый третий чат подписан на все области)"""
+    from models import BazarStatus, TelegramChatId, TelegramSettings, db
+    from telegram import chat_routing_index
+
+    regions = REGIONS[:region_count]
+    with app.app_context():
+        db.create_all()
+        if bots > 1:
+            settings = TelegramSettings(bot_token='bench:token', enabled=True)
+            settings.set_extra_bot_tokens([f'bench{i}:token' for i in range(1, bots)])
+            db.session.add(settings)
+        db.session.bulk_save_objects([
+            BazarStatus(
+                bazar_name=f'Bench bazar {i}',
+                bazar_ip=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+                bazar_port=80,
+                backend_port=8000,
+                pg_port=5432,
+                city=regions[i % len(regions)],
+                status='online',
+                telegram_notifications_enabled=True,
+                last_offline_cameras_count=0
+            )
+            for i in range(bazars)
+        ])
+        chat_rows = []
+        for i in range(chats):
+            chat = TelegramChatId(chat_id=str(100000 + i), chat_type='user', enabled=True)
+            chat.set_allowed_regions(None if i % 3 == 0 else [regions[i % len(regions)]])
+            chat_rows.append(chat)
+        db.session.bulk_save_objects(chat_rows)
+        db.session.commit()
+        chat_routing_index.invalidate()
+
+
+def wait_for_outbox(app, timeout):
+    """Ждать, пока в outbox не останется неотправленных строк. Возвращает True при успехе"""
+    from models import NotificationOutbox
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with app.app_context():
+            left = NotificationOutbox.query.filter(
+                NotificationOutbox.status.in_(('held', 'pending', 'sending'))
+            ).count()
+        if not left:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк рассылки Telegram уведомлений')
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--bazars', type=int, default=500)
+    parser.add_argument('--regions', type=int, default=len(REGIONS))
+    parser.add_argument('--latency', type=float, default=20, help='Задержка Bot API, мс')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Доля ответов 429 (0..1)')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Доля ответов 500 (0..1)')
+    parser.add_argument('--global-rate', type=float, default=30, help='Сообщений в секунду на бота (TELEGRAM_GLOBAL_RATE)')
+    parser.add_argument('--chat-rate', type=float, default=1, help='Сообщений в секунду в чат (TELEGRAM_CHAT_RATE)')
+    parser.add_argument('--workers', type=int, default=4, help='Воркеров доставки на бота (TELEGRAM_DELIVERY_WORKERS)')
+    parser.add_argument('--bots', type=int, default=1, help='Число токенов ботов в пуле')
+    parser.add_argument('--no-digest', action='store_true', help='Отключить сводки (TELEGRAM_DIGEST_ENABLED=false)')
+    parser.add_argument('--timeout', type=float, default=600, help='Максимальное время ожидания доставки, с')
+    parser.add_argument('--output', help='Сохранить результат в JSON файл')
+    args = parser.parse_args()
+
+    server, fake_state, base_url = start_server(
+        latency=args.latency / 1000, rate_limit=args.rate_limit, failure_rate=args.failure_rate
+    )
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file.name}',
+        'TELEGRAM_API_URL': base_url,
+        'TELEGRAM_BOT_TOKEN': 'bench:token',
+        'TELEGRAM_GLOBAL_RATE': str(args.global_rate),
+        'TELEGRAM_CHAT_RATE': str(args.chat_rate),
+        'TELEGRAM_DELIVERY_WORKERS': str(args.workers),
+        'TELEGRAM_DIGEST_ENABLED': 'false' if args.no_digest else 'true',
+        'TELEGRAM_OUTBOX_POLL_INTERVAL': '0.5',
+        # Один процесс - выбор владельца планировщика не нужен
+        'SCHEDULER_LEADER_ELECTION': 'false'
+    })
+
+    from app import create_app
+    from models import NotificationOutbox
+    from scheduling import scheduler_leader
+    from telegram import telegram_delivery
+    import jobs
+
+    app = create_app()
+    logging.disable(logging.WARNING)
+
+    try:
+        seed(app, args.chats, args.bazars, args.regions, args.bots)
+        scheduler_leader.start()
+        jobs.fetch_bazar_info = lambda endpoint: {
+            'success': True,
+            'data': {'totalCameras': 20, 'onlineCameras': 17, 'offlineCameras': 3}
+        }
+        fake_state.reset()
+
+        started = time.time()
+        jobs.background_check_cameras()
+        cycle_seconds = time.time() - started
+        delivered = wait_for_outbox(app, args.timeout)
+        total_seconds = time.time() - started
+
+        with app.app_context():
+            rows = NotificationOutbox.query.all()
+            latencies = [(row.sent_at - row.created_at).total_seconds() for row in rows if row.sent_at]
+            failed = len([row for row in rows if row.status == 'failed'])
+        api_stats = fake_state.stats()
+        result = {
+            'chats': args.chats,
+            'bazars': args.bazars,
+            'digest': not args.no_digest,
+            'bots': args.bots,
+            'global_rate': args.global_rate,
+            'api_latency_ms': args.latency,
+            'delivered': delivered,
+            'cycle_seconds': round(cycle_seconds, 3),
+            'total_seconds': round(total_seconds, 3),
+            'outbox_rows': len(rows),
+            'outbox_failed': failed,
+            'notification_latency_p50': percentile(latencies, 0.5),
+            'notification_latency_p95': percentile(latencies, 0.95),
+            'notification_latency_max': max(latencies) if latencies else None,
+            'api_calls': api_stats['calls'],
+            'api_calls_total': api_stats['total_calls'],
+            'api_calls_per_token': api_stats['tokens'],
+            'api_calls_per_second': round(api_stats['total_calls'] / total_seconds, 1) if total_seconds else None,
+            'api_rate_limited': api_stats['rate_limited'],
+            'api_failures': api_stats['failures'],
+            'delivery_queue': telegram_delivery.get_stats()
+        }
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+        return 0 if delivered else 1
+    finally:
+        server.shutdown()
+        os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
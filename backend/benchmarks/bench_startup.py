@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Время импорта и старта приложения.
+
+Каждый сценарий выполняется в новом процессе --repeat раз (плюс один
+прогрев байткода), в результат идут медианы:
+
+- import-models - импорт только моделей (то, что загружают CLI-скрипты);
+- import-app - импорт app.py со всеми модулями, без создания приложения;
+- create-app - импорт и create_app();
+- first-request - импорт, create_app() и первый GET /api/health
+  (initialize_app: проверка схемы, фоновые задачи);
+- reset-migrations - python reset_migrations.py по уже приведенной базе
+  (быстрый путь при старте контейнера), только общее время процесса.
+
+Для каждого сценария печатается общее время процесса (с запуском
+интерпретатора), время фаз внутри процесса, число загруженных модулей,
+потоков и обработчиков корневого логгера после сценария - по ним видны
+побочные эффекты импорта. --backend-dir позволяет замерить другую версию
+кода (например, git worktree предыдущей ревизии) теми же сценариями.
+
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --backend-dir /tmp/old/backend --output before.json
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Сценарий - шаги (фаза, код); фаза отмечается после выполнения своего кода
+SCENARIOS = {
+    'import-models': [('import', 'import models')],
+    'import-app': [('import', 'import app')],
+    'create-app': [('import', 'import app'), ('create_app', 'application = app.create_app()')],
+    'first-request': [
+        ('import', 'import app'),
+        ('create_app', 'application = app.create_app()'),
+        ('first_request', "assert application.test_client().get('/api/health').status_code == 200")
+    ]
+}
+SCRIPT_SCENARIOS = {'reset-migrations': ['reset_migrations.py']}
+DEFAULT_SCENARIOS = 'import-models,import-app,create-app,first-request,reset-migrations'
+
+# json, logging и threading импортируются после шагов, чтобы не попасть в замер импорта
+CHILD_TEMPLATE = '''import time
+started = time.perf_counter()
+phases = {{}}
+{steps}
+import json, logging, sys, threading
+print(json.dumps({{
+    'phases': phases,
+    'modules': len(sys.modules),
+    'threads': threading.active_count(),
+    'root_handlers': len(logging.getLogger().handlers)
+}}))
+'''
+
+
+def child_script(steps):
+    lines = []
+    for phase, code in steps:
+        lines.append(code)
+        lines.append(f"phases[{phase!r}] = (time.perf_counter() - started) * 1000")
+    return CHILD_TEMPLATE.format(steps='\n'.join(lines))
+
+
+def run_once(name, backend_dir, env):
+    """Один прогон сценария в новом процессе. Если эта версия кода его не поддерживает - {'error': [...]}"""
+    if name in SCRIPT_SCENARIOS:
+        command = [sys.executable] + SCRIPT_SCENARIOS[name]
+    else:
+        command = [sys.executable, '-c', child_script(SCENARIOS[name])]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=backend_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode:
+        return {'error': completed.stderr.decode('utf-8', 'replace').strip().splitlines()[-1:]}
+    measured = {'wall_ms': wall_ms}
+    if name not in SCRIPT_SCENARIOS:
+        measured.update(json.loads(completed.stdout.decode('utf-8').strip().splitlines()[-1]))
+    return measured
+
+
+def run_scenario(name, backend_dir, env, repeat):
+    run_once(name, backend_dir, env)  # прогрев: байткод и кэш файловой системы
+    runs = []
+    for _ in range(repeat):
+        measured = run_once(name, backend_dir, env)
+        if 'error' in measured:
+            return measured
+        runs.append(measured)
+    result = {
+        'wall_ms': round(statistics.median(run['wall_ms'] for run in runs), 1),
+        'wall_min_ms': round(min(run['wall_ms'] for run in runs), 1)
+    }
+    if 'phases' in runs[0]:
+        result['phases_ms'] = {
+            phase: round(statistics.median(run['phases'][phase] for run in runs), 1) for phase in runs[0]['phases']
+        }
+        for key in ('modules', 'threads', 'root_handlers'):
+            result[key] = runs[-1][key]
+    return result
+
+
+def heaviest_imports(backend_dir, env, top):
+    """Самые тяжелые прямые импорты app.py (python -X importtime): сколько мс добавил каждый, с зависимостями"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=backend_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    imports = []
+    for line in completed.stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Вложенность - по два пробела на уровень: ' app', '   models', '     flask'
+        if not name.startswith('   ') or name.startswith('     '):
+            continue
+        imports.append((name.strip(), round(int(cumulative) / 1000, 1)))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return [{'module': module, 'cumulative_ms': ms} for module, ms in imports[:top]]
+
+
+def git_revision(directory):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=directory, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время импорта и старта приложения')
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS,
+                        help=f"Через запятую: {', '.join(list(SCENARIOS) + list(SCRIPT_SCENARIOS))}")
+    parser.add_argument('--repeat', type=int, default=5, help='Прогонов каждого сценария (берется медиана)')
+    parser.add_argument('--backend-dir', default=BACKEND_DIR, help='Каталог backend замеряемой версии кода')
+    parser.add_argument('--top-imports', type=int, default=10, help='Сколько самых тяжелых импортов показать (0 - не искать)')
+    parser.add_argument('--output', help='Сохранить результат в JSON файл')
+    args = parser.parse_args()
+
+    backend_dir = os.path.abspath(args.backend_dir)
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        BACKGROUND_SCHEDULER='false',
+        CACHE_WARM_INTERVAL='0',
+        LOG_LEVEL='WARNING'
+    )
+    results = {
+        'created_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(backend_dir),
+        'backend_dir': backend_dir,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'scenarios': {}
+    }
+    try:
+        # База с текущей схемой: reset_migrations.py и initialize_app идут быстрым путем, как при рестарте
+        subprocess.run([sys.executable, 'reset_migrations.py'], cwd=backend_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for name in args.scenarios.split(','):
+            result = run_scenario(name, backend_dir, env, args.repeat)
+            results['scenarios'][name] = result
+            if 'error' in result:
+                print(f"{name:>17}: not supported ({' '.join(result['error'])})", file=sys.stderr)
+                continue
+            phases = ', '.join(f"{phase} {value:.0f}" for phase, value in result.get('phases_ms', {}).items())
+            details = f" ({phases} ms), {result['modules']} modules, {result['threads']} thread(s), " \
+                      f"{result['root_handlers']} root log handler(s)" if phases else ''
+            print(f"{name:>17}: {result['wall_ms']:.0f} ms{details}", file=sys.stderr)
+        if args.top_imports:
+            results['heaviest_imports'] = heaviest_imports(backend_dir, env, args.top_imports)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
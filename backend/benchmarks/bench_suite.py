@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+Набор замеров API и фонового опроса с сохранением базовой линии и поиском регрессий.
+
+Для каждого сценария (число базаров x число строк bazar_log) запускается
+отдельный процесс. Он поднимает симулятор парка базаров (fleet_simulator.py)
+и временную SQLite базу (по умолчанию на tmpfs /dev/shm) и добавляет туда
+базары симулятора и логи. Затем процесс измеряет:
+
+- один полный цикл background_check_cameras (процесс - владелец планировщика:
+  опрос, снимки камер, переходы и уведомления в локальную замену Bot API)
+  и следующий цикл, уже без переходов;
+- задержку (p50/p95/max, первый запрос отдельно) и пропускную способность
+  путей API через тестовый клиент Flask, без сетевого стека.
+
+У части базаров при старте есть офлайн камеры, часть недоступна (--down-rate),
+поэтому в цикле есть и переходы, и ошибки опроса.
+
+    python benchmarks/bench_suite.py --output baselines/local.json
+    python benchmarks/bench_suite.py --bazars 10,100 --logs 10000 --baseline baselines/local.json
+    python benchmarks/bench_suite.py --results current.json --baseline baselines/local.json --threshold 0.2
+
+С --baseline результаты сравниваются с сохраненными: рост задержки или
+времени цикла и падение пропускной способности больше --threshold (и больше
+--min-delta-ms по абсолютной величине) считаются регрессией, процесс
+завершается с кодом 1.
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_PATHS = (
+    '/api/bazars,/api/bazars?mode=snapshot,/api/status,/api/statistics,'
+    '/api/cameras/statistics,/api/cameras/statistics?mode=snapshot,'
+    '/api/logs?limit=100,/api/logs?limit=100&status=offline'
+)
+LOG_BATCH_SIZE = 50000
+# Метрика -> True, если больше - хуже
+COMPARED_METRICS = {
+    'latency_p50_ms': True,
+    'latency_p95_ms': True,
+    'rps': False,
+    'cycle_first_ms': True,
+    'cycle_steady_ms': True
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed_logs(app, fleet, count):
+    """Добавить count строк bazar_log по базарам симулятора пачками через Core insert"""
+    from models import BazarLog, db
+
+    table = BazarLog.__table__
+    now = datetime.utcnow()
+    bazars = fleet.bazars
+    with app.app_context():
+        for start in range(0, count, LOG_BATCH_SIZE):
+            rows = []
+            for i in range(start, min(count, start + LOG_BATCH_SIZE)):
+                bazar = bazars[i % len(bazars)]
+                offline = i % 3 == 0
+                rows.append({
+                    'bazar_name': bazar.name,
+                    'bazar_ip': bazar.host,
+                    'bazar_port': bazar.port,
+                    'city': bazar.region,
+                    'status': 'offline' if offline else 'online',
+                    'previous_status': 'online' if offline else 'offline',
+                    'error_message': 'Connection refused' if offline else None,
+                    'action_type': 'status_change',
+                    'timestamp': now - timedelta(seconds=30 * i)
+                })
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+
+
+def measure_path(client_factory, path, duration, min_requests, concurrency):
+    """Первый запрос отдельно, затем нагрузка concurrency клиентами: не меньше min_requests и не меньше duration секунд"""
+    client = client_factory()
+    started = time.perf_counter()
+    response = client.get(path)
+    cold = time.perf_counter() - started
+    first_status = response.status_code
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        worker_client = client_factory()
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                done = len(latencies) + len(local_latencies) * concurrency
+            if time.perf_counter() >= deadline and done >= min_requests:
+                break
+            request_started = time.perf_counter()
+            response = worker_client.get(path)
+            local_latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'first_status': first_status,
+        'cold_ms': round(cold * 1000, 2),
+        'rps': round(len(latencies) / elapsed, 2),
+        'latency_mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'latency_max_ms': round(max(latencies) * 1000, 2)
+    }
+
+
+def run_scenario(args):
+    """Дочерний процесс: симулятор, база, цикл опроса и замеры путей"""
+    from bench_notifications import wait_for_outbox
+    from fake_telegram_api import start_server
+    from fleet_simulator import start_fleet
+
+    telegram, _, telegram_url = start_server(latency=0)
+    os.environ.update({
+        'TELEGRAM_API_URL': telegram_url,
+        'TELEGRAM_BOT_TOKEN': 'bench:token',
+        'TELEGRAM_GLOBAL_RATE': '100000',
+        'TELEGRAM_CHAT_RATE': '100000',
+        'BACKGROUND_SCHEDULER': 'false',
+        # Один процесс - владелец планировщика без выбора через аренду
+        'SCHEDULER_LEADER_ELECTION': 'false',
+        'CACHE_WARM_INTERVAL': '0'
+    })
+    fleet = start_fleet(bazars=args.bazars, seed=args.random_seed, down_rate=args.down_rate, threads=args.fleet_threads)
+    # Детерминированные переходы в первом цикле: у каждого третьего базара первая камера офлайн
+    for bazar in fleet.bazars[::3]:
+        bazar.cameras[0]['online'] = False
+
+    from app import create_app
+    from models import TelegramChatId, db
+    from observability import stop_log_listener
+    from scheduling import scheduler_leader
+    from telegram import chat_routing_index
+    from jobs import background_check_cameras
+
+    app = create_app()
+    result = {}
+    started = time.perf_counter()
+    fleet.seed_database(app, notifications=True)
+    with app.app_context():
+        db.session.bulk_save_objects([
+            TelegramChatId(chat_id=str(100000 + i), chat_type='user', enabled=True)
+            for i in range(args.chats)
+        ])
+        db.session.commit()
+        chat_routing_index.invalidate()
+    seed_logs(app, fleet, args.logs)
+    result['seed_seconds'] = round(time.perf_counter() - started, 2)
+
+    scheduler_leader.start()
+    # Первый цикл - переходы всех базаров с офлайн камерами, второй - установившийся режим
+    started = time.perf_counter()
+    background_check_cameras()
+    cycle_first = time.perf_counter() - started
+    # Доставка уведомлений первого цикла не должна попасть во второй цикл и в замеры путей
+    started = time.perf_counter()
+    delivered = wait_for_outbox(app, timeout=120)
+    outbox_drain = time.perf_counter() - started
+    started = time.perf_counter()
+    background_check_cameras()
+    cycle_steady = time.perf_counter() - started
+    result['cycle'] = {
+        'cycle_first_ms': round(cycle_first * 1000, 1),
+        'cycle_steady_ms': round(cycle_steady * 1000, 1),
+        'outbox_drain_ms': round(outbox_drain * 1000, 1) if delivered else None,
+        'probes': fleet.stats()['total_requests']
+    }
+
+    result['paths'] = {}
+    for path in args.paths.split(','):
+        result['paths'][path] = measure_path(app.test_client, path, args.duration, args.min_requests,
+                                             args.concurrency)
+    result['fleet'] = fleet.stats()['requests']
+
+    stop_log_listener()
+    fleet.shutdown()
+    telegram.shutdown()
+    print(json.dumps(result))
+
+
+def run_child(bazars, logs, args):
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    db_dir = tempfile.mkdtemp(prefix='bench-suite-db-', dir=args.db_dir)
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        PROFILE_DIR=os.path.join(workdir, 'profiles'),
+        LOG_LEVEL='WARNING'
+    )
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child',
+        '--bazars', str(bazars), '--logs', str(logs), '--chats', str(args.chats),
+        '--paths', args.paths, '--duration', str(args.duration), '--min-requests', str(args.min_requests),
+        '--concurrency', str(args.concurrency), '--down-rate', str(args.down_rate),
+        '--random-seed', str(args.random_seed), '--fleet-threads', str(args.fleet_threads)
+    ]
+    try:
+        completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL if not args.verbose else None, check=True)
+        return json.loads(completed.stdout.decode('utf-8').strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_metrics(scenario):
+    """Плоский словарь {(раздел, метрика): значение} для сравнения"""
+    flat = {}
+    for name, value in scenario.get('cycle', {}).items():
+        if name in COMPARED_METRICS:
+            flat[('cycle', name)] = value
+    for path, measured in scenario.get('paths', {}).items():
+        for name, value in measured.items():
+            if name in COMPARED_METRICS:
+                flat[(path, name)] = value
+    return flat
+
+
+def compare_results(baseline, current, threshold, min_delta_ms):
+    """Регрессии и улучшения current относительно baseline по общим сценариям и метрикам"""
+    rows = []
+    for scenario_name, scenario in current['scenarios'].items():
+        base_scenario = baseline['scenarios'].get(scenario_name)
+        if base_scenario is None:
+            continue
+        base_metrics = scenario_metrics(base_scenario)
+        for key, value in scenario_metrics(scenario).items():
+            base_value = base_metrics.get(key)
+            if not base_value or value is None:
+                continue
+            higher_is_worse = COMPARED_METRICS[key[1]]
+            change = value / base_value - 1
+            worse = change if higher_is_worse else -change
+            # Для задержек малые абсолютные изменения - шум, а не регрессия
+            significant = key[1] == 'rps' or abs(value - base_value) >= min_delta_ms
+            if worse > threshold and significant:
+                verdict = 'regression'
+            elif worse < -threshold and significant:
+                verdict = 'improvement'
+            else:
+                verdict = 'ok'
+            rows.append({
+                'scenario': scenario_name,
+                'section': key[0],
+                'metric': key[1],
+                'baseline': base_value,
+                'current': value,
+                'change': round(change, 3),
+                'verdict': verdict
+            })
+    return rows
+
+
+def print_comparison(rows, threshold):
+    for row in rows:
+        if row['verdict'] == 'ok':
+            continue
+        mark = 'REGRESSION' if row['verdict'] == 'regression' else 'improved  '
+        print(f"{mark} {row['scenario']:>24} {row['section']:<40} {row['metric']:<16} "
+              f"{row['baseline']:>10} -> {row['current']:>10} ({row['change'] * 100:+.1f}%)", file=sys.stderr)
+    regressions = sum(1 for row in rows if row['verdict'] == 'regression')
+    print(f"Compared {len(rows)} metric(s): {regressions} regression(s) beyond {threshold * 100:.0f}%, "
+          f"{sum(1 for row in rows if row['verdict'] == 'improvement')} improvement(s)", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры API и фонового опроса с базовой линией')
+    parser.add_argument('--bazars', default='10,100,1000', help='Число базаров по сценариям, через запятую')
+    parser.add_argument('--logs', default='10000,1000000', help='Строк bazar_log по сценариям, через запятую')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='Пути через запятую')
+    parser.add_argument('--duration', type=float, default=3, help='Минимум секунд нагрузки на путь')
+    parser.add_argument('--min-requests', type=int, default=5, help='Минимум запросов на путь')
+    parser.add_argument('--concurrency', type=int, default=1, help='Параллельных клиентов на путь')
+    parser.add_argument('--chats', type=int, default=10, help='Чатов для уведомлений')
+    parser.add_argument('--down-rate', type=float, default=0.05, help='Доля недоступных базаров симулятора')
+    parser.add_argument('--random-seed', type=int, default=1, help='Зерно симулятора (одинаковый парк между прогонами)')
+    parser.add_argument('--fleet-threads', type=int, default=32, help='Потоков симулятора')
+    parser.add_argument('--db-dir', default='/dev/shm' if os.path.isdir('/dev/shm') else None,
+                        help='Каталог временной базы (по умолчанию tmpfs /dev/shm, если есть)')
+    parser.add_argument('--output', help='Сохранить результат в JSON файл (его можно использовать как базовую линию)')
+    parser.add_argument('--results', help='Не запускать замеры, а взять готовый результат из JSON файла')
+    parser.add_argument('--baseline', help='JSON файл базовой линии для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое ухудшение (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2, help='Изменение задержки меньше этого - не регрессия')
+    parser.add_argument('--verbose', action='store_true', help='Показывать лог дочерних процессов')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.bazars = int(args.bazars)
+        args.logs = int(args.logs)
+        run_scenario(args)
+        return 0
+
+    if args.results:
+        with open(args.results, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = {
+            'created_at': datetime.utcnow().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': {
+                'duration': args.duration,
+                'min_requests': args.min_requests,
+                'concurrency': args.concurrency,
+                'chats': args.chats,
+                'down_rate': args.down_rate,
+                'random_seed': args.random_seed
+            },
+            'scenarios': {}
+        }
+        for logs in (int(value) for value in args.logs.split(',')):
+            for bazars in (int(value) for value in args.bazars.split(',')):
+                name = f"bazars={bazars},logs={logs}"
+                started = time.perf_counter()
+                scenario = run_child(bazars, logs, args)
+                results['scenarios'][name] = scenario
+                print(f"{name}: cycle {scenario['cycle']['cycle_first_ms']:.0f}/{scenario['cycle']['cycle_steady_ms']:.0f} ms, "
+                      f"{time.perf_counter() - started:.0f} s total", file=sys.stderr)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(baseline, results, args.threshold, args.min_delta_ms)
+        if print_comparison(rows, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Сравнение пропускной способности: сервер разработки Flask против gunicorn.
+
+Создает временную SQLite базу с N базарами, по очереди поднимает сервер
+в каждом режиме и нагружает его C параллельными клиентами (keep-alive)
+в течение D секунд на каждый путь. Печатает запросы в секунду, задержку
+(p50/p95/max) и число ошибок.
+
+    python benchmarks/bench_wsgi.py --bazars 500 --concurrency 32 --duration 10
+    python benchmarks/bench_wsgi.py --modes dev,gthread --workers 4 --threads 8
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_PATHS = '/health,/api/status,/api/statistics,/api/logs?limit=100'
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(db_path, bazars):
+    """Заполнить временную базу базарами и логами (в отдельном процессе, чтобы не импортировать модели здесь)"""
+    script = (
+        "from models import BazarLog, BazarStatus, create_db_app, db\n"
+        "from datetime import datetime, timedelta\n"
+        "with create_db_app().app_context():\n"
+        "    db.create_all()\n"
+        f"    db.session.bulk_save_objects([BazarStatus(bazar_name=f'Bench bazar {{i}}', "
+        "bazar_ip=f'10.0.{i // 256}.{i % 256}', bazar_port=80, backend_port=8000, pg_port=5432, "
+        f"city='Toshkent shahri', status='online' if i % 7 else 'offline') for i in range({bazars})])\n"
+        "    now = datetime.utcnow()\n"
+        f"    db.session.bulk_save_objects([BazarLog(bazar_name=f'Bench bazar {{i % {bazars}}}', "
+        "bazar_ip=f'10.0.0.{i % 256}', bazar_port=80, city='Toshkent shahri', status='offline' if i % 2 else 'online', "
+        f"timestamp=now - timedelta(minutes=i)) for i in range({bazars * 10})])\n"
+        "    db.session.commit()\n"
+    )
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f'sqlite:///{db_path}', BACKGROUND_SCHEDULER='false')
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_server(mode, port, db_path, args):
+    """Запустить сервер в режиме dev (app.run с отладчиком, как python app.py), gthread или gevent"""
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{db_path}',
+        BACKGROUND_SCHEDULER='false',
+        SCHEDULER_PROCESS='false',
+        PYTHONUNBUFFERED='1'
+    )
+    if mode == 'dev':
+        command = [
+            sys.executable, '-c',
+            f"import app; app.create_app().run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"
+        ]
+    else:
+        env.update(
+            GUNICORN_BIND=f'127.0.0.1:{port}',
+            GUNICORN_WORKER_CLASS=mode,
+            GUNICORN_WORKERS=str(args.workers),
+            GUNICORN_THREADS=str(args.threads),
+            GUNICORN_LOG_LEVEL='warning'
+        )
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server in mode '{mode}' did not start")
+
+
+def load(port, path, concurrency, duration):
+    """Нагрузить путь concurrency клиентами на duration секунд"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        local_latencies = []
+        local_errors = 0
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local_latencies.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / elapsed, 1),
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'latency_max_ms': round(max(latencies) * 1000, 2) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение сервера разработки и gunicorn')
+    parser.add_argument('--modes', default='dev,gthread', help='Режимы через запятую: dev, gthread, gevent, sync')
+    parser.add_argument('--bazars', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10, help='Секунд нагрузки на каждый путь')
+    parser.add_argument('--workers', type=int, default=4, help='GUNICORN_WORKERS')
+    parser.add_argument('--threads', type=int, default=8, help='GUNICORN_THREADS')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='Пути через запятую')
+    parser.add_argument('--output', help='Сохранить результат в JSON файл')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    results = {
+        'bazars': args.bazars,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'workers': args.workers,
+        'threads': args.threads,
+        'cpu_count': os.cpu_count(),
+        'modes': {}
+    }
+    try:
+        seed(db_file.name, args.bazars)
+        for mode in args.modes.split(','):
+            port = free_port()
+            process = start_server(mode, port, db_file.name, args)
+            try:
+                results['modes'][mode] = {
+                    path: load(port, path, args.concurrency, args.duration)
+                    for path in args.paths.split(',')
+                }
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        return 0
+    finally:
+        os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов уведомлений.
+
+Реализует sendMessage, deleteMessage, editMessageText, answerCallbackQuery
+и setWebhook; задержка ответа, доля ответов 429 и доля ошибок 500
+настраиваются. Бэкенд направляется на сервер переменной TELEGRAM_API_URL:
+
+    python benchmarks/fake_telegram_api.py --port 8081 --latency 50 --rate-limit 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python app.py
+
+GET /stats - счетчики вызовов по методам и токенам, POST /reset - сброс.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+
+class FakeTelegramState:
+    """Сообщения по чатам и счетчики вызовов"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0.0, failure_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.messages = {}  # (chat_id, message_id) -> текст
+            self.next_message_id = {}
+            self.webhook_url = None
+            self.calls = {}
+            self.tokens = {}
+            self.rate_limited = 0
+            self.failures = 0
+            self.started_at = time.time()
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.time() - self.started_at
+            total = sum(self.calls.values())
+            return {
+                'calls': dict(self.calls),
+                'tokens': dict(self.tokens),
+                'total_calls': total,
+                'rate_limited': self.rate_limited,
+                'failures': self.failures,
+                'messages_stored': len(self.messages),
+                'webhook_url': self.webhook_url,
+                'elapsed': elapsed,
+                'calls_per_second': total / elapsed if elapsed else 0
+            }
+
+    def handle(self, token, method, params):
+        """Выполнить метод Bot API. Возвращает (HTTP статус, тело ответа)"""
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.tokens[token] = self.tokens.get(token, 0) + 1
+            if self.rate_limit and random.random() < self.rate_limit:
+                self.rate_limited += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after}
+                }
+            if self.failure_rate and random.random() < self.failure_rate:
+                self.failures += 1
+                return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+            chat_id = str(params.get('chat_id', ''))
+            if method == 'sendMessage':
+                if not chat_id or not params.get('text'):
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message text is empty'}
+                message_id = self.next_message_id.get(chat_id, 0) + 1
+                self.next_message_id[chat_id] = message_id
+                self.messages[(chat_id, message_id)] = params['text']
+                return 200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': chat_id}, 'text': params['text']}}
+
+            if method == 'editMessageText':
+                key = (chat_id, int(params.get('message_id') or 0))
+                if key not in self.messages:
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message to edit not found'}
+                if self.messages[key] == params.get('text'):
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message is not modified'}
+                self.messages[key] = params.get('text')
+                return 200, {'ok': True, 'result': {'message_id': key[1], 'chat': {'id': chat_id}, 'text': params.get('text')}}
+
+            if method == 'deleteMessage':
+                key = (chat_id, int(params.get('message_id') or 0))
+                if self.messages.pop(key, None) is None:
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message to delete not found'}
+                return 200, {'ok': True, 'result': True}
+
+            if method == 'answerCallbackQuery':
+                return 200, {'ok': True, 'result': True}
+
+            if method == 'setWebhook':
+                self.webhook_url = params.get('url') or None
+                return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+
+def make_handler(state):
+    class FakeTelegramHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, state.stats())
+            else:
+                self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            if self.path == '/reset':
+                state.reset()
+                self._reply(200, {'ok': True})
+                return
+
+            # /bot<token>/<method>
+            parts = self.path.split('?', 1)[0].strip('/').split('/')
+            if len(parts) != 2 or not parts[0].startswith('bot'):
+                self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                return
+            try:
+                params = json.loads(raw) if raw else {}
+            except ValueError:
+                self._reply(400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid JSON'})
+                return
+            state.delay()
+            status, body = state.handle(parts[0][3:], parts[1], params)
+            self._reply(status, body)
+
+    return FakeTelegramHandler
+
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """Запустить сервер в фоновом потоке. Возвращает (server, state, base_url)"""
+    state = FakeTelegramState(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-telegram-api', daemon=True).start()
+    return server, state, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0, help='Задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='Разброс задержки, мс')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Доля ответов 429 (0..1)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, с')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Доля ответов 500 (0..1)')
+    args = parser.parse_args()
+
+    server, state, base_url = start_server(
+        args.host, args.port,
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        rate_limit=args.rate_limit, failure_rate=args.failure_rate, retry_after=args.retry_after
+    )
+    print(f"Fake Telegram Bot API listening on {base_url}")
+    print(f"Use: TELEGRAM_API_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+"""
+Симулятор парка базаров для нагрузочных тестов без реальных базаров.
+
+Поднимает N поддельных бэкендов базаров на локальных портах (по порту на
+базар) и отвечает на те же запросы, что и настоящие:
+
+    GET /api/cameras/statistics      статистика камер (ее опрашивает мониторинг)
+    GET /api/cameras                 список камер
+    GET /api/cameras/<id>/rois       ROI камеры
+    GET /api/exports/rois            выгрузка ROI (файл JSON)
+    GET /api/exports/streams         выгрузка потоков (файл JSON)
+
+Задержка и ее разброс, доля ошибок 500, доля зависших запросов (ответ
+позже таймаута клиента), недоступные базары и смена состояния камер
+(churn) настраиваются. С --seed в базу SQLALCHEMY_DATABASE_URI добавляются
+строки BazarStatus, указывающие на симулятор, поэтому опрос, планировщик
+и уведомления можно проверять локально:
+
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/sim.db python benchmarks/fleet_simulator.py \\
+        --bazars 500 --latency 30 --jitter 20 --error-rate 0.01 --timeout-rate 0.01 --churn 0.05 --seed
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/sim.db python app.py
+
+Управление на --control-port: GET /stats - счетчики запросов по эндпоинтам
+и исходам, POST /reset - сброс счетчиков, POST /config - изменить
+параметры на ходу (JSON с теми же именами, что у FleetSimulator).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import selectors
+import socket
+import sys
+import threading
+import time
+
+REGIONS = [
+    'Toshkent shahri', 'Toshkent viloyati', "Farg'ona", 'Namangan', 'Andijon',
+    'Sirdaryo', 'Surxondaryo', 'Samarqand', 'Buxoro', 'Xorazm'
+]
+# Тип камеры -> поле статистики; ROI типов 1 (RASTA), 2 (FOOD), 3 (ANIMAL)
+CAMERA_TYPES = {
+    'rasta_food': 'rastaFoodCameras',
+    'animal': 'animalCameras',
+    'people_counting': 'peopleCountingCameras',
+    'vehicle_counting': 'vehicleCountingCameras'
+}
+ROI_TYPE_NAMES = {1: 'RASTA', 2: 'FOOD', 3: 'ANIMAL'}
+ROIS_PATH = re.compile(r'^/api/cameras/([^/]+)/rois$')
+SIMULATED_NAME_PREFIX = 'Sim bazar '
+
+
+class SimulatedBazar:
+    """Камеры одного базара и их состояние во времени"""
+
+    def __init__(self, index, host, port, rng, cameras_range, rois_max):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.name = f"{SIMULATED_NAME_PREFIX}{index + 1}"
+        self.region = REGIONS[index % len(REGIONS)]
+        self.rng = rng
+        self.down = False
+        self.lock = threading.Lock()
+        self.last_step = time.monotonic()
+        camera_types = list(CAMERA_TYPES)
+        self.cameras = []
+        for number in range(1, rng.randint(*cameras_range) + 1):
+            camera_id = index * 1000 + number
+            self.cameras.append({
+                'id': camera_id,
+                'name': f"Camera {number}",
+                'ip': f"192.168.{index // 250 % 250}.{number}",
+                'type': camera_types[rng.randrange(len(camera_types))],
+                'online': True,
+                'rois': [
+                    {
+                        'id': camera_id * 10 + roi,
+                        'cameraId': camera_id,
+                        'type': roi_type,
+                        'name': f"{ROI_TYPE_NAMES[roi_type]} {roi}",
+                        'points': [[0, 0], [rng.randint(50, 640), 0], [rng.randint(50, 640), rng.randint(50, 480)], [0, rng.randint(50, 480)]]
+                    }
+                    for roi, roi_type in enumerate(
+                        (rng.randint(1, 3) for _ in range(rng.randint(0, rois_max))), start=1
+                    )
+                ]
+            })
+
+    def advance(self, fleet):
+        """Применить смену состояния за прошедшие интервалы churn_interval"""
+        now = time.monotonic()
+        with self.lock:
+            steps = int((now - self.last_step) / fleet.churn_interval)
+            if steps <= 0:
+                return
+            self.last_step += steps * fleet.churn_interval
+            # После долгого простоя хватает нескольких шагов - состояние все равно случайное
+            for _ in range(min(steps, 10)):
+                if fleet.churn:
+                    for camera in self.cameras:
+                        if self.rng.random() < fleet.churn:
+                            camera['online'] = not camera['online']
+                if self.down:
+                    if fleet.recovery_rate and self.rng.random() < fleet.recovery_rate:
+                        self.down = False
+                elif fleet.outage_rate and self.rng.random() < fleet.outage_rate:
+                    self.down = True
+
+    def statistics(self):
+        with self.lock:
+            online = sum(1 for camera in self.cameras if camera['online'])
+            stats = {
+                'totalCameras': len(self.cameras),
+                'onlineCameras': online,
+                'offlineCameras': len(self.cameras) - online
+            }
+            for field in CAMERA_TYPES.values():
+                stats[field] = 0
+            for camera in self.cameras:
+                stats[CAMERA_TYPES[camera['type']]] += 1
+            return stats
+
+    def cameras_payload(self):
+        with self.lock:
+            return [
+                {
+                    'id': camera['id'],
+                    'name': camera['name'],
+                    'ip': camera['ip'],
+                    'type': camera['type'],
+                    'status': 'online' if camera['online'] else 'offline',
+                    'hasError': not camera['online']
+                }
+                for camera in self.cameras
+            ]
+
+    def camera_rois(self, camera_id):
+        for camera in self.cameras:
+            if str(camera['id']) == camera_id:
+                return camera['rois']
+        return None
+
+    def export_rois(self):
+        return {
+            'bazar': self.name,
+            'exported_at': datetime.utcnow().isoformat(),
+            'cameras': [{'id': camera['id'], 'name': camera['name'], 'rois': camera['rois']} for camera in self.cameras]
+        }
+
+    def export_streams(self):
+        return {
+            'bazar': self.name,
+            'exported_at': datetime.utcnow().isoformat(),
+            'streams': [
+                {'cameraId': camera['id'], 'name': camera['name'], 'url': f"rtsp://{camera['ip']}:554/stream1"}
+                for camera in self.cameras
+            ]
+        }
+
+
+def make_bazar_handler(fleet, bazar):
+    class SimulatedBazarHandler(BaseHTTPRequestHandler):
+        # HTTP/1.0: соединение закрывается после ответа, поток пула не держится за простаивающее соединение
+        protocol_version = 'HTTP/1.0'
+        timeout = 10
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body, filename=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', 'Content-Disposition')
+            if filename:
+                self.send_header('Content-Disposition', f"attachment; filename={filename}; filename*=UTF-8''{quote(filename)}")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            endpoint = '/api/cameras/<id>/rois' if ROIS_PATH.match(path) else path
+            bazar.advance(fleet)
+            outcome = fleet.pick_outcome(bazar)
+            if outcome == 'down':
+                # Базар недоступен: соединение закрывается без ответа
+                fleet.count(endpoint, 'down')
+                self.close_connection = True
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            if outcome == 'timeout':
+                fleet.count(endpoint, 'timeout')
+                time.sleep(fleet.hang)
+                return
+            fleet.delay()
+            if outcome == 'error':
+                fleet.count(endpoint, 'error')
+                self._reply(500, {'success': False, 'error': 'Internal Server Error'})
+                return
+
+            stamp = datetime.utcnow().strftime('%d%m%Y')
+            match = ROIS_PATH.match(path)
+            if path == '/api/cameras/statistics':
+                self._reply(200, bazar.statistics())
+            elif path == '/api/cameras':
+                self._reply(200, {'success': True, 'data': bazar.cameras_payload()})
+            elif match:
+                rois = bazar.camera_rois(match.group(1))
+                if rois is None:
+                    fleet.count(endpoint, 'not_found')
+                    self._reply(404, {'success': False, 'error': 'Camera not found'})
+                    return
+                self._reply(200, {'success': True, 'data': rois})
+            elif path == '/api/exports/rois':
+                self._reply(200, bazar.export_rois(), filename=f"{bazar.name.upper().replace(' ', '_')}_rois_{stamp}.json")
+            elif path == '/api/exports/streams':
+                self._reply(200, bazar.export_streams(), filename=f"{bazar.name.upper().replace(' ', '_')}_streams_{stamp}.json")
+            else:
+                fleet.count(endpoint, 'not_found')
+                self._reply(404, {'success': False, 'error': 'Not Found'})
+                return
+            fleet.count(endpoint, 'ok')
+
+    return SimulatedBazarHandler
+
+
+class FleetSimulator:
+    """N поддельных бэкендов базаров: один поток принимает соединения на всех портах, пул потоков отвечает"""
+
+    def __init__(self, bazars=10, host='127.0.0.1', base_port=0, threads=64, seed=None, cameras=(8, 40), rois_max=3,
+                 latency=0.0, jitter=0.0, error_rate=0.0, timeout_rate=0.0, hang=3.0, down_rate=0.0,
+                 churn=0.0, churn_interval=10.0, outage_rate=0.0, recovery_rate=0.0):
+        self.host = host
+        self.base_port = base_port
+        self.threads = threads
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.churn = churn
+        self.churn_interval = churn_interval
+        self.outage_rate = outage_rate
+        self.recovery_rate = recovery_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.bazar_count = bazars
+        self.cameras = cameras
+        self.rois_max = rois_max
+        self.down_rate = down_rate
+        self.bazars = []
+        self._listeners = []
+        self._selector = None
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.reset()
+
+    def start(self):
+        _raise_file_limit(self.bazar_count * 2 + self.threads + 256)
+        self._selector = selectors.DefaultSelector()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='fleet')
+        for index in range(self.bazar_count):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.base_port + index if self.base_port else 0))
+            listener.listen(128)
+            listener.setblocking(False)
+            port = listener.getsockname()[1]
+            bazar = SimulatedBazar(index, self.host, port, random.Random(self.rng.random()), self.cameras, self.rois_max)
+            bazar.down = self.rng.random() < self.down_rate
+            handler = make_bazar_handler(self, bazar)
+            self._selector.register(listener, selectors.EVENT_READ, handler)
+            self._listeners.append(listener)
+            self.bazars.append(bazar)
+        self._thread = threading.Thread(target=self._accept_loop, name='fleet-accept', daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=0.5):
+                try:
+                    connection, address = key.fileobj.accept()
+                except (BlockingIOError, OSError):
+                    continue
+                connection.setblocking(True)
+                self._executor.submit(self._serve, key.data, connection, address)
+
+    def _serve(self, handler, connection, address):
+        try:
+            handler(connection, address, self)
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        for listener in self._listeners:
+            self._selector.unregister(listener)
+            listener.close()
+        self._listeners = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def pick_outcome(self, bazar):
+        if bazar.down:
+            return 'down'
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            return 'timeout'
+        if roll < self.timeout_rate + self.error_rate:
+            return 'error'
+        return 'ok'
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def count(self, endpoint, outcome):
+        with self.lock:
+            by_outcome = self.requests.setdefault(endpoint, {})
+            by_outcome[outcome] = by_outcome.get(outcome, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.started_at = time.time()
+
+    def configure(self, **options):
+        """Изменить параметры на ходу (задержка, доли ошибок и таймаутов, churn)"""
+        allowed = ('latency', 'jitter', 'error_rate', 'timeout_rate', 'hang', 'churn', 'churn_interval',
+                   'outage_rate', 'recovery_rate')
+        for name, value in options.items():
+            if name not in allowed:
+                raise ValueError(f"Unknown option: {name}")
+            setattr(self, name, float(value))
+
+    def stats(self):
+        with self.lock:
+            requests = {endpoint: dict(outcomes) for endpoint, outcomes in self.requests.items()}
+            elapsed = time.time() - self.started_at
+        total = sum(sum(outcomes.values()) for outcomes in requests.values())
+        return {
+            'bazars': len(self.bazars),
+            'bazars_down': sum(1 for bazar in self.bazars if bazar.down),
+            'cameras': sum(len(bazar.cameras) for bazar in self.bazars),
+            'requests': requests,
+            'total_requests': total,
+            'elapsed': elapsed,
+            'requests_per_second': total / elapsed if elapsed else 0
+        }
+
+    def seed_database(self, app, notifications=False, replace=False):
+        """Добавить строки BazarStatus для базаров симулятора (app - из create_app или create_db_app)"""
+        from models import BazarStatus, db
+        from state import bump_state_version
+
+        with app.app_context():
+            db.create_all()
+            if replace:
+                BazarStatus.query.filter(
+                    BazarStatus.bazar_name.like(f"{SIMULATED_NAME_PREFIX}%")
+                ).delete(synchronize_session=False)
+            db.session.bulk_save_objects([
+                BazarStatus(
+                    bazar_name=bazar.name,
+                    bazar_ip=bazar.host,
+                    bazar_port=bazar.port,
+                    backend_port=bazar.port,
+                    pg_port=5432,
+                    city=bazar.region,
+                    status='offline',
+                    telegram_notifications_enabled=notifications,
+                    last_offline_cameras_count=0
+                )
+                for bazar in self.bazars
+            ])
+            db.session.commit()
+            # bulk_save_objects не вызывает событий сессии - кэши ответов сбрасываем явно
+            bump_state_version()
+        return len(self.bazars)
+
+
+def _raise_file_limit(needed):
+    """Каждый базар - отдельный слушающий сокет; поднять мягкий лимит открытых файлов до нужного"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def start_fleet(bazars=10, **options):
+    """Запустить симулятор. Возвращает FleetSimulator (shutdown() - остановить)"""
+    return FleetSimulator(bazars=bazars, **options).start()
+
+
+def start_control_server(fleet, host='127.0.0.1', port=0):
+    """HTTP-сервер управления симулятором: /stats, /reset, /config"""
+    class ControlHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, fleet.stats())
+            elif self.path == '/bazars':
+                self._reply(200, [{'name': bazar.name, 'host': bazar.host, 'port': bazar.port, 'down': bazar.down}
+                                  for bazar in fleet.bazars])
+            else:
+                self._reply(404, {'success': False, 'error': 'Not Found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            if self.path == '/reset':
+                fleet.reset()
+                self._reply(200, {'success': True})
+            elif self.path == '/config':
+                try:
+                    fleet.configure(**(json.loads(raw) if raw else {}))
+                except (ValueError, TypeError) as e:
+                    self._reply(400, {'success': False, 'error': str(e)})
+                    return
+                self._reply(200, {'success': True})
+            else:
+                self._reply(404, {'success': False, 'error': 'Not Found'})
+
+    server = ThreadingHTTPServer((host, port), ControlHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fleet-control', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_range(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Симулятор парка базаров')
+    parser.add_argument('--bazars', type=int, default=100)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=0, help='Первый порт (базары на подряд идущих портах); 0 - свободные порты')
+    parser.add_argument('--control-port', type=int, default=8090)
+    parser.add_argument('--threads', type=int, default=64, help='Потоков для ответов')
+    parser.add_argument('--cameras', default='8-40', help='Камер на базар: число или диапазон min-max')
+    parser.add_argument('--rois', type=int, default=3, help='Максимум ROI на камеру')
+    parser.add_argument('--latency', type=float, default=0, help='Задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='Разброс задержки, мс')
+    parser.add_argument('--error-rate', type=float, default=0, help='Доля ответов 500 (0..1)')
+    parser.add_argument('--timeout-rate', type=float, default=0, help='Доля запросов, на которые ответа нет --hang секунд (0..1)')
+    parser.add_argument('--hang', type=float, default=3, help='Сколько держать зависший запрос, с (таймаут опроса мониторинга - 2 с)')
+    parser.add_argument('--down-rate', type=float, default=0, help='Доля недоступных базаров при старте (0..1)')
+    parser.add_argument('--churn', type=float, default=0, help='Вероятность смены состояния камеры за интервал (0..1)')
+    parser.add_argument('--churn-interval', type=float, default=10, help='Интервал смены состояния, с')
+    parser.add_argument('--outage-rate', type=float, default=0, help='Вероятность, что базар станет недоступен за интервал')
+    parser.add_argument('--recovery-rate', type=float, default=0, help='Вероятность, что недоступный базар вернется за интервал')
+    parser.add_argument('--random-seed', type=int, default=None, help='Зерно генератора для повторяемых прогонов')
+    parser.add_argument('--seed', action='store_true', help='Добавить BazarStatus в базу SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--replace', action='store_true', help='Перед --seed удалить ранее добавленные базары симулятора')
+    parser.add_argument('--notifications', action='store_true', help='Включить Telegram уведомления у добавленных базаров')
+    args = parser.parse_args()
+
+    fleet = start_fleet(
+        bazars=args.bazars, host=args.host, base_port=args.base_port, threads=args.threads,
+        seed=args.random_seed, cameras=parse_range(args.cameras), rois_max=args.rois,
+        latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate, hang=args.hang, down_rate=args.down_rate, churn=args.churn,
+        churn_interval=args.churn_interval, outage_rate=args.outage_rate, recovery_rate=args.recovery_rate
+    )
+    control, control_url = start_control_server(fleet, args.host, args.control_port)
+    ports = [bazar.port for bazar in fleet.bazars]
+    print(f"Simulating {len(fleet.bazars)} bazar(s) on {args.host}, ports {min(ports)}-{max(ports)}")
+    print(f"Control: {control_url}/stats, {control_url}/bazars")
+
+    if args.seed:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        # Для заполнения базы достаточно моделей - API и фоновые задачи не загружаются
+        from models import create_db_app
+        app = create_db_app()
+        count = fleet.seed_database(app, notifications=args.notifications, replace=args.replace)
+        print(f"Seeded {count} BazarStatus row(s) into {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        control.shutdown()
+        fleet.shutdown()
+
+
+if __name__ == '__main__':
+    main()
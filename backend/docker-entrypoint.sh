@@ -3,6 +3,9 @@
 
 set -e
 
+# Момент старта контейнера: от него /api/health считает время готовности
+export BOOT_STARTED_AT=$(date +%s.%N)
+
 echo "🚀 Запуск Bazar Monitoring Backend..."
 
 # Создаем директорию для базы данных если её нет
@@ -18,25 +21,34 @@ fi
 
 echo "✅ Directory /app/instance is ready"
 
-# Ожидание готовности базы данных (если используется внешняя БД)
-echo "⏳ Проверка доступности базы данных..."
-sleep 2
-
-# Сброс миграций и создание базы данных
+# Миграции: если ревизия схемы в базе совпадает с моделями, скрипт завершается после одной выборки.
+# Доступность внешней БД скрипт ждет сам (DB_WAIT_TIMEOUT), фиксированная пауза не нужна
 echo "🔄 Выполнение миграций базы данных..."
+MIGRATION_STARTED_AT=$(date +%s.%N)
+set +e
 python reset_migrations.py
+MIGRATION_STATUS=$?
+set -e
+export MIGRATION_SECONDS=$(awk -v start="$MIGRATION_STARTED_AT" -v end="$(date +%s.%N)" 'BEGIN { printf "%.3f", end - start }')
 
 # Проверка успешности сброса
-if [ $? -eq 0 ]; then
+if [ $MIGRATION_STATUS -eq 0 ]; then
     echo "✅ SUCCESS: Migration system reset completed"
 else
     echo "⚠️ WARNING: Possible issues with migration reset"
     # Пытаемся создать таблицы напрямую как fallback
     echo "🔄 Attempting fallback: creating tables directly..."
-    python -c "from app import app, db; app.app_context().push(); db.create_all(); print('✅ Tables created via fallback')"
+    python -c "from models import create_db_app, db; create_db_app().app_context().push(); db.create_all(); print('✅ Tables created via fallback')"
 fi
 
 # Запуск основного приложения
-echo "🚀 Starting Flask application..."
-exec python app.py
+# SERVER_MODE=gunicorn (по умолчанию) - продакшен-сервер, настройки в gunicorn.conf.py;
+# SERVER_MODE=dev - сервер разработки Flask с отладчиком
+if [ "${SERVER_MODE:-gunicorn}" = "dev" ]; then
+    echo "🚀 Starting Flask development server..."
+    exec python app.py
+fi
+
+echo "🚀 Starting gunicorn..."
+exec gunicorn -c gunicorn.conf.py wsgi:app
 
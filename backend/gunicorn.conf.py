@@ -0,0 +1,87 @@
+"""
+Настройки gunicorn для продакшен-режима. Все значения задаются переменными окружения.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Воркеры только обслуживают запросы (BACKGROUND_SCHEDULER=false). Фоновый
+планировщик работает в одном отдельном процессе scheduler.py, который
+запускается после старта мастера и перезапускается, если завершился.
+Приложение загружается в каждом воркере после fork (preload_app = False),
+поэтому потоки очередей доставки создаются уже в воркерах.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+# gthread - пул потоков в каждом воркере; gevent - требует pip install gevent
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# /api/bazars опрашивает все базары, поэтому таймаут воркера больше стандартных 30 секунд
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+preload_app = False
+raw_env = ['BACKGROUND_SCHEDULER=false']
+
+# false - планировщик запускается отдельно (например, другим сервисом docker-compose)
+SCHEDULER_PROCESS = os.environ.get('SCHEDULER_PROCESS', 'true').lower() in ('1', 'true', 'yes')
+
+_scheduler = {'process': None, 'stopping': False}
+
+
+def _spawn_scheduler(server):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheduler.py')
+    process = subprocess.Popen([sys.executable, script], env=dict(os.environ, BACKGROUND_SCHEDULER='true'))
+    server.log.info(f"Started scheduler process (pid {process.pid})")
+    return process
+
+
+def _watch_scheduler(server):
+    """Перезапускать процесс планировщика, если он завершился"""
+    while not _scheduler['stopping']:
+        process = _scheduler['process']
+        process.wait()
+        if _scheduler['stopping']:
+            return
+        server.log.warning(f"Scheduler process {process.pid} exited with code {process.returncode}, restarting")
+        time.sleep(5)
+        if not _scheduler['stopping']:
+            _scheduler['process'] = _spawn_scheduler(server)
+
+
+def when_ready(server):
+    if not SCHEDULER_PROCESS:
+        server.log.info("Scheduler process disabled (SCHEDULER_PROCESS=false)")
+        return
+    _scheduler['process'] = _spawn_scheduler(server)
+    threading.Thread(target=_watch_scheduler, args=(server,), name='scheduler-watch', daemon=True).start()
+
+
+def post_worker_init(worker):
+    # Инициализация сразу после загрузки приложения, а не на первом запросе:
+    # воркер готов до первой проверки /api/health, и время готовности в ней - реальное
+    from app import initialize_app
+    initialize_app()
+
+
+def on_exit(server):
+    _scheduler['stopping'] = True
+    process = _scheduler['process']
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=graceful_timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
@@ -1,13 +1,17 @@
 """
 Скрипт для автоматической инициализации базы данных и выполнения миграций
+
+Загружает только модели и Flask-Migrate, без API и фоновых задач.
 """
-from app import app, db, migrate
-from flask_migrate import init, migrate as flask_migrate, upgrade
+from models import create_db_app, db
+from flask_migrate import Migrate, init, migrate as flask_migrate, upgrade
 import os
 import sys
 
 def init_database():
     """Инициализирует базу данных с использованием Flask-Migrate"""
+    app = create_db_app()
+    Migrate(app, db)
     with app.app_context():
         # Создаем папку для БД если её нет
         db_path = os.path.dirname(app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', ''))
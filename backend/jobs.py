@@ -0,0 +1,207 @@
+"""
+Фоновые задачи процесса: опрос камер, хранение логов, пересчет uptime,
+прогрев кэшей ответов и их регистрация в планировщике.
+"""
+from datetime import datetime, timedelta
+import os
+import logging
+import time
+from models import app_context, BazarLog, BazarStatus, db, get_app
+from observability import INTERNAL_REQUEST_ENVIRON, item_logger, metrics, METRICS_FLUSH_INTERVAL
+from state import bump_state_version, get_state_version, sync_shared_state, update_camera_snapshot
+from scheduling import CronTrigger, IntervalTrigger, job_scheduler, scheduler_leader
+from probes import fetch_bazar_info
+from telegram import (
+    chat_routing_index, check_and_notify_camera_changes, get_bazars_keyboard_layout, get_bot_tokens,
+    notification_digest, notification_outbox, telegram_updates
+)
+
+logger = logging.getLogger(__name__)
+
+def background_check_cameras():
+    """Фоновая задача для периодической проверки статуса камер и отправки уведомлений"""
+    with app_context():
+        try:
+            started = time.perf_counter()
+            
+            # Получаем все сервисы с включенными уведомлениями
+            services = BazarStatus.query.filter_by(telegram_notifications_enabled=True).all()
+            
+            if not services:
+                logger.debug("No services with enabled notifications found")
+                return
+            
+            logger.debug("Checking %s service(s) with enabled notifications", len(services))
+            
+            with notification_digest():
+                for service in services:
+                    try:
+                        # Формируем endpoint для проверки
+                        endpoint = {
+                            'ip': service.bazar_ip,
+                            'port': service.bazar_port,
+                            'backendPort': service.backend_port,
+                            'pgPort': service.pg_port
+                        }
+                    
+                        # Получаем статистику камер
+                        result = fetch_bazar_info(endpoint)
+                    
+                        if result['success']:
+                            camera_stats = result['data'] if isinstance(result['data'], dict) else {}
+                            update_camera_snapshot(service.id, camera_stats)
+                            # Проверяем изменения и отправляем уведомления
+                            check_and_notify_camera_changes(service, camera_stats)
+                            item_logger.debug("Checked cameras for %s: %s online, %s offline", service.bazar_name,
+                                              camera_stats.get('onlineCameras', 0), camera_stats.get('offlineCameras', 0),
+                                              extra={'bazar_id': service.id})
+                        else:
+                            update_camera_snapshot(service.id, None)
+                            item_logger.warning("Failed to fetch camera stats for %s: %s", service.bazar_name,
+                                                result.get('error', 'Unknown error'), extra={'bazar_id': service.id})
+                        
+                    except Exception as e:
+                        item_logger.error("Error checking cameras for %s: %s", service.bazar_name, e, exc_info=True,
+                                          extra={'bazar_id': service.id})
+            
+            logger.info("Background camera check completed: %s service(s) in %.2fs", len(services),
+                        time.perf_counter() - started, extra={'services': len(services)})
+            
+        except Exception as e:
+            logger.error(f"Error in background camera check: {e}", exc_info=True)
+
+# Интервалы фоновых задач
+# false - процесс не претендует на роль владельца: опрос базаров выполняет другой процесс (scheduler.py)
+BACKGROUND_SCHEDULER = os.environ.get('BACKGROUND_SCHEDULER', 'true').lower() in ('1', 'true', 'yes')
+CAMERA_CHECK_INTERVAL = int(os.environ.get('CAMERA_CHECK_INTERVAL', 300))
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 0))  # 0 - хранить логи бессрочно
+LOG_RETENTION_CRON = os.environ.get('LOG_RETENTION_CRON', '30 3 * * *')
+UPTIME_WINDOW_DAYS = int(os.environ.get('UPTIME_WINDOW_DAYS', 30))
+UPTIME_ROLLUP_INTERVAL = int(os.environ.get('UPTIME_ROLLUP_INTERVAL', 900))
+STATE_SYNC_INTERVAL = float(os.environ.get('STATE_SYNC_INTERVAL', 2))
+CACHE_WARM_INTERVAL = float(os.environ.get('CACHE_WARM_INTERVAL', 10))  # 0 - не прогревать
+CACHE_WARM_PATHS = [
+    path.strip() for path in os.environ.get(
+        'CACHE_WARM_PATHS', '/api/status,/api/bazars?mode=snapshot,/api/cameras/statistics?mode=snapshot'
+    ).split(',') if path.strip()
+]
+
+def purge_old_logs(days=None, chunk_size=5000):
+    """Удалить логи старше days дней частями по chunk_size строк. Возвращает число удаленных"""
+    days = LOG_RETENTION_DAYS if days is None else days
+    if not days:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = [log_id for (log_id,) in db.session.query(BazarLog.id).filter(BazarLog.timestamp < cutoff).limit(chunk_size)]
+        if not ids:
+            break
+        BazarLog.query.filter(BazarLog.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+    if deleted:
+        bump_state_version()
+        logger.info(f"Log retention: deleted {deleted} log(s) older than {days} day(s)")
+    return deleted
+
+def rollup_uptime(days=None):
+    """Пересчитать uptime_percentage базаров по переходам статуса за последние days дней"""
+    days = UPTIME_WINDOW_DAYS if days is None else days
+    now = datetime.utcnow()
+    window_start = now - timedelta(days=days)
+    transitions = {}
+    for log in db.session.query(
+        BazarLog.bazar_ip, BazarLog.bazar_port, BazarLog.status, BazarLog.previous_status, BazarLog.timestamp
+    ).filter(
+        BazarLog.action_type == 'status_change',
+        BazarLog.timestamp >= window_start
+    ).order_by(BazarLog.timestamp):
+        transitions.setdefault((log.bazar_ip, log.bazar_port), []).append(log)
+    
+    updated = 0
+    for service in BazarStatus.query.all():
+        events = transitions.get((service.bazar_ip, service.bazar_port), [])
+        cursor = window_start
+        if not events:
+            state = service.status
+        elif events[0].previous_status is None:
+            # Базар появился внутри окна - считаем с первой записи
+            cursor, state, events = events[0].timestamp, events[0].status, events[1:]
+        else:
+            state = events[0].previous_status
+        
+        started = cursor
+        online_seconds = 0.0
+        for event_row in events:
+            if state == 'online':
+                online_seconds += (event_row.timestamp - cursor).total_seconds()
+            cursor, state = event_row.timestamp, event_row.status
+        if state == 'online':
+            online_seconds += (now - cursor).total_seconds()
+        
+        total_seconds = (now - started).total_seconds()
+        if total_seconds > 0:
+            uptime = round(online_seconds / total_seconds * 100, 2)
+        else:
+            uptime = 100.0 if state == 'online' else 0.0
+        if service.uptime_percentage is None or abs(service.uptime_percentage - uptime) >= 0.01:
+            service.uptime_percentage = uptime
+            updated += 1
+    db.session.commit()
+    return updated
+
+_cache_warm_state = {'version': None}
+
+def warm_response_caches():
+    """Собрать горячие ответы заново после смены версии состояния, до прихода запросов
+
+    Запросы прогрева помечены как внутренние и не попадают в метрики HTTP
+    и журнал медленных запросов.
+    """
+    version = get_state_version()
+    if version == _cache_warm_state['version']:
+        return
+    client = get_app().test_client()
+    for path in CACHE_WARM_PATHS:
+        for headers in ({'Accept-Encoding': 'gzip'}, {}):
+            client.get(path, headers=headers, environ_base={INTERNAL_REQUEST_ENVIRON: True})
+    if get_bot_tokens():
+        get_bazars_keyboard_layout()
+    _cache_warm_state['version'] = version
+
+def register_background_jobs():
+    """Зарегистрировать фоновые задачи (один раз на процесс)"""
+    if job_scheduler.has_job('camera-probe'):
+        return
+    # Опрос базаров, уведомления и обслуживание outbox - только во владельце аренды
+    job_scheduler.add_job('camera-probe', background_check_cameras, IntervalTrigger(CAMERA_CHECK_INTERVAL),
+                          leader_only=True, run_immediately=True)
+    job_scheduler.add_job('outbox-maintenance', notification_outbox.maintain, IntervalTrigger(60), leader_only=True)
+    job_scheduler.add_job('telegram-updates-maintenance', telegram_updates.maintain, IntervalTrigger(60), leader_only=True)
+    job_scheduler.add_job('uptime-rollup', rollup_uptime, IntervalTrigger(UPTIME_ROLLUP_INTERVAL), leader_only=True)
+    if LOG_RETENTION_DAYS > 0:
+        job_scheduler.add_job('log-retention', purge_old_logs, CronTrigger(LOG_RETENTION_CRON), leader_only=True)
+    # Обмен состоянием и прогрев кэшей - в каждом процессе
+    job_scheduler.add_job('state-sync', sync_shared_state, IntervalTrigger(STATE_SYNC_INTERVAL))
+    job_scheduler.add_job('chat-routing-sync', chat_routing_index.sync, IntervalTrigger(STATE_SYNC_INTERVAL))
+    job_scheduler.add_job('metrics-flush', metrics.flush, IntervalTrigger(METRICS_FLUSH_INTERVAL), run_immediately=True)
+    if CACHE_WARM_INTERVAL > 0:
+        job_scheduler.add_job('cache-warm', warm_response_caches, IntervalTrigger(CACHE_WARM_INTERVAL))
+
+def start_background_scheduler():
+    """Запустить фоновые задачи процесса
+
+    Задачи регистрируются и выполняются в каждом процессе. Процесс с
+    BACKGROUND_SCHEDULER=true участвует в выборе владельца (SchedulerLeader);
+    задачи leader_only (опрос базаров, уведомления, обслуживание логов)
+    выполняет только владелец, остальные при его падении перехватывают роль.
+    """
+    register_background_jobs()
+    if BACKGROUND_SCHEDULER:
+        scheduler_leader.start()
+    job_scheduler.start()
+    logger.info(
+        f"Background scheduler started (camera check every {CAMERA_CHECK_INTERVAL}s, "
+        f"leader: {scheduler_leader.is_leader()}, owner: {scheduler_leader.owner_id})"
+    )
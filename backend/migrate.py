@@ -1,15 +1,23 @@
 #!/usr/bin/env python
 """
 Скрипт для управления миграциями базы данных
+
+Загружает только модели и Flask-Migrate, без API и фоновых задач.
 """
-from flask_migrate import init, migrate, upgrade, downgrade, stamp
-from app import app, db
+from flask_migrate import Migrate, init, migrate, upgrade, downgrade, stamp
+from models import create_db_app, db
 import sys
 import os
 
+def create_migrate_app():
+    """Приложение только с базой и Flask-Migrate"""
+    app = create_db_app()
+    Migrate(app, db)
+    return app
+
 def run_migrations():
     """Запускает процесс миграции"""
-    with app.app_context():
+    with create_migrate_app().app_context():
         migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
         
         # Инициализация миграций если еще не инициализированы
@@ -42,7 +50,7 @@ def run_migrations():
 
 def rollback_migration():
     """Откатывает последнюю миграцию"""
-    with app.app_context():
+    with create_migrate_app().app_context():
         print("Rolling back last migration...")
         try:
             downgrade()
@@ -80,7 +88,7 @@ if __name__ == '__main__':
     if command == 'help' or command == '--help' or command == '-h':
         show_help()
     elif command == 'upgrade':
-        with app.app_context():
+        with create_migrate_app().app_context():
             upgrade()
             print("SUCCESS: Migrations applied")
     elif command == 'downgrade':
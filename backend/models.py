@@ -0,0 +1,408 @@
+"""
+Модели базы данных и ревизия схемы.
+
+Модуль не зависит от остального приложения: его импортируют CLI-скрипты
+(reset_migrations.py, init_db.py, migrate.py), которым не нужны API,
+планировщик и Telegram. Полное приложение собирает create_app (app.py).
+"""
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import os
+import hashlib
+import json
+
+db = SQLAlchemy()
+
+# Приложение процесса (create_app): фоновым потокам нужен его контекст
+_app = None
+
+def default_database_uri():
+    """SQLite база instance/bazar_monitoring.db рядом с кодом (директорию создает initialize_app)"""
+    basedir = os.path.abspath(os.path.dirname(__file__))
+    # Нормализуем путь для Windows (заменяем обратные слеши на прямые)
+    db_path = os.path.normpath(os.path.join(basedir, "instance", "bazar_monitoring.db"))
+    if os.name == 'nt':  # Windows
+        return f'sqlite:///{db_path.replace(os.sep, "/")}'
+    return f'sqlite:///{db_path}'
+
+def database_config():
+    """Настройки базы по умолчанию: SQLALCHEMY_DATABASE_URI из окружения или default_database_uri()"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('SQLALCHEMY_DATABASE_URI', default_database_uri()),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False
+    }
+
+def create_db_app(config=None):
+    """Минимальное приложение Flask только с базой - для CLI-скриптов.
+
+    Не подключает API, логирование, метрики и фоновые задачи.
+    """
+    app = Flask(__name__)
+    app.config.update(database_config())
+    if config:
+        app.config.update(config)
+    db.init_app(app)
+    return app
+
+def bind_app(app):
+    """Запомнить приложение процесса (вызывает create_app)"""
+    global _app
+    _app = app
+
+def get_app():
+    """Приложение процесса, созданное create_app"""
+    if _app is None:
+        raise RuntimeError('Приложение не создано: сначала вызовите create_app()')
+    return _app
+
+def app_context():
+    """Контекст приложения процесса - для фоновых потоков и задач вне запроса"""
+    return get_app().app_context()
+
+# Модели базы данных
+class BazarLog(db.Model):
+    """Лог изменений статуса базара и административных действий"""
+    id = db.Column(db.Integer, primary_key=True)
+    bazar_name = db.Column(db.String(200), nullable=False)
+    bazar_ip = db.Column(db.String(50), nullable=False)
+    bazar_port = db.Column(db.Integer, nullable=False)
+    city = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False)  # online/offline/added/updated/deleted
+    previous_status = db.Column(db.String(20))
+    error_message = db.Column(db.Text)
+    action_type = db.Column(db.String(50))  # status_change/service_added/service_updated/service_deleted
+    action_details = db.Column(db.Text)  # JSON с деталями действия
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'bazar_name': self.bazar_name,
+            'bazar_ip': self.bazar_ip,
+            'bazar_port': self.bazar_port,
+            'city': self.city,
+            'status': self.status,
+            'previous_status': self.previous_status,
+            'error_message': self.error_message,
+            'action_type': self.action_type,
+            'action_details': self.action_details,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+class BazarStatus(db.Model):
+    """Текущий статус базара"""
+    id = db.Column(db.Integer, primary_key=True)
+    bazar_name = db.Column(db.String(200), nullable=False)
+    bazar_ip = db.Column(db.String(50), nullable=False)
+    bazar_port = db.Column(db.Integer, nullable=False)
+    backend_port = db.Column(db.Integer, nullable=False)
+    pg_port = db.Column(db.Integer, nullable=False)
+    stream_port = db.Column(db.Integer)  # Порт Stream
+    city = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False)  # online/offline
+    last_online = db.Column(db.DateTime)
+    last_offline = db.Column(db.DateTime)
+    last_check = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    uptime_percentage = db.Column(db.Float, default=100.0)
+    # Контакты
+    contact_click = db.Column(db.String(20))        # Контакт от Click
+    contact_click_name = db.Column(db.String(100))  # Имя контакта Click
+    contact_scc = db.Column(db.String(20))          # Контакт от SCC
+    contact_scc_name = db.Column(db.String(100))    # Имя контакта SCC
+    # Координаты для карты
+    latitude = db.Column(db.Float)   # Широта
+    longitude = db.Column(db.Float)  # Долгота
+    # Telegram уведомления
+    telegram_notifications_enabled = db.Column(db.Boolean, default=False)  # Включены ли уведомления
+    last_offline_cameras_count = db.Column(db.Integer, default=0)  # Последнее количество неработающих камер
+    last_notification_time = db.Column(db.DateTime)  # Время последнего уведомления
+    notification_check_interval = db.Column(db.Integer, default=3600)  # Интервал проверки в секундах (по умолчанию 1 час)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.bazar_name,
+            'ip': self.bazar_ip,
+            'port': self.bazar_port,
+            'backend_port': self.backend_port,
+            'pg_port': self.pg_port,
+            'stream_port': self.stream_port,
+            'city': self.city,
+            'status': self.status,
+            'last_online': self.last_online.isoformat() if self.last_online else None,
+            'last_offline': self.last_offline.isoformat() if self.last_offline else None,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'uptime_percentage': self.uptime_percentage,
+            'contact_click': self.contact_click,
+            'contact_click_name': self.contact_click_name,
+            'contact_scc': self.contact_scc,
+            'contact_scc_name': self.contact_scc_name,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'telegram_notifications_enabled': self.telegram_notifications_enabled or False
+        }
+
+class TelegramSettings(db.Model):
+    """Настройки Telegram бота"""
+    id = db.Column(db.Integer, primary_key=True)
+    bot_token = db.Column(db.String(200), nullable=False)  # Токен бота
+    extra_bot_tokens = db.Column(db.Text, nullable=True)  # JSON список дополнительных токенов для рассылки
+    chat_id = db.Column(db.String(100))  # Chat ID для отправки уведомлений (опционально, основной)
+    enabled = db.Column(db.Boolean, default=True)  # Включены ли уведомления
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_extra_bot_tokens(self):
+        """Получить список дополнительных токенов ботов"""
+        if not self.extra_bot_tokens:
+            return []
+        try:
+            return [token for token in json.loads(self.extra_bot_tokens) if token]
+        except ValueError:
+            return []
+    
+    def set_extra_bot_tokens(self, tokens):
+        """Установить список дополнительных токенов ботов"""
+        tokens = [token.strip() for token in (tokens or []) if token and token.strip()]
+        self.extra_bot_tokens = json.dumps(tokens) if tokens else None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'bot_token': self.bot_token[:10] + '...' if self.bot_token else None,  # Показываем только начало токена
+            'extra_bot_tokens': [token[:10] + '...' for token in self.get_extra_bot_tokens()],
+            'chat_id': self.chat_id,
+            'enabled': self.enabled,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TelegramChatId(db.Model):
+    """Chat ID для отправки уведомлений (множественные)"""
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(100), nullable=False)  # Только числовой ID (например: -1001234567890 или 123456789)
+    chat_type = db.Column(db.String(20), default='channel')  # channel, group, user
+    description = db.Column(db.String(200))  # Описание (например, "Основной канал", "Личные уведомления")
+    allowed_regions = db.Column(db.Text)  # JSON список разрешенных областей (если None - все области)
+    enabled = db.Column(db.Boolean, default=True)
+    last_message_id = db.Column(db.Integer, nullable=True)  # ID последнего отправленного сообщения для удаления
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_allowed_regions(self):
+        """Получить список разрешенных областей"""
+        if not self.allowed_regions:
+            return None  # None означает все области
+        try:
+            import json
+            return json.loads(self.allowed_regions)
+        except:
+            return None
+    
+    def set_allowed_regions(self, regions):
+        """Установить список разрешенных областей"""
+        if regions is None or len(regions) == 0:
+            self.allowed_regions = None
+        else:
+            import json
+            self.allowed_regions = json.dumps(regions)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'chat_id': self.chat_id,
+            'chat_type': self.chat_type,
+            'description': self.description,
+            'allowed_regions': self.get_allowed_regions(),
+            'enabled': self.enabled,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TelegramStatusMessage(db.Model):
+    """Статусное сообщение в чате, которое обновляется через editMessageText.
+
+    scope/scope_key определяют, о чем сообщение: 'bazar' + ID базара.
+    Сводки всегда отправляются новыми сообщениями и здесь не хранятся.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('chat_row_id', 'scope', 'scope_key', name='uq_telegram_status_message'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    chat_row_id = db.Column(db.Integer, db.ForeignKey('telegram_chat_id.id'), nullable=False, index=True)
+    scope = db.Column(db.String(20), nullable=False)
+    scope_key = db.Column(db.String(100), nullable=False)
+    message_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TelegramStatusJob(db.Model):
+    """Фоновая отправка текущего состояния в chat ID и её прогресс.
+
+    Хранится в базе, чтобы состояние задачи видели все процессы, а не только
+    воркер, который её принял. status: queued, running, done, failed.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    chat_row_id = db.Column(db.Integer, nullable=False, index=True)  # Без внешнего ключа: chat ID могут удалить
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    bazars = db.Column(db.Integer, nullable=False, default=0)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'chat_row_id': self.chat_row_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'bazars': self.bazars,
+            'messages': self.messages,
+            'sent': self.sent,
+            'error': self.error
+        }
+
+class NotificationOutbox(db.Model):
+    """Исходящее уведомление о базаре для одного чата (outbox).
+
+    Строка пишется в той же транзакции, что и изменение состояния базара,
+    поэтому уведомление не теряется при перезапуске процесса. Воркеры
+    доставки забирают строки пачками; idempotency_key не дает записать одно
+    и то же событие для чата дважды.
+    status: held (ждет конца цикла проверки), pending, sending, sent, failed.
+    """
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    chat_row_id = db.Column(db.Integer, db.ForeignKey('telegram_chat_id.id'), nullable=False, index=True)
+    bazar_key = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON с полями DigestItem
+    batch_id = db.Column(db.String(32), nullable=True)  # Цикл проверки, в котором записано уведомление
+    claimed_by = db.Column(db.String(32), nullable=True)  # Метка выборки воркера доставки
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    refresh_only = db.Column(db.Boolean, nullable=False, default=False)  # Текст не изменился - только обновить время
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class NotificationFingerprint(db.Model):
+    """Отпечаток содержимого последнего доставленного в чат уведомления о базаре.
+
+    Отпечаток не включает время отправки, поэтому повторное напоминание
+    с тем же числом камер дает тот же отпечаток и не рассылается заново.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('chat_row_id', 'bazar_key', name='uq_notification_fingerprint'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    chat_row_id = db.Column(db.Integer, db.ForeignKey('telegram_chat_id.id'), nullable=False, index=True)
+    bazar_key = db.Column(db.String(100), nullable=False)
+    content_hash = db.Column(db.String(40), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TelegramUpdate(db.Model):
+    """Обновление webhook Telegram, принятое любым воркером.
+
+    update_id - первичный ключ: повторная доставка того же обновления не
+    вставится второй раз ни в одном процессе. Обрабатывает строки владелец
+    аренды планировщика. status: pending, processing, done, failed.
+    """
+    __table_args__ = (
+        db.Index('ix_telegram_update_status_update_id', 'status', 'update_id'),
+    )
+    update_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON обновления
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    claimed_by = db.Column(db.String(32), nullable=True)  # Метка выборки владельца
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchedulerLease(db.Model):
+    """Аренда роли владельца фонового планировщика.
+
+    Процесс, чей owner записан в строке и чья аренда не истекла, выполняет
+    фоновые проверки камер и рассылку уведомлений. Владелец продлевает
+    аренду heartbeat'ами; если он пропал, аренду забирает другой процесс.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'acquired_at': self.acquired_at.isoformat() if self.acquired_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class AppState(db.Model):
+    """Общая для всех процессов версия состояния (см. sync_shared_state)"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CameraSnapshot(db.Model):
+    """Последняя статистика камер базара, опубликованная для других процессов"""
+    service_id = db.Column(db.Integer, primary_key=True)
+    stats = db.Column(db.Text, nullable=True)  # JSON; NULL - базар был недоступен
+    checked_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class SchemaRevision(db.Model):
+    """Ревизия схемы, до которой reset_migrations.py довел базу (одна строка, id = 1)"""
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def compute_schema_revision():
+    """Отпечаток схемы моделей: таблицы, колонки с типами и индексы.
+
+    Меняется при любом изменении моделей, в том числе при добавлении колонок,
+    которые reset_migrations.py доносит в существующую базу через ALTER TABLE.
+    """
+    parts = []
+    for table in sorted(db.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        for column in table.columns:
+            parts.append(f"{column.name}:{column.type}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            parts.append(f"index:{index.name}:{','.join(column.name for column in index.columns)}")
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+SCHEMA_REVISION = compute_schema_revision()
+
+def get_database_schema_revision():
+    """Ревизия схемы, записанная в базе (None - база новая или еще не приводилась)"""
+    try:
+        return db.session.execute(text('SELECT revision FROM schema_revision WHERE id = 1')).scalar()
+    except SQLAlchemyError:
+        db.session.rollback()
+        return None
+
+def schema_is_current():
+    """Одна выборка: база уже приведена к текущей схеме моделей и миграции не нужны"""
+    return get_database_schema_revision() == SCHEMA_REVISION
+
+def stamp_schema_revision():
+    """Записать текущую ревизию схемы после миграций"""
+    row = db.session.get(SchemaRevision, 1) or SchemaRevision(id=1)
+    row.revision = SCHEMA_REVISION
+    row.applied_at = datetime.utcnow()
+    db.session.add(row)
+    db.session.commit()
@@ -0,0 +1,601 @@
+"""
+Наблюдаемость: логирование, метрики Prometheus, разбивка времени запросов
+по фазам, профили запросов и время старта процесса.
+"""
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlencode
+import os
+import atexit
+import json
+import logging.handlers
+import bisect
+import copy
+import cProfile
+import hmac
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from models import db, SCHEMA_REVISION
+
+# Настройка логирования
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()  # json - строка JSON на запись, text - обычный текст
+# Записи уходят в очередь, в поток вывода их пишет отдельный поток (QueueListener)
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Не больше LOG_SAMPLE_BURST строк с одним шаблоном за LOG_SAMPLE_INTERVAL секунд в логгере по базарам/чатам; 0 - без прореживания
+LOG_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', 20))
+LOG_SAMPLE_INTERVAL = float(os.environ.get('LOG_SAMPLE_INTERVAL', 60))
+
+# Стандартные атрибуты LogRecord; остальные (из extra=) выводятся в JSON отдельными полями
+LOG_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonLogFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in record.__dict__.items():
+            if key not in LOG_RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_exception_formatter = logging.Formatter()
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокирует поток вызова: при переполненной очереди запись отбрасывается.
+
+    Очередь - queue.SimpleQueue (реализована на C, без Condition), граница
+    capacity проверяется приблизительно по qsize().
+    """
+
+    def __init__(self, log_queue, capacity):
+        super().__init__(log_queue)
+        self.capacity = capacity
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Текст и traceback фиксируются в потоке вызова (аргументы могут измениться позже),
+        # форматирование в JSON и запись в поток вывода - в потоке QueueListener
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.capacity and self.queue.qsize() >= self.capacity:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class LogSampler(logging.Filter):
+    """Прореживание повторяющихся строк: не больше burst записей с одним шаблоном
+    сообщения за interval секунд. ERROR и выше проходят всегда. Число
+    отброшенных записей попадает в поле sampled_out следующей прошедшей.
+    """
+
+    def __init__(self, burst, interval):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sampled_out = 0
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno >= logging.ERROR:
+            return True
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) > 1000:
+                    # Шаблонов обычно десятки; тысячи - значит, кто-то логирует f-строками
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                if window is not None and window[2]:
+                    record.sampled_out = window[2]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.sampled_out += 1
+            return False
+
+# QueueListener процесса; None - логирование не настроено или синхронное
+log_listener = None
+_logging_configured = False
+
+def configure_logging():
+    """Настроить корневой логгер по переменным LOG_*. Возвращает запущенный QueueListener или None
+
+    Вызывается из create_app, а не при импорте: CLI-скрипты, которым нужны
+    только модели, не меняют настройки логирования процесса. Повторный вызов
+    ничего не делает.
+    """
+    global log_listener, _logging_configured
+    if _logging_configured:
+        return log_listener
+    _logging_configured = True
+    if LOG_FORMAT == 'json':
+        formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s')
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    if not LOG_ASYNC:
+        root.addHandler(stream_handler)
+        return None
+    log_queue = queue.SimpleQueue()
+    root.addHandler(NonBlockingQueueHandler(log_queue, LOG_QUEUE_SIZE))
+    log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    log_listener.start()
+    # Дописать очередь при завершении процесса
+    atexit.register(stop_log_listener)
+    return log_listener
+
+def stop_log_listener():
+    """Дописать оставшиеся записи и остановить поток логирования (повторный вызов ничего не делает)"""
+    if log_listener is not None and log_listener._thread is not None:
+        log_listener.stop()
+
+logger = logging.getLogger(__name__)
+# Строки по отдельным базарам и чатам - в цикле проверки их тысячи, поэтому они прореживаются
+item_logger = logging.getLogger('bazar.items')
+log_sampler = LogSampler(LOG_SAMPLE_BURST, LOG_SAMPLE_INTERVAL)
+item_logger.addFilter(log_sampler)
+
+def get_logging_stats():
+    handler = logging.getLogger().handlers[0] if logging.getLogger().handlers else None
+    return {
+        'level': LOG_LEVEL,
+        'format': LOG_FORMAT,
+        'async': log_listener is not None,
+        'queue_size': handler.queue.qsize() if isinstance(handler, NonBlockingQueueHandler) else 0,
+        'queue_capacity': LOG_QUEUE_SIZE if log_listener is not None else 0,
+        'dropped': handler.dropped if isinstance(handler, NonBlockingQueueHandler) else 0,
+        'sampled_out': log_sampler.sampled_out,
+        'sample_burst': LOG_SAMPLE_BURST,
+        'sample_interval': LOG_SAMPLE_INTERVAL
+    }
+
+# Метрики в формате Prometheus
+METRICS_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class MetricCounter:
+    """Счетчик с метками; значения по кортежам значений меток"""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+class MetricHistogram:
+    """Гистограмма с фиксированными границами; хранит число наблюдений по корзинам и сумму"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            entry['counts'][index] += 1
+            entry['sum'] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), {'counts': list(entry['counts']), 'sum': entry['sum']}]
+                    for labels, entry in self._values.items()]
+
+class MetricsRegistry:
+    """Метрики процесса и их вывод в текстовом формате Prometheus.
+
+    Каждый процесс (воркеры gunicorn, scheduler.py) пишет снимок своих
+    метрик в METRICS_DIR задачей 'metrics-flush'; /metrics складывает
+    метрики своего процесса со снимками остальных живых процессов.
+    """
+
+    def __init__(self, directory, stale_after=60):
+        self.directory = directory
+        self.stale_after = stale_after
+        self._metrics = OrderedDict()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._metrics.setdefault(name, MetricCounter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=METRICS_DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, MetricHistogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        return {
+            metric.name: {
+                'type': metric.type_name,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.samples()
+            }
+            for metric in self._metrics.values()
+        }
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self):
+        """Записать снимок метрик процесса в файл (атомарно) и удалить файлы давно завершившихся процессов"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, f, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+        for name in os.listdir(self.directory):
+            other = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(other) > self.stale_after * 10:
+                    os.remove(other)
+            except OSError:
+                pass
+
+    def _collect(self):
+        """Снимки всех живых процессов: свой - из памяти, остальные - из файлов"""
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        own_file = f"{os.getpid()}.json"
+        for name in os.listdir(self.directory):
+            if name == own_file or not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > self.stale_after:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f)['metrics'])
+            except (OSError, ValueError, KeyError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4 по метрикам всех процессов"""
+        merged = OrderedDict()
+        for snapshot in self._collect():
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, dict(metric, samples={}))
+                for labels, value in metric['samples']:
+                    key = tuple(labels)
+                    current = target['samples'].get(key)
+                    if metric['type'] == 'histogram':
+                        if current is None:
+                            current = target['samples'][key] = {'counts': [0] * len(value['counts']), 'sum': 0.0}
+                        current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                        current['sum'] += value['sum']
+                    else:
+                        target['samples'][key] = (current or 0) + value
+        
+        lines = []
+        for name, metric in merged.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in metric['samples'].items():
+                pairs = list(zip(metric['labelnames'], labels))
+                if metric['type'] != 'histogram':
+                    lines.append(f"{name}{_format_metric_labels(pairs)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ['+Inf'], value['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_metric_labels(pairs + [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_metric_labels(pairs)} {value['sum']}")
+                lines.append(f"{name}_count{_format_metric_labels(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+def _escape_metric_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_metric_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_metric_label(value)}"' for key, value in pairs) + '}'
+
+# Каталог снимков задается в create_app (configure_metrics): по умолчанию он зависит от адреса базы
+metrics = MetricsRegistry(directory=os.environ.get('METRICS_DIR'))
+def configure_metrics(database_uri):
+    """Каталог снимков метрик: METRICS_DIR или общий для всех процессов с этой базой"""
+    if not os.environ.get('METRICS_DIR'):
+        metrics.directory = os.path.join(
+            tempfile.gettempdir(), f"bazar-metrics-{zlib.crc32(database_uri.encode('utf-8')):08x}"
+        )
+
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+http_requests_total = metrics.counter('bazar_http_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'method', 'status'))
+http_request_duration = metrics.histogram('bazar_http_request_duration_seconds', 'HTTP request latency', ('endpoint', 'method'))
+probe_requests_total = metrics.counter('bazar_probe_requests_total', 'Bazar camera statistics probes by result', ('result',))
+probe_duration = metrics.histogram('bazar_probe_duration_seconds', 'Bazar camera statistics probe latency')
+status_changes_total = metrics.counter('bazar_status_changes_total', 'Logged bazar status transitions', ('status',))
+db_commit_duration = metrics.histogram('bazar_db_commit_duration_seconds', 'SQLite commit time', ('operation',),
+                                       buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+telegram_requests_total = metrics.counter('bazar_telegram_requests_total', 'Telegram Bot API calls by method and result', ('method', 'result'))
+telegram_request_duration = metrics.histogram('bazar_telegram_request_duration_seconds', 'Telegram Bot API call latency', ('method',))
+job_runs_total = metrics.counter('bazar_job_runs_total', 'Background job runs by result', ('job', 'result'))
+job_skips_total = metrics.counter('bazar_job_skips_total', 'Skipped background job runs', ('job', 'reason'))
+job_duration = metrics.histogram('bazar_job_duration_seconds', 'Background job run time', ('job',),
+                                 buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600))
+job_lag = metrics.histogram('bazar_job_lag_seconds', 'Delay between scheduled and actual job start', ('job',),
+                            buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60))
+
+# Профилирование запросов и журнал медленных запросов
+# Запросы дольше порога (секунды) пишутся в лог с разбивкой времени по фазам; 0 - выключено
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+SLOW_REQUEST_HISTORY = int(os.environ.get('SLOW_REQUEST_HISTORY', 100))
+# Профиль запроса снимается только при передаче этого токена; пусто - профилирование выключено
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'bazar-profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-z-]+$')
+
+class RequestTimer:
+    """Время запроса по фазам (network, db, telegram, serialization).
+
+    Вложенные фазы учитываются только в самой внутренней: время SQL внутри
+    фазы network попадет в db, а не в обе фазы сразу.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+        self._stack = []
+
+    def enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self, name):
+        # Фаза могла не закрыться (исключение между событиями) - ищем ближайшую с этим именем
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == name:
+                break
+        else:
+            return
+        frame_name, started, children = self._stack.pop(index)
+        del self._stack[index:]
+        elapsed = time.perf_counter() - started
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed - children
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def breakdown(self):
+        total = time.perf_counter() - self.started
+        phases = {name: round(value * 1000, 2) for name, value in self.phases.items()}
+        phases['other'] = round(max(0.0, total - sum(self.phases.values())) * 1000, 2)
+        return round(total * 1000, 2), phases
+
+_request_timer = threading.local()
+
+def start_request_timing():
+    """Начать разбивку времени текущего запроса по фазам (before_request)"""
+    _request_timer.timer = RequestTimer()
+    return _request_timer.timer
+
+def current_request_timer():
+    return getattr(_request_timer, 'timer', None)
+
+def finish_request_timing():
+    """Закончить разбивку времени запроса (teardown_request)"""
+    _request_timer.timer = None
+
+@contextmanager
+def request_phase(name):
+    """Учесть время блока в фазе текущего запроса (вне запроса ничего не делает)"""
+    timer = current_request_timer()
+    if timer is None:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit(name)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _time_query_start(conn, cursor, statement, parameters, context, executemany):
+    timer = current_request_timer()
+    if timer is not None:
+        timer.enter('db')
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_query_end(conn, cursor, statement, parameters, context, executemany):
+    timer = current_request_timer()
+    if timer is not None:
+        timer.exit('db')
+
+@event.listens_for(db.session, 'before_commit')
+def _time_commit_start(session):
+    timer = current_request_timer()
+    if timer is not None:
+        timer.enter('db')
+
+@event.listens_for(db.session, 'after_commit')
+def _time_commit_end(session):
+    timer = current_request_timer()
+    if timer is not None:
+        timer.exit('db')
+
+@event.listens_for(db.session, 'after_rollback')
+def _time_rollback(session):
+    timer = current_request_timer()
+    if timer is not None:
+        timer.exit('db')
+
+slow_requests = deque(maxlen=SLOW_REQUEST_HISTORY)
+_profile_lock = threading.Lock()
+
+def try_start_profile():
+    """Запустить cProfile для запроса, если профиль сейчас не снимается. Возвращает профилировщик или None
+
+    Один профиль за раз: cProfile замедляет запрос, параллельные профили искажали бы друг друга.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def stop_profile(profiler):
+    """Остановить профилировщик из try_start_profile и освободить место для следующего профиля"""
+    profiler.disable()
+    _profile_lock.release()
+
+# Ключ WSGI environ для внутренних запросов приложения к самому себе (прогрев кэшей).
+# Клиент не может его передать, а такие запросы не попадают в метрики HTTP и журнал медленных запросов
+INTERNAL_REQUEST_ENVIRON = 'bazar.internal_request'
+
+def is_internal_request():
+    return bool(request.environ.get(INTERNAL_REQUEST_ENVIRON))
+
+def profiling_requested():
+    """Запрошен ли профиль: заголовок X-Profile-Token или параметр ?profile= с PROFILING_TOKEN"""
+    if request.path.startswith('/api/profiling/'):
+        return False
+    return profiling_token_valid(request.headers.get('X-Profile-Token') or request.args.get('profile'))
+
+def request_path_for_log():
+    """Путь запроса со строкой запроса, но без токена профилирования"""
+    args = [(key, value) for key, value in request.args.items(multi=True) if key != 'profile']
+    return request.path + (f"?{urlencode(args)}" if args else '')
+
+def profiling_token_valid(token):
+    if not PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), PROFILING_TOKEN.encode('utf-8'))
+
+def save_request_profile(profiler, response, duration_ms, phases):
+    """Сохранить профиль запроса (.prof для pstats/snakeviz) и его описание, старые удалить"""
+    # Время в имени - список профилей сортируется по имени файла
+    profile_id = f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:4]}"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    meta = {
+        'id': profile_id,
+        'method': request.method,
+        'path': request_path_for_log(),
+        'status': response.status_code,
+        'duration_ms': duration_ms,
+        'phases': phases,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    stored = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for old_id in stored[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for suffix in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old_id + suffix))
+            except OSError:
+                pass
+    return profile_id
+
+def list_request_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+# Время готовности: от старта контейнера (BOOT_STARTED_AT, выставляет docker-entrypoint.sh)
+# или процесса до конца initialize_app
+# process_started_at и imported_at выставляет app.py (момент до импорта Flask и после импорта модулей)
+startup_state = {
+    'process_started_at': time.time(),
+    'imported_at': None,
+    'app_created_at': None,
+    'ready_at': None,
+    'schema': None
+}
+
+def _env_float(name):
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+def get_startup_info():
+    """Время старта и готовности этого процесса для /api/health"""
+    started_at = startup_state['process_started_at']
+    boot_started_at = _env_float('BOOT_STARTED_AT') or started_at
+    imported_at = startup_state['imported_at']
+    app_created_at = startup_state['app_created_at']
+    ready_at = startup_state['ready_at']
+    return {
+        'pid': os.getpid(),
+        'ready': ready_at is not None,
+        'boot_started_at': datetime.utcfromtimestamp(boot_started_at).isoformat(),
+        'migration_seconds': _env_float('MIGRATION_SECONDS'),
+        'import_seconds': round(imported_at - started_at, 3) if imported_at else None,
+        'create_app_seconds': round(app_created_at - imported_at, 3) if app_created_at and imported_at else None,
+        'process_ready_seconds': round(ready_at - started_at, 3) if ready_at else None,
+        'time_to_ready_seconds': round(ready_at - boot_started_at, 3) if ready_at else None,
+        'schema': startup_state['schema'],
+        'schema_revision': SCHEMA_REVISION
+    }
@@ -0,0 +1,188 @@
+"""
+Опрос базаров: статистика камер, запись переходов статуса и сводная
+статистика камер по регионам.
+"""
+from datetime import datetime
+import requests
+import time
+from models import BazarLog, BazarStatus, db
+from observability import db_commit_duration, probe_duration, probe_requests_total, request_phase, status_changes_total
+
+# Конфигурация базаров
+# BAZAR_ENDPOINTS удален - теперь все сервисы добавляются вручную через админскую панель
+
+def fetch_bazar_info(endpoint):
+    """Получить информацию о базаре через /api/cameras/statistics"""
+    url = f"http://{endpoint['ip']}:{endpoint['backendPort']}/api/cameras/statistics"
+    started = time.perf_counter()
+    try:
+        with request_phase('network'):
+            response = requests.get(url, timeout=2)
+        if response.ok:
+            data = response.json()
+            probe_duration.observe(time.perf_counter() - started)
+            probe_requests_total.inc('success')
+            # Если endpoint доступен, базар онлайн
+            return {
+                'success': True,
+                'data': data,
+                'status': 'online',
+                'endpoint': endpoint
+            }
+        else:
+            probe_duration.observe(time.perf_counter() - started)
+            probe_requests_total.inc('http_error')
+            return {
+                'success': False,
+                'status': 'offline',
+                'error': f'HTTP {response.status_code}',
+                'endpoint': endpoint
+            }
+    except Exception as e:
+        probe_duration.observe(time.perf_counter() - started)
+        probe_requests_total.inc('timeout' if isinstance(e, requests.exceptions.Timeout) else 'error')
+        return {
+            'success': False,
+            'status': 'offline',
+            'error': str(e),
+            'endpoint': endpoint
+        }
+
+def log_status_change(bazar_data, endpoint, status, error=None):
+    """Записать изменение статуса в лог"""
+    # Получаем текущий статус из БД
+    bazar_id = f"{endpoint['ip']}:{endpoint['port']}"
+    current_bazar = BazarStatus.query.filter_by(
+        bazar_ip=endpoint['ip'], 
+        bazar_port=endpoint['port']
+    ).first()
+    
+    previous_status = current_bazar.status if current_bazar else None
+    
+    # Логируем только если статус изменился
+    if not current_bazar or current_bazar.status != status:
+        # Используем название из БД (если есть), а не из API сервиса
+        bazar_name = current_bazar.bazar_name if current_bazar else f"{endpoint['ip']}:{endpoint['port']}"
+        city = current_bazar.city if current_bazar else 'Unknown'
+        
+        log = BazarLog(
+            bazar_name=bazar_name,
+            bazar_ip=endpoint['ip'],
+            bazar_port=endpoint['port'],
+            city=city,
+            status=status,
+            previous_status=previous_status,
+            error_message=error,
+            action_type='status_change',
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(log)
+        status_changes_total.inc(status)
+        
+    # Обновляем текущий статус
+    if current_bazar:
+        current_bazar.status = status
+        current_bazar.last_check = datetime.utcnow()
+        if status == 'online':
+            current_bazar.last_online = datetime.utcnow()
+            # НЕ обновляем название и город - они управляются только через форму редактирования
+        else:
+            current_bazar.last_offline = datetime.utcnow()
+    else:
+        bazar_name = bazar_data.get('name', f"{endpoint['ip']}:{endpoint['port']}") if bazar_data else f"{endpoint['ip']}:{endpoint['port']}"
+        city = bazar_data.get('city', 'Unknown') if bazar_data else 'Unknown'
+        
+        current_bazar = BazarStatus(
+            bazar_name=bazar_name,
+            bazar_ip=endpoint['ip'],
+            bazar_port=endpoint['port'],
+            backend_port=endpoint['backendPort'],
+            pg_port=endpoint['pgPort'],
+            city=city,
+            status=status,
+            last_check=datetime.utcnow(),
+            last_online=datetime.utcnow() if status == 'online' else None,
+            last_offline=datetime.utcnow() if status == 'offline' else None
+        )
+        db.session.add(current_bazar)
+    
+    started = time.perf_counter()
+    db.session.commit()
+    db_commit_duration.observe(time.perf_counter() - started, 'log_status_change')
+
+def _service_endpoint(service):
+    """Endpoint базара в формате, который ожидает fetch_bazar_info"""
+    return {
+        'ip': service.bazar_ip,
+        'port': service.bazar_port,
+        'backendPort': service.backend_port,
+        'pgPort': service.pg_port
+    }
+
+def _empty_region_stats():
+    return {
+        'totalBazars': 0,
+        'onlineBazars': 0,
+        'offlineBazars': 0,
+        'totalCameras': 0,
+        'onlineCameras': 0,
+        'offlineCameras': 0
+    }
+
+def aggregate_camera_statistics(services, stats_by_service):
+    """Свести статистику камер всех базаров.
+
+    stats_by_service: service_id -> словарь статистики камер или None,
+    если базар недоступен.
+    """
+    total_cameras = 0
+    online_cameras = 0
+    offline_cameras = 0
+    rasta_food_cameras = 0
+    people_counting_cameras = 0
+    animal_cameras = 0
+    vehicle_counting_cameras = 0
+    accessible_bazars = 0
+    
+    # Словарь для группировки по областям
+    regions_stats = {}
+    
+    for service in services:
+        stats = stats_by_service.get(service.id)
+        region = service.city or 'Unknown'
+        if region not in regions_stats:
+            regions_stats[region] = _empty_region_stats()
+        regions_stats[region]['totalBazars'] += 1
+        
+        if stats is None:
+            # Базар оффлайн
+            regions_stats[region]['offlineBazars'] += 1
+            continue
+        
+        total_cameras += stats.get('totalCameras', 0)
+        online_cameras += stats.get('onlineCameras', 0)
+        offline_cameras += stats.get('offlineCameras', 0)
+        rasta_food_cameras += stats.get('rastaFoodCameras', 0)
+        people_counting_cameras += stats.get('peopleCountingCameras', 0)
+        animal_cameras += stats.get('animalCameras', 0)
+        vehicle_counting_cameras += stats.get('vehicleCountingCameras', 0)
+        accessible_bazars += 1
+        
+        regions_stats[region]['onlineBazars'] += 1
+        regions_stats[region]['totalCameras'] += stats.get('totalCameras', 0)
+        regions_stats[region]['onlineCameras'] += stats.get('onlineCameras', 0)
+        regions_stats[region]['offlineCameras'] += stats.get('offlineCameras', 0)
+    
+    return {
+        'totalCameras': total_cameras,
+        'onlineCameras': online_cameras,
+        'offlineCameras': offline_cameras,
+        'rastaFoodCameras': rasta_food_cameras,
+        'peopleCountingCameras': people_counting_cameras,
+        'animalCameras': animal_cameras,
+        'vehicleCountingCameras': vehicle_counting_cameras,
+        'accessibleBazars': accessible_bazars,
+        'totalBazars': len(services),
+        'uptime_percentage': (online_cameras / total_cameras * 100) if total_cameras > 0 else 0,
+        'regionsStats': regions_stats
+    }
@@ -0,0 +1,331 @@
+"""
+Экспорт отчетов (Excel/CSV) потоком по частям.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape as xml_escape
+import os
+import csv
+import io
+import logging
+import queue
+import threading
+import zipfile
+from models import app_context, BazarStatus, db
+from state import get_camera_snapshot
+from probes import aggregate_camera_statistics
+
+logger = logging.getLogger(__name__)
+
+# Экспорт отчетов (Excel/CSV)
+# Отчет рендерится в отдельном пуле потоков и отдается клиенту по частям через
+# ограниченную очередь, поэтому память не зависит от количества базаров.
+REPORT_CHUNK_QUEUE_SIZE = 32
+REPORT_DB_BATCH_SIZE = 500
+report_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('REPORT_EXPORT_WORKERS', 2)), thread_name_prefix='report-export')
+
+REPORT_LABELS = {
+    'ru': {
+        'overview_sheet': 'Общая статистика',
+        'bazars_sheet': 'Статистика базаров',
+        'regions_sheet': 'Статистика областей',
+        'metric': 'Показатель',
+        'value': 'Значение',
+        'total_bazars': 'Всего базаров',
+        'online': 'Онлайн',
+        'offline': 'Оффлайн',
+        'total_cameras': 'Всего камер',
+        'online_cameras_overview': 'Работает камер',
+        'offline_cameras_overview': 'Не работает камер',
+        'uptime': 'Процент доступности',
+        'name': 'Название',
+        'city': 'Город',
+        'status': 'Статус',
+        'online_cameras': 'Онлайн камер',
+        'offline_cameras': 'Офлайн камер',
+        'cameras_with_roi': 'Камеры с ROI',
+        'last_check': 'Последняя проверка',
+        'region': 'Область',
+        'no_regions': 'Нет данных по областям'
+    },
+    'uz': {
+        'overview_sheet': 'Bozor statistikasi',
+        'bazars_sheet': 'Bozorlar statistika',
+        'regions_sheet': 'Viloyatlar statistika',
+        'metric': "Ko'rsatkich",
+        'value': 'Qiymat',
+        'total_bazars': 'Jami bozorlar',
+        'online': 'Onlayn',
+        'offline': 'Oflayn',
+        'total_cameras': 'Jami kameralar',
+        'online_cameras_overview': 'Ishlamoqda kameralar',
+        'offline_cameras_overview': 'Ishlamaydi kameralar',
+        'uptime': 'Mavjudlik foizi',
+        'name': 'Nom',
+        'city': 'Shahar',
+        'status': 'Status',
+        'online_cameras': 'Onlayn kameralar',
+        'offline_cameras': 'Oflayn kameralar',
+        'cameras_with_roi': 'Kameralar ROI bilan',
+        'last_check': "Oxirgi tekshiruv",
+        'region': 'Viloyat',
+        'no_regions': "Viloyatlar bo'yicha ma'lumot yo'q"
+    }
+}
+
+def iter_report_sheets(lang='ru'):
+    """Генерирует листы отчета: (название, ширины колонок, итератор строк).
+
+    Сводные данные считаются одним легким проходом по (id, city), строки по
+    базарам читаются из БД пачками. Статистика камер берется из снимка.
+    """
+    labels = REPORT_LABELS.get(lang, REPORT_LABELS['ru'])
+    
+    services = db.session.query(BazarStatus.id, BazarStatus.city).all()
+    stats_by_service = {}
+    for service in services:
+        snapshot = get_camera_snapshot(service.id)
+        stats_by_service[service.id] = snapshot['stats'] if snapshot else None
+    summary = aggregate_camera_statistics(services, stats_by_service)
+    del services
+    
+    overview_rows = [
+        [labels['metric'], labels['value']],
+        [labels['total_bazars'], summary['totalBazars']],
+        [labels['online'], summary['accessibleBazars']],
+        [labels['offline'], summary['totalBazars'] - summary['accessibleBazars']],
+        [labels['total_cameras'], summary['totalCameras']],
+        [labels['online_cameras_overview'], summary['onlineCameras']],
+        [labels['offline_cameras_overview'], summary['offlineCameras']],
+        [labels['uptime'], f"{round(summary['uptime_percentage'], 2)}%"]
+    ]
+    yield labels['overview_sheet'], [30, 15], iter(overview_rows)
+    
+    def bazar_rows():
+        yield [labels['name'], labels['city'], labels['status'], labels['total_cameras'],
+               labels['online_cameras'], labels['offline_cameras'], labels['cameras_with_roi'], labels['last_check']]
+        query = BazarStatus.query.order_by(BazarStatus.id).yield_per(REPORT_DB_BATCH_SIZE)
+        for service in query:
+            stats = stats_by_service.get(service.id) or {}
+            yield [
+                service.bazar_name or '',
+                service.city or '',
+                labels['online'] if service.status == 'online' else labels['offline'],
+                stats.get('totalCameras', 0),
+                stats.get('onlineCameras', 0),
+                stats.get('offlineCameras', 0),
+                # Опрос базара не собирает ROI; колонка заполняется, если снимок их содержит
+                stats.get('camerasWithROI', ''),
+                service.last_check.strftime('%Y-%m-%d %H:%M:%S') if service.last_check else ''
+            ]
+    yield labels['bazars_sheet'], [30, 20, 15, 15, 15, 15, 15, 20], bazar_rows()
+    
+    def region_rows():
+        yield [labels['region'], labels['total_bazars'], labels['online'], labels['offline'],
+               labels['total_cameras'], labels['online_cameras_overview']]
+        if not summary['regionsStats']:
+            yield [labels['no_regions'], '', '', '', '', '']
+        for region, stats in summary['regionsStats'].items():
+            yield [region, stats['totalBazars'], stats['onlineBazars'], stats['offlineBazars'],
+                   stats['totalCameras'], stats['onlineCameras']]
+    yield labels['regions_sheet'], [25, 15, 15, 15, 15, 15], region_rows()
+
+def _xlsx_column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+def _xlsx_cell(row_number, column_index, value, style):
+    ref = f'{_xlsx_column_name(column_index)}{row_number}'
+    style_attr = f' s="{style}"' if style else ''
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        text = xml_escape('' if value is None else str(value))
+        return f'<c r="{ref}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+    return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+
+def write_xlsx_report(sheets, fileobj):
+    """Записать книгу XLSX в поток без построения её в памяти.
+
+    Строки используют inline-строки (без таблицы shared strings), а каждый
+    лист пишется в zip по мере генерации строк.
+    """
+    sheet_names = []
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet_index, (title, widths, rows) in enumerate(sheets, start=1):
+            sheet_names.append(title)
+            with archive.open(f'xl/worksheets/sheet{sheet_index}.xml', 'w') as part:
+                cols = ''.join(
+                    f'<col min="{i}" max="{i}" width="{w}" customWidth="1"/>'
+                    for i, w in enumerate(widths, start=1)
+                )
+                part.write((
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    f'<cols>{cols}</cols><sheetData>'
+                ).encode('utf-8'))
+                for row_number, row in enumerate(rows, start=1):
+                    # Первая строка - заголовок (стиль 1), остальные - с рамкой (стиль 2)
+                    style = 1 if row_number == 1 else 2
+                    cells = ''.join(_xlsx_cell(row_number, i, value, style) for i, value in enumerate(row))
+                    part.write(f'<row r="{row_number}">{cells}</row>'.encode('utf-8'))
+                part.write(b'</sheetData></worksheet>')
+        
+        sheet_overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(sheet_names) + 1)
+        )
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{sheet_overrides}</Types>'
+        ))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        sheets_xml = ''.join(
+            f'<sheet name="{xml_escape(name[:31])}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(sheet_names, start=1)
+        )
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets_xml}</sheets></workbook>'
+        ))
+        sheet_rels = ''.join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(sheet_names) + 1)
+        )
+        styles_rel_id = len(sheet_names) + 1
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}'
+            f'<Relationship Id="rId{styles_rel_id}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/styles.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+            '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+            '<fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill>'
+            '<fill><patternFill patternType="solid"><fgColor rgb="FF4F81BD"/></patternFill></fill></fills>'
+            '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+            '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            '<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>'
+            '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>'
+            '</cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+        ))
+
+def write_csv_report(sheets, fileobj):
+    """Записать отчет в CSV: листы идут секциями, разделенными пустой строкой"""
+    # BOM нужен, чтобы Excel корректно открыл UTF-8 с кириллицей
+    text_stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='', write_through=True)
+    writer = csv.writer(text_stream)
+    for sheet_index, (title, widths, rows) in enumerate(sheets):
+        if sheet_index:
+            writer.writerow([])
+        writer.writerow([title])
+        for row in rows:
+            writer.writerow(row)
+    text_stream.flush()
+    text_stream.detach()
+
+def _put_chunk(chunks, item, cancelled):
+    """Положить элемент в очередь, не зависая, если клиент отключился и очередь никто не читает"""
+    while True:
+        if cancelled.is_set():
+            return False
+        try:
+            chunks.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+
+class _ChunkQueueWriter(io.RawIOBase):
+    """Файлоподобный объект, передающий записанные байты в очередь потребителю"""
+
+    def __init__(self, chunks, cancelled):
+        self._chunks = chunks
+        self._cancelled = cancelled
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        chunk = bytes(data)
+        if not _put_chunk(self._chunks, chunk, self._cancelled):
+            raise IOError('Report export cancelled by client')
+        return len(chunk)
+
+class _ReportStream:
+    """Итератор байтов отчета для Response.
+
+    close() вызывается WSGI-сервером при закрытии ответа - в том числе если
+    тело ни разу не читали (HEAD, клиент отключился до начала передачи), -
+    и останавливает рендер, чтобы поток пула не ждал места в очереди вечно.
+    """
+
+    def __init__(self, chunks, cancelled, done):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._done = done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._cancelled.is_set():
+            raise StopIteration
+        chunk = self._chunks.get()
+        if chunk is self._done:
+            self.close()
+            raise StopIteration
+        if isinstance(chunk, Exception):
+            self.close()
+            raise chunk
+        return chunk
+
+    def close(self):
+        self._cancelled.set()
+
+def stream_report(render, lang):
+    """Запустить рендер отчета в пуле потоков и вернуть итератор его байтов"""
+    chunks = queue.Queue(maxsize=REPORT_CHUNK_QUEUE_SIZE)
+    cancelled = threading.Event()
+    done = object()
+    
+    def run():
+        with app_context():
+            try:
+                writer = io.BufferedWriter(_ChunkQueueWriter(chunks, cancelled), buffer_size=64 * 1024)
+                render(iter_report_sheets(lang), writer)
+                writer.flush()
+                _put_chunk(chunks, done, cancelled)
+            except Exception as e:
+                if not cancelled.is_set():
+                    logger.error(f"Error rendering report: {e}", exc_info=True)
+                    _put_chunk(chunks, e, cancelled)
+            finally:
+                db.session.remove()
+    
+    report_executor.submit(run)
+    return _ReportStream(chunks, cancelled, done)
+
+REPORT_FORMATS = {
+    'xlsx': (write_xlsx_report, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': (write_csv_report, 'text/csv')
+}
@@ -1,14 +1,56 @@
 #!/usr/bin/env python
 """
-Скрипт для полного сброса миграций и пересоздания базы данных
+Скрипт для полного сброса миграций и пересоздания базы данных.
+
+При старте контейнера сначала сравнивается ревизия схемы в базе с ревизией
+моделей (одна выборка из schema_revision). Если они совпадают, вся работа
+ниже пропускается; --force выполняет ее в любом случае.
+
+Скрипт импортирует только модели (models.py) и работает с минимальным
+приложением Flask без API, логирования и фоновых задач.
 """
-from app import app, db
+from models import create_db_app, db, schema_is_current, get_database_schema_revision, stamp_schema_revision, SCHEMA_REVISION
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 import os
 import shutil
+import sys
+import time
+
+# Сколько ждать доступности базы (внешняя БД может подниматься вместе с контейнером)
+DB_WAIT_TIMEOUT = float(os.environ.get('DB_WAIT_TIMEOUT', 30))
+
+def wait_for_database(timeout=DB_WAIT_TIMEOUT):
+    """Ждать, пока база ответит на SELECT 1 (SQLite - файл, ждать нечего)"""
+    if db.engine.url.get_backend_name() == 'sqlite':
+        return True
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            db.session.execute(text('SELECT 1'))
+            db.session.rollback()
+            return True
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if time.monotonic() >= deadline:
+                print(f"ERROR: Database is not available after {timeout:.0f}s: {e}")
+                return False
+            time.sleep(0.5)
 
-def reset_migrations():
+def reset_migrations(force=False):
     """Исправляет проблемы с миграциями без удаления базы данных"""
+    app = create_db_app()
     with app.app_context():
+        if not force:
+            started = time.perf_counter()
+            if not wait_for_database():
+                return False
+            if schema_is_current():
+                print(f"SUCCESS: Schema is up to date (revision {SCHEMA_REVISION}), "
+                      f"migrations skipped in {(time.perf_counter() - started) * 1000:.0f} ms")
+                return True
+            print(f"Schema revision {get_database_schema_revision() or 'none'} -> {SCHEMA_REVISION}")
+        
         print("Checking migration system...")
         
         # Получаем путь к базе данных
@@ -51,6 +93,8 @@ def reset_migrations():
         
         # Инициализируем переменную tables
         tables = []
+        # Шаги, которые не удались: с ними ревизия схемы не записывается
+        failed_steps = []
         
         if db_exists:
             try:
@@ -101,6 +145,7 @@ def reset_migrations():
                     print("SUCCESS: Tables created/verified via fallback")
                 except Exception as e2:
                     print(f"ERROR: Could not create tables: {e2}")
+                    failed_steps.append('create_all')
         else:
             # База данных не существует - создаем новую
             print("Database does not exist, creating new one...")
@@ -180,6 +225,7 @@ def reset_migrations():
                         print("SUCCESS: Added column allowed_regions to telegram_chat_id table")
                     except Exception as e:
                         print(f"WARNING: Could not add column allowed_regions: {e}")
+                        failed_steps.append('allowed_regions')
                 
                 # Добавляем колонку last_message_id если её нет
                 if 'last_message_id' not in telegram_chat_columns:
@@ -189,6 +235,31 @@ def reset_migrations():
                         print("SUCCESS: Added column last_message_id to telegram_chat_id table")
                     except Exception as e:
                         print(f"WARNING: Could not add column last_message_id: {e}")
+                        failed_steps.append('last_message_id')
+            
+            # Добавляем колонку extra_bot_tokens в telegram_settings если её нет
+            if 'telegram_settings' in tables:
+                telegram_settings_columns = [col['name'] for col in inspector.get_columns('telegram_settings')]
+                if 'extra_bot_tokens' not in telegram_settings_columns:
+                    try:
+                        db.session.execute(text('ALTER TABLE telegram_settings ADD COLUMN extra_bot_tokens TEXT'))
+                        db.session.commit()
+                        print("SUCCESS: Added column extra_bot_tokens to telegram_settings table")
+                    except Exception as e:
+                        print(f"WARNING: Could not add column extra_bot_tokens: {e}")
+                        failed_steps.append('extra_bot_tokens')
+            
+            # Добавляем колонку refresh_only в notification_outbox если её нет
+            if 'notification_outbox' in tables:
+                notification_outbox_columns = [col['name'] for col in inspector.get_columns('notification_outbox')]
+                if 'refresh_only' not in notification_outbox_columns:
+                    try:
+                        db.session.execute(text('ALTER TABLE notification_outbox ADD COLUMN refresh_only BOOLEAN NOT NULL DEFAULT 0'))
+                        db.session.commit()
+                        print("SUCCESS: Added column refresh_only to notification_outbox table")
+                    except Exception as e:
+                        print(f"WARNING: Could not add column refresh_only: {e}")
+                        failed_steps.append('refresh_only')
             
             # Добавляем недостающие колонки
             for col_name, col_type in required_columns.items():
@@ -199,11 +270,26 @@ def reset_migrations():
                         print(f"SUCCESS: Added column {col_name} to bazar_status table")
                     except Exception as e:
                         print(f"WARNING: Could not add column {col_name}: {e}")
+                        failed_steps.append(col_name)
         except Exception as e:
             print(f"WARNING: Could not check/add columns: {e}")
+            failed_steps.append('columns')
+        
+        # Следующий старт с той же схемой пропустит всю работу выше, поэтому
+        # ревизия записывается, только если все шаги прошли успешно
+        if failed_steps:
+            print(f"WARNING: Schema revision not recorded, failed steps: {', '.join(failed_steps)}; "
+                  f"migrations will run again on next start")
+        else:
+            try:
+                stamp_schema_revision()
+                print(f"SUCCESS: Schema revision {SCHEMA_REVISION} recorded")
+            except Exception as e:
+                print(f"WARNING: Could not record schema revision: {e}")
         
         print("SUCCESS: Migration system reset completed")
         print(f"Database path: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        return True
 
 if __name__ == '__main__':
-    reset_migrations()
+    sys.exit(0 if reset_migrations(force='--force' in sys.argv[1:]) else 1)
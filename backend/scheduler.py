@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Отдельный процесс фонового планировщика для продакшен-режима.
+
+Веб-воркеры gunicorn работают с BACKGROUND_SCHEDULER=false и только
+обслуживают запросы. Проверки камер и рассылку уведомлений выполняет этот
+процесс - один на контейнер, независимо от числа воркеров. gunicorn.conf.py
+запускает его сам; вручную:
+
+    python scheduler.py
+"""
+import logging
+import os
+import signal
+import threading
+
+os.environ['BACKGROUND_SCHEDULER'] = 'true'
+# Процесс не обслуживает запросы - прогревать кэши ответов незачем
+os.environ.setdefault('CACHE_WARM_INTERVAL', '0')
+
+from app import create_app, initialize_app  # noqa: E402
+from scheduling import scheduler_leader  # noqa: E402
+
+logger = logging.getLogger('scheduler')
+
+
+def main():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    create_app()
+    # Та же инициализация, что при первом запросе: директория БД, таблицы, планировщик, outbox
+    initialize_app()
+    logger.info(f"Scheduler process started (pid {os.getpid()}, owner {scheduler_leader.owner_id})")
+
+    while not stop.wait(1):
+        pass
+
+    # Отдаем аренду сразу, чтобы следующий процесс не ждал SCHEDULER_LEASE_TTL
+    scheduler_leader.release()
+    logger.info("Scheduler process stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Фоновый планировщик: выбор владельца среди процессов (аренда в БД),
+триггеры и выполнение задач.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import atexit
+import itertools
+import logging
+import calendar
+import heapq
+import socket
+import threading
+import time
+import uuid
+from models import app_context, db, SchedulerLease
+from observability import job_duration, job_lag, job_runs_total, job_skips_total
+
+logger = logging.getLogger(__name__)
+
+class SchedulerLeader:
+    """Выбор одного владельца фонового планировщика среди процессов (воркеров gunicorn).
+
+    Владелец определяется строкой SchedulerLease в общей базе. Захват и
+    продление - один условный UPDATE: строка достается процессу, если она уже
+    его или аренда истекла. Фоновый поток продлевает аренду каждые
+    heartbeat_interval секунд; остальные процессы с тем же интервалом
+    пытаются ее забрать и становятся владельцем через ttl секунд после
+    падения прежнего. Процессы, не владеющие арендой, только читают:
+    не запускают проверки камер и не пишут уведомления.
+    """
+
+    def __init__(self, name='camera-scheduler', ttl=60, heartbeat_interval=15, enabled=True):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.enabled = enabled
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = False
+        self._stop = threading.Event()
+        self._leader_until = 0.0  # time.monotonic(), до которого аренда точно наша
+        self.stats = {
+            'heartbeats': 0,
+            'acquired': 0,
+            'lost': 0,
+            'errors': 0
+        }
+
+    def is_leader(self):
+        """True, если этот процесс владеет арендой (без выбора владельца - если процесс участвует)"""
+        if not self.enabled:
+            return self._started
+        with self._lock:
+            return time.monotonic() < self._leader_until
+
+    def start(self):
+        """Участвовать в выборе: сразу попытаться захватить аренду и запустить поток heartbeat'ов"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            if not self.enabled:
+                return
+            self._thread = threading.Thread(target=self._run, name='scheduler-lease', daemon=True)
+        self.heartbeat()
+        self._thread.start()
+        atexit.register(self.release)
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self.heartbeat()
+
+    def heartbeat(self):
+        """Захватить или продлить аренду. Возвращает True, если процесс - владелец"""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        lease = SchedulerLease.__table__
+        leader = False
+        with app_context():
+            try:
+                result = db.session.execute(
+                    lease.update()
+                    .where(lease.c.name == self.name)
+                    .where(db.or_(lease.c.owner == self.owner_id, lease.c.expires_at < now))
+                    .values(
+                        owner=self.owner_id,
+                        heartbeat_at=now,
+                        expires_at=expires_at,
+                        acquired_at=db.case((lease.c.owner == self.owner_id, lease.c.acquired_at), else_=now)
+                    )
+                )
+                leader = result.rowcount == 1
+                if not leader and db.session.query(SchedulerLease.name).filter_by(name=self.name).first() is None:
+                    db.session.execute(lease.insert().values(
+                        name=self.name, owner=self.owner_id, acquired_at=now, heartbeat_at=now, expires_at=expires_at
+                    ))
+                    leader = True
+                db.session.commit()
+            except Exception as e:
+                # IntegrityError - строку одновременно вставил другой процесс
+                db.session.rollback()
+                leader = False
+                with self._lock:
+                    self.stats['errors'] += 1
+                logger.debug(f"Scheduler lease heartbeat failed: {e}")
+        
+        with self._lock:
+            was_leader = time.monotonic() < self._leader_until
+            self.stats['heartbeats'] += 1
+            # Считаем аренду своей чуть меньше ttl от начала запроса, чтобы не пересечься с преемником
+            self._leader_until = started + self.ttl * 0.9 if leader else 0.0
+            if leader and not was_leader:
+                self.stats['acquired'] += 1
+            elif was_leader and not leader:
+                self.stats['lost'] += 1
+        if leader and not was_leader:
+            logger.info(f"Scheduler lease '{self.name}' acquired by {self.owner_id}")
+        elif was_leader and not leader:
+            logger.warning(f"Scheduler lease '{self.name}' lost by {self.owner_id}")
+        return leader
+
+    def release(self):
+        """Отдать аренду при остановке процесса, чтобы преемник не ждал ttl"""
+        self._stop.set()
+        if not self.is_leader():
+            return
+        with self._lock:
+            self._leader_until = 0.0
+        lease = SchedulerLease.__table__
+        with app_context():
+            try:
+                db.session.execute(
+                    lease.update()
+                    .where(lease.c.name == self.name)
+                    .where(lease.c.owner == self.owner_id)
+                    .values(expires_at=datetime.utcnow())
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.debug(f"Could not release scheduler lease: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(enabled=self.enabled, owner_id=self.owner_id, leader=self.is_leader(),
+                     ttl=self.ttl, heartbeat_interval=self.heartbeat_interval)
+        lease = SchedulerLease.query.get(self.name) if self.enabled else None
+        stats['lease'] = lease.to_dict() if lease else None
+        return stats
+
+scheduler_leader = SchedulerLeader(
+    ttl=int(os.environ.get('SCHEDULER_LEASE_TTL', 60)),
+    heartbeat_interval=int(os.environ.get('SCHEDULER_HEARTBEAT_INTERVAL', 15)),
+    enabled=os.environ.get('SCHEDULER_LEADER_ELECTION', 'true').lower() in ('1', 'true', 'yes')
+)
+
+# Планировщик фоновых задач
+class IntervalTrigger:
+    """Запуск каждые seconds секунд"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError('Interval must be positive')
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + self.seconds
+
+    def __str__(self):
+        return f"every {self.seconds:g}s"
+
+class CronTrigger:
+    """Запуск по cron-выражению из 5 полей: минута, час, день месяца, месяц, день недели (0 - воскресенье).
+
+    Поддерживаются *, списки (1,15), диапазоны (1-5) и шаг (*/15, 0-30/10). Время - UTC.
+    """
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        # Как в cron: если заданы и день месяца, и день недели, достаточно совпадения одного из них
+        self._any_day = fields[2] == '*' or fields[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/', 1)
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Invalid cron field '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        return in_days and in_weekdays if self._any_day else in_days or in_weekdays
+
+    def next_after(self, moment):
+        current = datetime.utcfromtimestamp(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Перебор с пропуском целых месяцев, дней и часов - не больше нескольких тысяч шагов
+        for _ in range(100000):
+            if current.month not in self.months:
+                current = (current.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+            elif current.hour not in self.hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+            elif current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+            else:
+                return calendar.timegm(current.utctimetuple())
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+    def __str__(self):
+        return f"cron '{self.expression}'"
+
+class ScheduledJob:
+    """Зарегистрированная задача планировщика и ее статистика"""
+
+    def __init__(self, name, func, trigger, leader_only):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.leader_only = leader_only
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped_overlap = 0
+        self.skipped_not_leader = 0
+        self.last_started_at = None
+        self.last_duration = None
+        self.last_lag = None
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trigger': str(self.trigger),
+            'leader_only': self.leader_only,
+            'running': self.running,
+            'next_run': datetime.utcfromtimestamp(self.next_run).isoformat() if self.next_run else None,
+            'last_started_at': datetime.utcfromtimestamp(self.last_started_at).isoformat() if self.last_started_at else None,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_lag': round(self.last_lag, 3) if self.last_lag is not None else None,
+            'last_error': self.last_error,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped_overlap': self.skipped_overlap,
+            'skipped_not_leader': self.skipped_not_leader
+        }
+
+class JobScheduler:
+    """Планировщик периодических задач: куча таймеров и ограниченный пул исполнителей.
+
+    Один поток ждет ближайшего срока в куче и передает задачу в пул из
+    max_workers потоков. Задача не запускается, пока не закончился ее
+    предыдущий запуск (пропуск учитывается в skipped_overlap). Задачи
+    leader_only выполняются только во владельце аренды планировщика.
+    Для каждой задачи хранятся длительность и задержка старта (lag) последнего запуска.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._jobs = OrderedDict()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+
+    def add_job(self, name, func, trigger, leader_only=False, run_immediately=False):
+        """Зарегистрировать задачу name; run_immediately - первый запуск сразу, а не через интервал"""
+        with self._condition:
+            if name in self._jobs:
+                raise ValueError(f"Job '{name}' is already registered")
+            job = ScheduledJob(name, func, trigger, leader_only)
+            now = time.time()
+            job.next_run = now if run_immediately else trigger.next_after(now)
+            self._jobs[name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._sequence), name))
+            self._condition.notify()
+        return job
+
+    def has_job(self, name):
+        with self._condition:
+            return name in self._jobs
+
+    def start(self):
+        if self._thread:
+            return
+        with self._condition:
+            if self._thread:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+            self._thread.start()
+        logger.info(f"Job scheduler started with {len(self._jobs)} job(s): {', '.join(self._jobs)}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                scheduled, _, name = self._heap[0]
+                delay = scheduled - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                job = self._jobs[name]
+                # Следующий срок считаем от планового, чтобы интервал не уплывал;
+                # если он уже прошел (долгая задача, остановка процесса) - от текущего момента
+                now = time.time()
+                next_run = job.trigger.next_after(scheduled)
+                if next_run <= now:
+                    next_run = job.trigger.next_after(now)
+                job.next_run = next_run
+                heapq.heappush(self._heap, (next_run, next(self._sequence), name))
+                
+                if job.running:
+                    job.skipped_overlap += 1
+                    job_skips_total.inc(name, 'overlap')
+                    continue
+                if job.leader_only and not scheduler_leader.is_leader():
+                    job.skipped_not_leader += 1
+                    job_skips_total.inc(name, 'not_leader')
+                    continue
+                job.running = True
+            try:
+                self._executor.submit(self._execute, job, scheduled)
+            except RuntimeError:
+                # Интерпретатор завершается - пул исполнителей уже остановлен
+                return
+
+    def _execute(self, job, scheduled):
+        started = time.time()
+        error = None
+        try:
+            with app_context():
+                job.func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Job '{job.name}' failed: {e}", exc_info=True)
+        finally:
+            duration = time.time() - started
+            with self._condition:
+                job.running = False
+                job.runs += 1
+                job.last_started_at = started
+                job.last_duration = duration
+                job.last_lag = started - scheduled
+                job.last_error = error
+                if error:
+                    job.failures += 1
+            job_runs_total.inc(job.name, 'error' if error else 'ok')
+            job_duration.observe(duration, job.name)
+            job_lag.observe(max(0.0, started - scheduled), job.name)
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                'running': self._thread is not None,
+                'max_workers': self.max_workers,
+                'jobs': [job.to_dict() for job in self._jobs.values()]
+            }
+
+job_scheduler = JobScheduler(max_workers=int(os.environ.get('JOB_SCHEDULER_WORKERS', 4)))
@@ -0,0 +1,248 @@
+"""
+Версия состояния, снимок статистики камер, обмен состоянием между
+процессами и кэш готовых ответов.
+"""
+from flask import request, make_response
+from sqlalchemy import event
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+import gzip
+import itertools
+import json
+import threading
+from models import AppState, BazarLog, BazarStatus, CameraSnapshot, db
+from observability import request_phase
+
+# Версия состояния и кэш готовых ответов
+# Версия увеличивается при каждом коммите, затронувшем базары или логи,
+# а также при изменении снимка статистики камер. Все кэши, зависящие от
+# состояния, используют её как ключ и сбрасываются при её изменении.
+_state_lock = threading.Lock()
+_state_version = 0
+
+# Снимок последней статистики камер по каждому базару (service_id -> данные)
+_camera_snapshot = {}
+# Локальные изменения, которые еще не опубликованы для других процессов
+_state_dirty = False
+_snapshot_dirty = set()
+
+def get_state_version():
+    """Текущая версия состояния"""
+    return _state_version
+
+def bump_state_version(publish=True):
+    """Увеличить версию состояния (инвалидирует все кэши)
+
+    publish=False - изменение пришло из другого процесса и публиковать его не нужно.
+    """
+    global _state_version, _state_dirty
+    with _state_lock:
+        _state_version += 1
+        if publish:
+            _state_dirty = True
+        return _state_version
+
+@event.listens_for(db.session, 'before_flush')
+def _track_state_changes(session, flush_context, instances):
+    """Помечает сессию, если в ней меняются базары или логи"""
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (BazarStatus, BazarLog)):
+            session.info['state_changed'] = True
+            return
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_state_on_commit(session):
+    if session.info.pop('state_changed', False):
+        bump_state_version()
+
+@event.listens_for(db.session, 'after_rollback')
+def _reset_state_on_rollback(session):
+    session.info.pop('state_changed', None)
+
+def update_camera_snapshot(service_id, camera_stats):
+    """Сохранить последнюю статистику камер базара (None - базар недоступен)"""
+    with _state_lock:
+        previous = _camera_snapshot.get(service_id)
+        _camera_snapshot[service_id] = {
+            'stats': camera_stats,
+            'checked_at': datetime.utcnow()
+        }
+        _snapshot_dirty.add(service_id)
+    if previous is None or previous['stats'] != camera_stats:
+        bump_state_version()
+
+def get_camera_snapshot(service_id):
+    """Получить последнюю сохраненную статистику камер базара"""
+    return _camera_snapshot.get(service_id)
+
+_shared_state = {'version': None, 'pulled_at': None}
+
+def sync_shared_state():
+    """Обменяться изменениями состояния с другими процессами (воркеры gunicorn, scheduler.py).
+
+    Версия состояния и снимок камер живут в памяти процесса. Локальные
+    изменения публикуются в таблицы app_state и camera_snapshot, а чужие
+    изменения (новая версия в app_state) подтягиваются в память и сбрасывают
+    локальные кэши. Выполняется задачей 'state-sync' каждые STATE_SYNC_INTERVAL секунд.
+    """
+    global _state_dirty
+    with _state_lock:
+        dirty, _state_dirty = _state_dirty, False
+        service_ids = set(_snapshot_dirty)
+        _snapshot_dirty.clear()
+    
+    try:
+        if dirty or service_ids:
+            if service_ids:
+                existing = {
+                    row.service_id: row
+                    for row in CameraSnapshot.query.filter(CameraSnapshot.service_id.in_(service_ids))
+                }
+                for service_id in service_ids:
+                    snapshot = get_camera_snapshot(service_id)
+                    stats = json.dumps(snapshot['stats']) if snapshot['stats'] is not None else None
+                    row = existing.get(service_id)
+                    if row is None:
+                        db.session.add(CameraSnapshot(service_id=service_id, stats=stats, checked_at=snapshot['checked_at']))
+                    else:
+                        row.stats = stats
+                        row.checked_at = snapshot['checked_at']
+                        row.updated_at = datetime.utcnow()
+            updated = AppState.query.filter_by(name='state').update(
+                {'version': AppState.version + 1, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            if not updated:
+                db.session.add(AppState(name='state', version=1))
+            published = db.session.query(AppState.version).filter_by(name='state').scalar()
+            db.session.commit()
+            if published == (_shared_state['version'] or 0) + 1:
+                # После прошлого чтения версию никто не менял: опубликованное уже применено
+                # локально, и перечитывать снимок и сбрасывать кэши второй раз не нужно
+                _shared_state['version'] = published
+    except Exception:
+        db.session.rollback()
+        # Не удалось опубликовать - попробуем в следующий раз
+        with _state_lock:
+            _state_dirty = _state_dirty or dirty
+            _snapshot_dirty.update(service_ids)
+        raise
+    
+    version = db.session.query(AppState.version).filter_by(name='state').scalar()
+    if version is None or version == _shared_state['version']:
+        return False
+    pulled_at = datetime.utcnow()
+    query = CameraSnapshot.query
+    if _shared_state['pulled_at'] is not None:
+        # Запас на разницу часов процессов; повторное применение строки безопасно
+        query = query.filter(CameraSnapshot.updated_at >= _shared_state['pulled_at'] - timedelta(seconds=5))
+    with _state_lock:
+        for row in query:
+            current = _camera_snapshot.get(row.service_id)
+            if current is None or current['checked_at'] < row.checked_at:
+                _camera_snapshot[row.service_id] = {
+                    'stats': json.loads(row.stats) if row.stats else None,
+                    'checked_at': row.checked_at
+                }
+    _shared_state.update(version=version, pulled_at=pulled_at)
+    bump_state_version(publish=False)
+    return True
+
+class ResponseCache:
+    """LRU-кэш сериализованных (и при необходимости сжатых) ответов.
+
+    Записи действительны только для одной версии состояния: при смене
+    версии кэш очищается целиком.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, entry):
+        with self._lock:
+            # Ответ собран для устаревшей версии - не сохраняем
+            if version != self._version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / total) if total else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+RESPONSE_GZIP_MIN_SIZE = 1024
+response_cache = ResponseCache(max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 128)))
+
+def cached_json_response(cache_name, build_payload, status_code=200):
+    """Вернуть JSON-ответ из кэша или собрать его через build_payload().
+
+    Ключ кэша - имя эндпоинта, строка запроса и поддержка gzip клиентом.
+    """
+    version = get_state_version()
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    key = (cache_name, request.query_string, accepts_gzip)
+
+    entry = response_cache.get(key, version)
+    cache_status = 'HIT'
+    if entry is None:
+        cache_status = 'MISS'
+        payload = build_payload()
+        with request_phase('serialization'):
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            encoding = None
+            if accepts_gzip and len(body) >= RESPONSE_GZIP_MIN_SIZE:
+                body = gzip.compress(body, compresslevel=6)
+                encoding = 'gzip'
+        entry = (body, encoding)
+        response_cache.put(key, version, entry)
+
+    body, encoding = entry
+    response = make_response(body, status_code)
+    response.headers['Content-Type'] = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-State-Version'] = str(version)
+    response.headers['X-Cache'] = cache_status
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,2201 @@
+"""
+Telegram: вызовы Bot API, очереди доставки с лимитами, уведомления через
+outbox, клавиатуры и карточки базаров, обработка обновлений webhook.
+"""
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+import requests
+import os
+import hashlib
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+import zlib
+from models import (
+    app_context, AppState, BazarStatus, db, NotificationFingerprint, NotificationOutbox, TelegramChatId, TelegramSettings,
+    TelegramStatusJob, TelegramStatusMessage, TelegramUpdate
+)
+from observability import item_logger, request_phase, telegram_request_duration, telegram_requests_total
+from state import get_camera_snapshot, get_state_version, ResponseCache, update_camera_snapshot
+from scheduling import scheduler_leader
+from probes import fetch_bazar_info
+
+logger = logging.getLogger(__name__)
+
+# Статичные настройки Telegram бота
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '8511503519:AAEW1sWzwvgjExP9Y6pQMDcflEjhT_a8deE')
+# Адрес Bot API (для нагрузочных тестов - локальный сервер benchmarks/fake_telegram_api.py)
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+
+def instrument_telegram_call(method):
+    """Декоратор для вызовов Bot API: время и результат (ok, rate_limited, retryable_error, error)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with request_phase('telegram'):
+                result = func(*args, **kwargs)
+            telegram_request_duration.observe(time.perf_counter() - started, method)
+            if isinstance(result, TelegramDeliveryResult):
+                if result.success:
+                    outcome = 'ok'
+                elif result.retry_after is not None:
+                    outcome = 'rate_limited'
+                else:
+                    outcome = 'retryable_error' if result.retryable else 'error'
+            else:
+                outcome = 'ok' if result[0] else 'error'
+            telegram_requests_total.inc(method, outcome)
+            return result
+        return wrapper
+    return decorator
+
+@instrument_telegram_call('deleteMessage')
+def delete_telegram_message(bot_token, chat_id, message_id):
+    """Удалить сообщение в Telegram. Возвращает (success: bool, error: str или None)"""
+    try:
+        url = f"{TELEGRAM_API_URL}/bot{bot_token}/deleteMessage"
+        params = {
+            'chat_id': str(chat_id),
+            'message_id': int(message_id)
+        }
+        
+        response = requests.post(url, json=params, timeout=10)
+        
+        if response.ok:
+            result = response.json()
+            if result.get('ok'):
+                item_logger.debug("Deleted message %s from chat_id %s", message_id, chat_id)
+                return True, None
+            else:
+                error_desc = result.get('description', 'Unknown error')
+                error_code = result.get('error_code', 'N/A')
+                error_msg = f"[{error_code}] {error_desc}"
+                # Если сообщение уже не найдено, это нормальная ситуация (не логируем как ошибку)
+                if 'not found' in error_desc.lower() or 'message to delete not found' in error_desc.lower():
+                    item_logger.debug("Message %s from chat_id %s already deleted or not found (this is normal)", message_id, chat_id)
+                    return True, None  # Возвращаем success, так как цель достигнута (сообщения нет)
+                logger.warning("Failed to delete message %s from chat_id %s: %s", message_id, chat_id, error_msg)
+                return False, error_msg
+        else:
+            try:
+                error_data = response.json()
+                error_desc = error_data.get('description', response.text)
+                error_code = error_data.get('error_code', response.status_code)
+                error_msg = f"HTTP {response.status_code}, [{error_code}] {error_desc}"
+                # Если сообщение уже не найдено, это нормальная ситуация (не логируем как ошибку)
+                if 'not found' in error_desc.lower() or 'message to delete not found' in error_desc.lower():
+                    item_logger.debug("Message %s from chat_id %s already deleted or not found (this is normal)", message_id, chat_id)
+                    return True, None  # Возвращаем success, так как цель достигнута (сообщения нет)
+                logger.warning("Failed to delete message %s from chat_id %s: %s", message_id, chat_id, error_msg)
+            except:
+                error_msg = f"HTTP {response.status_code} - {response.text}"
+                logger.warning("Failed to delete message %s from chat_id %s: %s", message_id, chat_id, error_msg)
+            return False, error_msg
+    except Exception as e:
+        logger.error(f"Exception while deleting Telegram message: {e}")
+        return False, str(e)
+
+def normalize_chat_id(chat_id):
+    """Нормализует chat_id для Telegram API (только числовые ID)"""
+    if not chat_id:
+        return chat_id
+    
+    chat_id_str = str(chat_id).strip()
+    
+    # Проверяем, что это числовой ID (начинается с минуса или только цифры)
+    if not (chat_id_str.startswith('-') or chat_id_str.lstrip('-').isdigit()):
+        # Это не числовой ID - возвращаем None или пустую строку
+        return None
+    
+    # Это числовой ID - возвращаем как есть
+    return chat_id_str
+
+# Результат одной попытки доставки сообщения в Telegram.
+# retry_after - пауза из ответа 429, retryable - имеет ли смысл повторять попытку
+TelegramDeliveryResult = namedtuple('TelegramDeliveryResult', ['success', 'message_id', 'error', 'retry_after', 'retryable'])
+
+def _parse_telegram_error(response, data, normalized_chat_id):
+    """Разобрать ответ Telegram с ошибкой. Возвращает TelegramDeliveryResult"""
+    error_desc = data.get('description', response.text)
+    error_code = data.get('error_code', response.status_code)
+    parameters = data.get('parameters') or {}
+    prefix = f"HTTP {response.status_code}, " if not response.ok else ''
+    # Проверяем, есть ли новый chat ID для мигрированной группы
+    migrate_to_chat_id = parameters.get('migrate_to_chat_id')
+    if migrate_to_chat_id:
+        error_msg = f"{prefix}[{error_code}] {error_desc}. Новый chat ID: {migrate_to_chat_id}"
+        logger.warning(f"Group migrated to supergroup. Old chat_id: {normalized_chat_id}, New chat_id: {migrate_to_chat_id}")
+    else:
+        error_msg = f"{prefix}[{error_code}] {error_desc}"
+        logger.error(f"Telegram API error for chat_id {normalized_chat_id}: {error_msg}")
+    retry_after = parameters.get('retry_after')
+    retryable = response.status_code == 429 or response.status_code >= 500 or retry_after is not None
+    return TelegramDeliveryResult(False, None, error_msg, retry_after, retryable)
+
+@instrument_telegram_call('sendMessage')
+def deliver_telegram_message(bot_token, chat_id, message, reply_markup=None):
+    """Одна попытка отправки сообщения в Telegram. Возвращает TelegramDeliveryResult"""
+    try:
+        # Нормализуем chat_id (только числовые ID)
+        normalized_chat_id = normalize_chat_id(chat_id)
+        if not normalized_chat_id:
+            error_msg = f"Некорректный chat_id: {chat_id}. Поддерживаются только числовые ID"
+            logger.error(error_msg)
+            return TelegramDeliveryResult(False, None, error_msg, None, False)
+        
+        url = f"{TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
+        params = {
+            'chat_id': normalized_chat_id,  # Используем нормализованный числовой chat_id
+            'text': message,
+            'parse_mode': 'Markdown',
+            'disable_web_page_preview': True
+        }
+        if reply_markup:
+            params['reply_markup'] = reply_markup
+        
+        item_logger.debug("Sending Telegram message to chat_id=%s", normalized_chat_id)
+        response = requests.post(url, json=params, timeout=10)
+        
+        try:
+            result = response.json()
+        except ValueError:
+            error_msg = f"HTTP {response.status_code} - {response.text}"
+            logger.error(f"Telegram API HTTP error for chat_id {chat_id}: {error_msg}")
+            return TelegramDeliveryResult(False, None, error_msg, None, response.status_code >= 500)
+        
+        if response.ok and result.get('ok'):
+            message_id = result.get('result', {}).get('message_id')
+            item_logger.debug("Telegram API response OK for chat_id %s, message_id: %s", normalized_chat_id, message_id)
+            return TelegramDeliveryResult(True, message_id, None, None, False)
+        return _parse_telegram_error(response, result, normalized_chat_id)
+    except requests.exceptions.Timeout:
+        error_msg = "Timeout при отправке сообщения"
+        logger.error(f"Timeout sending Telegram message to {chat_id}")
+        return TelegramDeliveryResult(False, None, error_msg, None, True)
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Ошибка сети: {str(e)}"
+        logger.error(f"Request exception sending Telegram message to {chat_id}: {e}")
+        return TelegramDeliveryResult(False, None, error_msg, None, True)
+    except Exception as e:
+        error_msg = f"Неожиданная ошибка: {str(e)}"
+        logger.error(f"Exception sending Telegram message to {chat_id}: {e}", exc_info=True)
+        return TelegramDeliveryResult(False, None, error_msg, None, False)
+
+def send_telegram_message(bot_token, chat_id, message, reply_markup=None):
+    """Отправить сообщение в Telegram. Возвращает (success: bool, message_id: int или None, error: str или None)"""
+    result = deliver_telegram_message(bot_token, chat_id, message, reply_markup)
+    return result.success, result.message_id, result.error
+
+@instrument_telegram_call('editMessageText')
+def edit_telegram_message(bot_token, chat_id, message_id, message, reply_markup=None):
+    """Одна попытка отредактировать сообщение в Telegram. Возвращает TelegramDeliveryResult
+
+    Ответ "message is not modified" считается успехом: текст уже актуален.
+    """
+    try:
+        url = f"{TELEGRAM_API_URL}/bot{bot_token}/editMessageText"
+        params = {
+            'chat_id': str(chat_id),
+            'message_id': int(message_id),
+            'text': message,
+            'parse_mode': 'Markdown',
+            'disable_web_page_preview': True
+        }
+        if reply_markup:
+            params['reply_markup'] = reply_markup
+        
+        response = requests.post(url, json=params, timeout=10)
+        try:
+            result = response.json()
+        except ValueError:
+            return TelegramDeliveryResult(False, None, f"HTTP {response.status_code} - {response.text}", None, response.status_code >= 500)
+        
+        if response.ok and result.get('ok'):
+            return TelegramDeliveryResult(True, message_id, None, None, False)
+        if 'message is not modified' in str(result.get('description', '')).lower():
+            return TelegramDeliveryResult(True, message_id, None, None, False)
+        parameters = result.get('parameters') or {}
+        error_msg = f"[{result.get('error_code', response.status_code)}] {result.get('description', response.text)}"
+        item_logger.debug("Could not edit message %s in chat_id %s: %s", message_id, chat_id, error_msg)
+        retry_after = parameters.get('retry_after')
+        return TelegramDeliveryResult(False, None, error_msg, retry_after, response.status_code == 429 or response.status_code >= 500)
+    except requests.exceptions.RequestException as e:
+        return TelegramDeliveryResult(False, None, f"Ошибка сети: {str(e)}", None, True)
+    except Exception as e:
+        logger.error(f"Exception editing Telegram message in {chat_id}: {e}", exc_info=True)
+        return TelegramDeliveryResult(False, None, f"Неожиданная ошибка: {str(e)}", None, False)
+
+def get_bot_token():
+    """Токен бота: статичный TELEGRAM_BOT_TOKEN или из включенных настроек в БД"""
+    if TELEGRAM_BOT_TOKEN:
+        return TELEGRAM_BOT_TOKEN
+    telegram_settings = TelegramSettings.query.filter_by(enabled=True).first()
+    return telegram_settings.bot_token if telegram_settings else None
+
+def get_bot_tokens():
+    """Пул токенов для рассылки: основной токен и дополнительные токены из TelegramSettings"""
+    telegram_settings = TelegramSettings.query.filter_by(enabled=True).first()
+    tokens = [TELEGRAM_BOT_TOKEN or (telegram_settings.bot_token if telegram_settings else None)]
+    if telegram_settings:
+        tokens.extend(telegram_settings.get_extra_bot_tokens())
+    return list(OrderedDict.fromkeys(token for token in tokens if token))
+
+def shard_bot_token(chat_id, tokens):
+    """Токен, закрепленный за чатом (rendezvous hashing).
+
+    Чат всегда попадает к одному боту; при добавлении токена к новому
+    боту переходит только часть чатов, остальные не меняют отправителя.
+    """
+    if len(tokens) <= 1:
+        return tokens[0] if tokens else None
+    chat_key = str(chat_id)
+    return max(tokens, key=lambda token: zlib.crc32(f"{token}|{chat_key}".encode('utf-8')))
+
+def bot_label(bot_token):
+    """Публичная часть токена (ID бота) для метрик и логов"""
+    return str(bot_token).split(':', 1)[0]
+
+def answer_telegram_callback_query(bot_token, callback_query_id):
+    """Ответить на нажатие inline-кнопки (убирает индикатор загрузки у пользователя)"""
+    try:
+        requests.post(f"{TELEGRAM_API_URL}/bot{bot_token}/answerCallbackQuery",
+                      json={'callback_query_id': callback_query_id}, timeout=5)
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"Could not answer callback query {callback_query_id}: {e}")
+
+class TokenBucket:
+    """Потокобезопасный token bucket с резервированием.
+
+    reserve() сразу списывает токен (баланс может уйти в минус) и возвращает,
+    сколько секунд нужно подождать перед запросом.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def block_for(self, seconds):
+        """Запретить запросы на указанное время (например, по retry_after)"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+class TelegramDeliveryQueue:
+    """Асинхронная доставка сообщений в Telegram.
+
+    Задачи распределяются по воркерам по chat_id, поэтому сообщения в один
+    чат уходят строго по порядку. Перед каждым запросом воркер ждет токены
+    глобального лимита и лимита чата; на 429 выдерживает retry_after, на
+    сетевые ошибки и 5xx повторяет попытку с экспоненциальной задержкой.
+    """
+
+    def __init__(self, workers=4, global_rate=30, chat_rate=1, group_rate=20 / 60,
+                 max_attempts=5, backoff_base=1.0, max_queue_size=10000, name='telegram-delivery'):
+        self.name = name
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.max_queue_size = max_queue_size
+        self.global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'sent': 0,
+            'edited': 0,
+            'edit_fallbacks': 0,
+            'failed': 0,
+            'retries': 0,
+            'rate_limited': 0
+        }
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                # Группы и каналы (отрицательный ID) - до 20 сообщений в минуту, личные чаты - 1 в секунду
+                rate = self.group_rate if str(chat_id).startswith('-') else self.chat_rate
+                bucket = self._chat_buckets[chat_id] = TokenBucket(rate)
+            return bucket
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            queues = [queue.Queue(maxsize=self.max_queue_size) for _ in range(self.workers)]
+            threads = [
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(worker_queue,),
+                    name=f'{self.name}-{index}',
+                    daemon=True
+                )
+                for index, worker_queue in enumerate(queues)
+            ]
+            for thread in threads:
+                thread.start()
+            self._queues = queues
+            self._threads = threads
+            logger.info(f"Telegram delivery queue {self.name} started with {self.workers} worker(s)")
+
+    def enqueue(self, bot_token, chat_id, message, reply_markup=None, delete_message_id=None,
+                edit_message_id=None, on_sent=None, on_failed=None):
+        """Поставить сообщение в очередь. Возвращает True, если задача принята.
+
+        edit_message_id - отредактировать это сообщение вместо отправки нового,
+        при неудаче сообщение отправляется заново;
+        delete_message_id - удалить это сообщение перед отправкой нового.
+        Оба параметра - число или функция, возвращающая ID на момент отправки.
+        on_sent(message_id) вызывается в потоке воркера после успешной отправки
+        или редактирования, on_failed(error) - когда все попытки исчерпаны.
+        """
+        self._ensure_started()
+        job = {
+            'bot_token': bot_token,
+            'chat_id': str(chat_id),
+            'message': message,
+            'reply_markup': reply_markup,
+            'delete_message_id': delete_message_id,
+            'edit_message_id': edit_message_id,
+            'on_sent': on_sent,
+            'on_failed': on_failed
+        }
+        worker_queue = self._queues[zlib.crc32(job['chat_id'].encode()) % len(self._queues)]
+        try:
+            worker_queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+            logger.error(f"Telegram delivery queue is full, dropping message for chat_id {chat_id}")
+            return False
+        with self._lock:
+            self.stats['enqueued'] += 1
+        return True
+
+    def _wait_for_slot(self, chat_id):
+        wait = max(self.global_bucket.reserve(), self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            time.sleep(wait)
+
+    def _run_worker(self, worker_queue):
+        while True:
+            job = worker_queue.get()
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error(f"Error in Telegram delivery worker: {e}", exc_info=True)
+            finally:
+                worker_queue.task_done()
+
+    def _attempt(self, chat_id, operation):
+        """Выполнить запрос к Telegram с ожиданием лимитов и повторами"""
+        for attempt in range(1, self.max_attempts + 1):
+            self._wait_for_slot(chat_id)
+            result = operation()
+            if result.success or not result.retryable or attempt == self.max_attempts:
+                return result
+            
+            if result.retry_after:
+                delay = float(result.retry_after)
+                self._chat_bucket(chat_id).block_for(delay)
+                with self._lock:
+                    self.stats['rate_limited'] += 1
+            else:
+                delay = self.backoff_base * (2 ** (attempt - 1))
+            with self._lock:
+                self.stats['retries'] += 1
+            item_logger.info("Retrying Telegram request to chat_id %s in %.1fs (attempt %s/%s)", chat_id, delay, attempt, self.max_attempts)
+            time.sleep(delay)
+        return result
+
+    def _process(self, job):
+        chat_id = job['chat_id']
+        bot_token = job['bot_token']
+        
+        # Сначала пытаемся обновить существующее сообщение на месте
+        edit_message_id = job['edit_message_id']
+        if callable(edit_message_id):
+            edit_message_id = edit_message_id()
+        if edit_message_id:
+            result = self._attempt(chat_id, lambda: edit_telegram_message(
+                bot_token, chat_id, edit_message_id, job['message'], job['reply_markup']))
+            if result.success:
+                with self._lock:
+                    self.stats['edited'] += 1
+                if job['on_sent']:
+                    job['on_sent'](edit_message_id)
+                return
+            with self._lock:
+                self.stats['edit_fallbacks'] += 1
+        
+        delete_message_id = job['delete_message_id']
+        if callable(delete_message_id):
+            delete_message_id = delete_message_id()
+        if delete_message_id:
+            self._wait_for_slot(chat_id)
+            delete_telegram_message(bot_token, chat_id, delete_message_id)
+        
+        result = self._attempt(chat_id, lambda: deliver_telegram_message(
+            bot_token, chat_id, job['message'], job['reply_markup']))
+        if result.success:
+            with self._lock:
+                self.stats['sent'] += 1
+            if job['on_sent']:
+                job['on_sent'](result.message_id)
+            return
+        
+        with self._lock:
+            self.stats['failed'] += 1
+        logger.warning(f"Failed to deliver Telegram message to chat_id {chat_id}: {result.error}")
+        if job['on_failed']:
+            job['on_failed'](result.error)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['workers'] = len(self._threads)
+            stats['queued'] = sum(q.qsize() for q in self._queues)
+            return stats
+
+class TelegramDeliveryPool:
+    """Отправители по токенам ботов.
+
+    Лимиты Telegram действуют на каждый токен отдельно, поэтому у каждого
+    токена своя TelegramDeliveryQueue: свои воркеры, глобальный лимит и
+    счетчики. Очереди создаются при первой отправке через токен.
+    """
+
+    def __init__(self, **queue_options):
+        self.queue_options = queue_options
+        self._senders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sender(self, bot_token):
+        sender = self._senders.get(bot_token)
+        if sender is None:
+            with self._lock:
+                sender = self._senders.get(bot_token)
+                if sender is None:
+                    sender = TelegramDeliveryQueue(name=f'telegram-delivery-{bot_label(bot_token)}', **self.queue_options)
+                    self._senders[bot_token] = sender
+        return sender
+
+    def enqueue(self, bot_token, chat_id, message, **kwargs):
+        """Поставить сообщение в очередь отправителя токена (см. TelegramDeliveryQueue.enqueue)"""
+        return self.sender(bot_token).enqueue(bot_token, chat_id, message, **kwargs)
+
+    def get_stats(self):
+        """Суммарные счетчики и счетчики по каждому боту"""
+        with self._lock:
+            senders = list(self._senders.items())
+        per_token = {bot_label(bot_token): sender.get_stats() for bot_token, sender in senders}
+        totals = {}
+        for stats in per_token.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        totals['tokens'] = per_token
+        return totals
+
+telegram_delivery = TelegramDeliveryPool(
+    workers=int(os.environ.get('TELEGRAM_DELIVERY_WORKERS', 4)),
+    global_rate=float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30)),
+    chat_rate=float(os.environ.get('TELEGRAM_CHAT_RATE', 1)),
+    group_rate=float(os.environ.get('TELEGRAM_GROUP_RATE', 20 / 60)),
+    max_attempts=int(os.environ.get('TELEGRAM_MAX_ATTEMPTS', 5))
+)
+
+# Клавиатуры списка базаров разбиты на страницы и кэшируются по версии состояния
+TELEGRAM_KEYBOARD_PAGE_SIZE = int(os.environ.get('TELEGRAM_KEYBOARD_PAGE_SIZE', 20))
+bazars_keyboard_cache = ResponseCache(max_entries=4)
+
+def _region_key(city):
+    """Короткий стабильный ключ области для callback_data (лимит Telegram - 64 байта)"""
+    return format(zlib.crc32(city.encode('utf-8')), '08x')
+
+def _paginate_buttons(buttons, page_size):
+    """Разбить кнопки на страницы по page_size, по 2 кнопки в ряд"""
+    pages = []
+    for start in range(0, len(buttons), page_size) or [0]:
+        chunk = buttons[start:start + page_size]
+        pages.append([chunk[i:i + 2] for i in range(0, len(chunk), 2)])
+    return pages
+
+def _navigation_row(page, total_pages, callback_prefix):
+    """Ряд кнопок ◀️ / номер страницы / ▶️"""
+    if total_pages <= 1:
+        return []
+    row = []
+    if page > 0:
+        row.append({'text': '◀️', 'callback_data': f"{callback_prefix}{page - 1}"})
+    row.append({'text': f"{page + 1}/{total_pages}", 'callback_data': 'noop'})
+    if page < total_pages - 1:
+        row.append({'text': '▶️', 'callback_data': f"{callback_prefix}{page + 1}"})
+    return [row]
+
+def _build_bazars_keyboard_layout():
+    """Собрать все страницы клавиатур: общий список, список по каждой области и выбор области"""
+    services = BazarStatus.query.all()
+    by_region = OrderedDict([('', [])])
+    regions = {}
+    for service in services:
+        status_emoji = "🟢" if service.status == 'online' else "🔴"
+        button = {
+            'text': f"{status_emoji} {service.bazar_name}",
+            'callback_data': f"bazar_{service.id}"
+        }
+        by_region[''].append(button)
+        if service.city:
+            key = _region_key(service.city)
+            regions.setdefault(key, service.city)
+            by_region.setdefault(key, []).append(button)
+    
+    pages = {}
+    for key, buttons in by_region.items():
+        button_pages = _paginate_buttons(buttons, TELEGRAM_KEYBOARD_PAGE_SIZE)
+        pages[key] = []
+        for page, rows in enumerate(button_pages):
+            footer = [{'text': '🗺 Фильтр по области', 'callback_data': 'regions:0'}]
+            if key:
+                footer.append({'text': '🌐 Все области', 'callback_data': 'bazars::0'})
+            pages[key].append({'inline_keyboard': (
+                rows
+                + _navigation_row(page, len(button_pages), f"bazars:{key}:")
+                + [footer]
+                + [[{'text': '🔄 Обновить список', 'callback_data': f"bazars:{key}:{page}"}]]
+            )})
+    
+    region_buttons = [
+        {'text': f"{city} ({len(by_region[key])})", 'callback_data': f"bazars:{key}:0"}
+        for key, city in sorted(regions.items(), key=lambda item: item[1])
+    ]
+    region_button_pages = _paginate_buttons(region_buttons, TELEGRAM_KEYBOARD_PAGE_SIZE)
+    region_pages = [
+        {'inline_keyboard': (
+            rows
+            + _navigation_row(page, len(region_button_pages), 'regions:')
+            + [[{'text': '🌐 Все области', 'callback_data': 'bazars::0'}]]
+        )}
+        for page, rows in enumerate(region_button_pages)
+    ]
+    return {'pages': pages, 'regions': regions, 'region_pages': region_pages, 'total': len(services)}
+
+def get_bazars_keyboard_layout():
+    """Страницы клавиатур для текущей версии состояния (строятся один раз на версию)"""
+    version = get_state_version()
+    layout = bazars_keyboard_cache.get('layout', version)
+    if layout is None:
+        layout = _build_bazars_keyboard_layout()
+        bazars_keyboard_cache.put('layout', version, layout)
+    return layout
+
+def get_bazars_keyboard(page=0, region_key=''):
+    """Создать клавиатуру со списком базаров (одна страница, при необходимости - одной области)"""
+    try:
+        layout_pages = get_bazars_keyboard_layout()['pages']
+        pages = layout_pages.get(region_key) or layout_pages['']
+        return pages[min(max(page, 0), len(pages) - 1)]
+    except Exception as e:
+        logger.error(f"Error creating bazars keyboard: {e}", exc_info=True)
+        return {'inline_keyboard': []}
+
+def get_bazars_list_message(page=0, region_key=''):
+    """Текст и клавиатура страницы списка базаров"""
+    region = get_bazars_keyboard_layout()['regions'].get(region_key) if region_key else None
+    message_text = "🏪 *Список базаров*\n\n"
+    if region:
+        message_text += f"📍 *Область:* {region}\n\n"
+    message_text += "Выберите базар для просмотра информации:"
+    return message_text, get_bazars_keyboard(page, region_key if region else '')
+
+def get_regions_list_message(page=0):
+    """Текст и клавиатура выбора области"""
+    region_pages = get_bazars_keyboard_layout()['region_pages']
+    keyboard = region_pages[min(max(page, 0), len(region_pages) - 1)]
+    return "🗺 *Выберите область*", keyboard
+
+def format_bazar_info(service, camera_stats=None):
+    """Форматировать информацию о базаре для Telegram"""
+    status_emoji = "🟢" if service.status == 'online' else "🔴"
+    status_text = "Онлайн" if service.status == 'online' else "Офлайн"
+    
+    message = f"{status_emoji} *{service.bazar_name}*\n"
+    message += f"━━━━━━━━━━━━━━━━━━━━\n\n"
+    
+    if service.city:
+        message += f"📍 *Город:* {service.city}\n"
+    
+    message += f"📊 *Статус:* {status_text}\n"
+    
+    if camera_stats:
+        total = camera_stats.get('totalCameras', 0)
+        online = camera_stats.get('onlineCameras', 0)
+        offline = camera_stats.get('offlineCameras', 0)
+        
+        message += f"\n📹 *Камеры:*\n"
+        message += f"   • Всего: {total}\n"
+        message += f"   • 🟢 Онлайн: {online}\n"
+        message += f"   • 🔴 Офлайн: {offline}\n"
+    
+    if service.contact_click or service.contact_click_name:
+        message += f"\n📞 *Контакты Click:*\n"
+        if service.contact_click_name:
+            message += f"   • {service.contact_click_name}\n"
+        if service.contact_click:
+            message += f"   • {service.contact_click}\n"
+    
+    if service.contact_scc or service.contact_scc_name:
+        message += f"\n📞 *Контакты SCC:*\n"
+        if service.contact_scc_name:
+            message += f"   • {service.contact_scc_name}\n"
+        if service.contact_scc:
+            message += f"   • {service.contact_scc}\n"
+    
+    if service.last_check:
+        message += f"\n🕐 *Последняя проверка:*\n"
+        message += f"   {service.last_check.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    
+    # Кнопка "Назад к списку"
+    keyboard = {
+        'inline_keyboard': [
+            [{'text': '🔙 Назад к списку', 'callback_data': 'list_bazars'}],
+            [{'text': '🔄 Обновить', 'callback_data': f'bazar_{service.id}'}]
+        ]
+    }
+    
+    return message, keyboard
+
+# Карточки базаров для кнопок бота: готовый текст кэшируется по версии состояния,
+# живой опрос базара выполняется, только если данные старше TELEGRAM_CARD_MAX_AGE
+TELEGRAM_CARD_MAX_AGE = int(os.environ.get('TELEGRAM_CARD_MAX_AGE', 360))
+bazar_card_cache = ResponseCache(max_entries=int(os.environ.get('TELEGRAM_CARD_CACHE_SIZE', 512)))
+_bazar_probe_locks = {}
+_bazar_probe_locks_lock = threading.Lock()
+bazar_card_stats = {'live_probes': 0}
+
+def _snapshot_is_fresh(snapshot):
+    """Снимок статистики камер не старше TELEGRAM_CARD_MAX_AGE"""
+    return bool(snapshot) and (datetime.utcnow() - snapshot['checked_at']).total_seconds() <= TELEGRAM_CARD_MAX_AGE
+
+def _format_data_age(seconds):
+    """Возраст данных в человекочитаемом виде"""
+    if seconds < 60:
+        return "только что"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} мин назад"
+    return f"{int(seconds // 3600)} ч {int(seconds % 3600 // 60)} мин назад"
+
+def _refresh_bazar_snapshot(service):
+    """Получить свежую статистику камер базара, опрашивая его не чаще TELEGRAM_CARD_MAX_AGE.
+
+    Одновременные нажатия по одному базару ждут один общий опрос.
+    """
+    with _bazar_probe_locks_lock:
+        probe_lock = _bazar_probe_locks.setdefault(service.id, threading.Lock())
+    with probe_lock:
+        snapshot = get_camera_snapshot(service.id)
+        if _snapshot_is_fresh(snapshot):
+            return snapshot
+        endpoint = {
+            'ip': service.bazar_ip,
+            'port': service.bazar_port,
+            'backendPort': service.backend_port,
+            'pgPort': service.pg_port
+        }
+        result = fetch_bazar_info(endpoint)
+        with _bazar_probe_locks_lock:
+            bazar_card_stats['live_probes'] += 1
+        update_camera_snapshot(service.id, result.get('data') if result.get('success') else None)
+        return get_camera_snapshot(service.id)
+
+def get_bazar_card(service_id):
+    """Карточка базара для Telegram: (текст, клавиатура) или None, если базар не найден"""
+    service = BazarStatus.query.get(service_id)
+    if not service:
+        return None
+    snapshot = _refresh_bazar_snapshot(service)
+    
+    version = get_state_version()
+    card = bazar_card_cache.get(service_id, version)
+    if card is None:
+        card = format_bazar_info(service, snapshot['stats'] if snapshot else None)
+        bazar_card_cache.put(service_id, version, card)
+    
+    message, keyboard = card
+    if snapshot:
+        age = (datetime.utcnow() - snapshot['checked_at']).total_seconds()
+        message += f"\n📡 *Данные камер:* {_format_data_age(age)}\n"
+    return message, keyboard
+
+# Маппинг различных вариантов названий областей к нормализованным
+REGION_NAME_MAPPING = {
+    # Ташкент город
+    'toshkent shahri': 'toshkentshahri',
+    'toshkentshahri': 'toshkentshahri',
+    'г. ташкент': 'toshkentshahri',
+    'г.ташкент': 'toshkentshahri',
+    'ташкент': 'toshkentshahri',
+    'toshkent': 'toshkentshahri',
+    # Ташкент область
+    'toshkent viloyati': 'toshkentviloyati',
+    'toshkentviloyati': 'toshkentviloyati',
+    'ташкентская область': 'toshkentviloyati',
+    'ташкент вилояти': 'toshkentviloyati',
+    # Другие регионы (можно расширить)
+    'fargona': 'fargona',
+    "farg'ona": 'fargona',
+    'farg`ona': 'fargona',
+    'fergana': 'fargona',
+    'фергана': 'fargona',
+    'namangan': 'namangan',
+    'наманган': 'namangan',
+    'sirdaryo': 'sirdaryo',
+    'сырдарья': 'sirdaryo',
+    'surxondaryo': 'surxondaryo',
+    'сурхандарья': 'surxondaryo',
+}
+
+def _strip_apostrophes(text):
+    return text.replace("'", "").replace("`", "").replace("'", "").replace("'", "")
+
+# Пары (ключ, ключ без апострофов, значение) для поиска по частичному совпадению
+_REGION_MAPPING_CLEAN = [
+    (key, _strip_apostrophes(key), normalized) for key, normalized in REGION_NAME_MAPPING.items()
+]
+
+@lru_cache(maxsize=1024)
+def normalize_region_name(region_name):
+    """Нормализует название региона для сравнения (приводит разные форматы к одному виду).
+
+    Результат кэшируется: набор названий областей мал, а функция вызывается
+    для каждого уведомления.
+    """
+    if not region_name:
+        return None
+    
+    region_lower = region_name.lower().strip()
+    
+    # Убираем апострофы и другие спецсимволы для нормализации
+    region_lower_clean = _strip_apostrophes(region_lower)
+    
+    # Проверяем точное совпадение (сначала оригинальный, потом очищенный)
+    if region_lower in REGION_NAME_MAPPING:
+        return REGION_NAME_MAPPING[region_lower]
+    if region_lower_clean in REGION_NAME_MAPPING:
+        return REGION_NAME_MAPPING[region_lower_clean]
+    
+    # Проверяем частичное совпадение (например, "Toshkent shahri" содержит "toshkent")
+    for key, key_clean, normalized in _REGION_MAPPING_CLEAN:
+        if key in region_lower or region_lower in key or key_clean in region_lower_clean or region_lower_clean in key_clean:
+            return normalized
+    
+    # Если не нашли, возвращаем нормализованную версию (убираем пробелы, спецсимволы, апострофы)
+    normalized = region_lower_clean.replace(' ', '').replace('.', '').replace('г', '').replace('область', 'viloyati').replace('вилояти', 'viloyati')
+    return normalized
+
+# Маршрут уведомления: ID строки TelegramChatId, chat_id и тип чата
+ChatRoute = namedtuple('ChatRoute', ['row_id', 'chat_id', 'chat_type'])
+
+class ChatRoutingIndex:
+    """Индекс маршрутизации уведомлений по областям.
+
+    Строится один раз из включенных TelegramChatId: нормализованная область ->
+    список чатов, плюс список чатов, подписанных на все области. Сбрасывается
+    при добавлении, изменении или удалении chat ID. Уведомления маршрутизирует
+    другой процесс (scheduler.py), поэтому изменение публикуется версией в
+    app_state (строка state_name), а задача 'chat-routing-sync' сбрасывает
+    индекс в процессах, где версия устарела.
+    """
+
+    def __init__(self, state_name='telegram_chats'):
+        self.state_name = state_name
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None  # Версия app_state, с учетом которой построен индекс
+
+    def _read_version(self):
+        return db.session.query(AppState.version).filter_by(name=self.state_name).scalar()
+
+    def invalidate(self):
+        """Сбросить индекс после коммита изменения chat ID и сообщить об изменении остальным процессам"""
+        version = self._version
+        try:
+            updated = AppState.query.filter_by(name=self.state_name).update(
+                {'version': AppState.version + 1, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            if not updated:
+                db.session.add(AppState(name=self.state_name, version=1))
+            db.session.commit()
+            version = self._read_version()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not publish chat routing change: {e}")
+        with self._lock:
+            self._index = None
+            self._version = version
+
+    def sync(self):
+        """Сбросить индекс, если chat ID меняли в другом процессе (задача 'chat-routing-sync')"""
+        version = self._read_version()
+        with self._lock:
+            if version == self._version:
+                return False
+            self._index = None
+            self._version = version
+        return True
+
+    def _build(self):
+        all_chats = []
+        all_regions_chats = []
+        by_region = {}
+        for chat in TelegramChatId.query.filter_by(enabled=True).order_by(TelegramChatId.id).all():
+            route = ChatRoute(chat.id, chat.chat_id, chat.chat_type)
+            all_chats.append(route)
+            allowed_regions = chat.get_allowed_regions()
+            if allowed_regions is None:
+                all_regions_chats.append(route)
+                continue
+            for region in {normalize_region_name(r) for r in allowed_regions if r}:
+                by_region.setdefault(region, []).append(route)
+        logger.debug(f"Chat routing index built: {len(all_chats)} chat(s), {len(by_region)} region(s)")
+        return {
+            'all_chats': all_chats,
+            'all_regions_chats': all_regions_chats,
+            'by_region': by_region,
+            'routes': {}
+        }
+
+    def _get_index(self):
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build()
+                index = self._index
+        return index
+
+    def route(self, region_name):
+        """Чаты, которым нужно отправить уведомление о базаре из указанной области"""
+        index = self._get_index()
+        if not region_name:
+            # Если область не указана, отправляем всем
+            return index['all_chats']
+        region = normalize_region_name(region_name)
+        routes = index['routes'].get(region)
+        if routes is None:
+            # Объединяем чаты "все области" и чаты области без дублей по chat_id
+            unique = {}
+            for route in itertools.chain(index['all_regions_chats'], index['by_region'].get(region, ())):
+                unique.setdefault(str(route.chat_id), route)
+            routes = index['routes'][region] = list(unique.values())
+        return routes
+
+    def stats(self):
+        index = self._index
+        if index is None:
+            return {'built': False}
+        return {
+            'built': True,
+            'version': self._version,
+            'chats': len(index['all_chats']),
+            'all_regions_chats': len(index['all_regions_chats']),
+            'regions': {region: len(routes) for region, routes in index['by_region'].items()}
+        }
+
+chat_routing_index = ChatRoutingIndex()
+
+def _build_notification_text(bazar_name, city, offline_cameras_count, total_cameras, notification_type='offline', next_notification_in=None):
+    """Текст уведомления об одном базаре"""
+    # Экранируем спецсимволы Markdown в названиях
+    bazar_name = _escape_markdown_legacy(bazar_name)
+    city = _escape_markdown_legacy(city) if city else None
+    
+    # Формируем сообщение в зависимости от типа уведомления
+    if notification_type == 'offline':
+        # Уведомление о том, что камеры ушли в офлайн
+        message = f"⚠️ *Камеры отключены*\n\n"
+        message += f"🏪 *Базар:* {bazar_name}\n"
+        if city:
+            message += f"📍 *Город:* {city}\n"
+        message += f"📹 *Неработающих камер:* {offline_cameras_count} из {total_cameras}\n"
+        message += f"🕐 *Время:* {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+        
+        # Добавляем информацию о времени до следующего уведомления
+        if next_notification_in is not None:
+            hours = int(next_notification_in // 3600)
+            minutes = int((next_notification_in % 3600) // 60)
+            if hours > 0:
+                time_str = f"{hours} ч. {minutes} мин."
+            else:
+                time_str = f"{minutes} мин."
+            message += f"\n⏰ *Следующее уведомление через:* {time_str}"
+    else:
+        # Уведомление о том, что все камеры вернулись в онлайн
+        message = f"✅ *Все камеры активны*\n\n"
+        message += f"🏪 *Базар:* {bazar_name}\n"
+        if city:
+            message += f"📍 *Город:* {city}\n"
+        message += f"📹 *Всего камер:* {total_cameras}\n"
+        message += f"🕐 *Время:* {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+        message += "\n⏰ *Повторное уведомление будет только при изменении статуса камер*"
+    
+    return message
+
+# Повторные уведомления с тем же содержимым, что уже доставлено в чат:
+# skip - не отправлять, edit - только обновить время в статусном сообщении, send - отправлять как раньше
+TELEGRAM_REPEAT_MODE = os.environ.get('TELEGRAM_REPEAT_MODE', 'skip').lower()
+
+def notification_fingerprint(item):
+    """Отпечаток содержимого уведомления без времени отправки"""
+    content = (
+        f"{item.bazar_key}|{item.bazar_name}|{item.city}|{item.notification_type}|"
+        f"{item.offline_cameras_count}|{item.total_cameras}|{item.next_notification_in}"
+    )
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def remember_notification_fingerprints(fingerprints):
+    """Сохранить отпечатки доставленных уведомлений: список (chat_row_id, bazar_key, content_hash)"""
+    if not fingerprints:
+        return
+    with app_context():
+        try:
+            latest = {(chat_row_id, bazar_key): content_hash for chat_row_id, bazar_key, content_hash in fingerprints}
+            existing = {
+                (row.chat_row_id, row.bazar_key): row
+                for row in NotificationFingerprint.query.filter(
+                    NotificationFingerprint.chat_row_id.in_({key[0] for key in latest}),
+                    NotificationFingerprint.bazar_key.in_({key[1] for key in latest})
+                )
+            }
+            for (chat_row_id, bazar_key), content_hash in latest.items():
+                row = existing.get((chat_row_id, bazar_key))
+                if row is None:
+                    db.session.add(NotificationFingerprint(chat_row_id=chat_row_id, bazar_key=bazar_key,
+                                                           content_hash=content_hash))
+                elif row.content_hash != content_hash:
+                    row.content_hash = content_hash
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error saving notification fingerprints: {e}", exc_info=True)
+
+def write_notification_outbox(routes, item, batch_id=None):
+    """Добавить в текущую сессию строки outbox с уведомлением item для каждого чата из routes.
+
+    Коммит выполняет вызывающий код - вместе с изменением состояния базара.
+    Одно и то же событие (базар, тип, счетчики камер, минута) для чата
+    записывается один раз. Если чату уже доставлено уведомление с тем же
+    содержимым, оно пропускается или помечается refresh_only (TELEGRAM_REPEAT_MODE).
+    Возвращает число чатов, для которых уведомление записано или уже актуально.
+    """
+    event_key = (
+        f"{item.bazar_key}|{item.notification_type}|{item.offline_cameras_count}|{item.total_cameras}|"
+        f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M')}"
+    )
+    payload = json.dumps(item._asdict(), ensure_ascii=False)
+    rows = []
+    for route in routes:
+        # Пропускаем некорректные chat_id (только числовые ID поддерживаются)
+        if not normalize_chat_id(route.chat_id):
+            item_logger.debug("Skipping notification to invalid chat_id %s - only numeric IDs are supported", route.chat_id)
+            continue
+        rows.append({
+            'idempotency_key': hashlib.sha256(f"{route.row_id}|{event_key}".encode('utf-8')).hexdigest(),
+            'chat_row_id': route.row_id,
+            'bazar_key': item.bazar_key,
+            'payload': payload,
+            'batch_id': batch_id,
+            'status': 'held' if batch_id else 'pending',
+            'refresh_only': False,
+            'attempts': 0
+        })
+    if not rows:
+        return 0
+    
+    total = len(rows)
+    if TELEGRAM_REPEAT_MODE in ('skip', 'edit'):
+        # Чаты, в которые уже доставлено то же самое содержимое - один запрос на уведомление
+        unchanged = {
+            chat_row_id for (chat_row_id,) in db.session.query(NotificationFingerprint.chat_row_id).filter(
+                NotificationFingerprint.bazar_key == item.bazar_key,
+                NotificationFingerprint.content_hash == notification_fingerprint(item),
+                NotificationFingerprint.chat_row_id.in_([row['chat_row_id'] for row in rows])
+            )
+        }
+        if unchanged:
+            if TELEGRAM_REPEAT_MODE == 'skip':
+                rows = [row for row in rows if row['chat_row_id'] not in unchanged]
+                notification_outbox.count_repeats(skipped=total - len(rows))
+                if not rows:
+                    return total
+            else:
+                for row in rows:
+                    row['refresh_only'] = row['chat_row_id'] in unchanged
+    
+    existing = {
+        key for (key,) in db.session.query(NotificationOutbox.idempotency_key).filter(
+            NotificationOutbox.idempotency_key.in_([row['idempotency_key'] for row in rows])
+        )
+    }
+    new_rows = [row for row in rows if row['idempotency_key'] not in existing]
+    if new_rows:
+        # Одна вставка executemany в транзакции сессии вместо INSERT на каждый объект
+        db.session.execute(NotificationOutbox.__table__.insert(), new_rows)
+        db.session.info['outbox_written'] = True
+        notification_outbox.count_repeats(refreshed=len([row for row in new_rows if row['refresh_only']]))
+    return total
+
+def send_telegram_notification(bazar_name, city, offline_cameras_count, total_cameras, notification_type='offline', service=None, next_notification_in=None):
+    """Отправить уведомление в Telegram о изменении статуса камер (во все настроенные chat ID с учетом фильтрации по областям)
+
+    Уведомление записывается в outbox в текущей сессии и уходит после коммита
+    вызывающего кода. Внутри notification_digest() оно ждет конца цикла
+    проверки и попадает в сводку. Возвращает True, если уведомление записано.
+    """
+    try:
+        # Получаем область базара для фильтрации
+        bazar_region = None
+        if service and service.city:
+            # Определяем область по городу
+            bazar_region = service.city
+        
+        chat_ids = chat_routing_index.route(bazar_region)
+        
+        if not chat_ids:
+            item_logger.warning("No Telegram chat IDs configured or no matching regions for bazar '%s' in region '%s'",
+                                bazar_name, bazar_region, extra={'bazar': bazar_name, 'region': bazar_region})
+            return False
+        
+        bazar_key = str(service.id) if service else bazar_name
+        item = DigestItem(bazar_key, bazar_region, bazar_name, city, offline_cameras_count, total_cameras,
+                          notification_type, next_notification_in)
+        written_count = write_notification_outbox(chat_ids, item, getattr(_digest_context, 'batch_id', None))
+        item_logger.info("Queued notification for bazar '%s' to %s chat(s)", bazar_name, written_count,
+                         extra={'bazar': bazar_name, 'chats': written_count})
+        return written_count > 0
+        
+    except Exception as e:
+        logger.error(f"Error sending Telegram notification: {e}", exc_info=True)
+        return False
+
+# Сводки уведомлений за цикл проверки
+TELEGRAM_DIGEST_ENABLED = os.environ.get('TELEGRAM_DIGEST_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Лимит Telegram - 4096 символов, оставляем запас под заголовок части
+TELEGRAM_MESSAGE_LIMIT = 4000
+
+_digest_context = threading.local()
+
+DigestItem = namedtuple('DigestItem', [
+    'bazar_key', 'region', 'bazar_name', 'city', 'offline_cameras_count', 'total_cameras',
+    'notification_type', 'next_notification_in'
+])
+
+def _escape_markdown_legacy(text):
+    """Экранирует спецсимволы Telegram Markdown (legacy parse_mode)"""
+    if not text:
+        return text
+    escaped = str(text)
+    for char in ('_', '*', '`', '['):
+        escaped = escaped.replace(char, '\\' + char)
+    return escaped
+
+def split_telegram_message(header, blocks, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Разбить сводку на сообщения не длиннее limit.
+
+    blocks - список блоков (например, по областям); блок переносится в
+    следующее сообщение целиком, слишком длинный блок режется по строкам.
+    """
+    parts = []
+    current = header
+    for block in blocks:
+        candidate = f"{current}\n\n{block}"
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current != header:
+            parts.append(current)
+            current = header
+        for line in block.split('\n'):
+            candidate = f"{current}\n{line}" if current != header else f"{current}\n\n{line}"
+            if len(candidate) > limit and current != header:
+                parts.append(current)
+                candidate = f"{header}\n\n{line}"
+            current = candidate[:limit]
+    parts.append(current)
+    if len(parts) > 1:
+        parts = [f"{part}\n\n📄 _Часть {i} из {len(parts)}_" for i, part in enumerate(parts, start=1)]
+    return parts
+
+def _region_blocks(items):
+    """Блоки сводки по областям: по строке на базар"""
+    by_region = OrderedDict()
+    for item in sorted(items, key=lambda i: (i.city or '', i.bazar_name or '')):
+        by_region.setdefault(item.city or 'Без области', []).append(item)
+    blocks = []
+    for region, region_items in by_region.items():
+        lines = [f"📍 *{_escape_markdown_legacy(region)}*"]
+        for item in region_items:
+            name = _escape_markdown_legacy(item.bazar_name)
+            if item.notification_type == 'offline':
+                lines.append(f"⚠️ {name} - не работает {item.offline_cameras_count} из {item.total_cameras}")
+            elif item.notification_type == 'online':
+                lines.append(f"✅ {name} - все {item.total_cameras} камер активны")
+            else:
+                lines.append(f"❔ {name} - нет данных о камерах")
+        blocks.append('\n'.join(lines))
+    return blocks
+
+def format_notification_digest(items):
+    """Текст уведомления для чата: один базар - обычное уведомление, несколько - сводка по областям (части)"""
+    if len(items) == 1:
+        item = items[0]
+        return [_build_notification_text(item.bazar_name, item.city, item.offline_cameras_count,
+                                          item.total_cameras, item.notification_type,
+                                          item.next_notification_in)]
+    
+    offline_count = len([i for i in items if i.notification_type == 'offline'])
+    header = (
+        f"📋 *Сводка по камерам*\n"
+        f"⚠️ С неработающими камерами: {offline_count}   ✅ Восстановлено: {len(items) - offline_count}\n"
+        f"🕐 *Время:* {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+    )
+    return split_telegram_message(header, _region_blocks(items))
+
+@contextmanager
+def notification_digest():
+    """Собирать уведомления цикла проверки и разослать их при выходе одной сводкой на чат
+
+    Уведомления цикла пишутся в outbox со статусом held и общим batch_id;
+    при выходе пачка переводится в pending и будит воркер доставки.
+    """
+    if not TELEGRAM_DIGEST_ENABLED or getattr(_digest_context, 'batch_id', None) is not None:
+        yield None
+        return
+    batch_id = uuid.uuid4().hex
+    _digest_context.batch_id = batch_id
+    try:
+        yield batch_id
+    finally:
+        _digest_context.batch_id = None
+        try:
+            notification_outbox.release_batch(batch_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error releasing notification digest: {e}", exc_info=True)
+
+def _stored_status_message_id(chat_row_id, scope, scope_key):
+    """Функция для очереди доставки: ID статусного сообщения на момент отправки"""
+    def load():
+        with app_context():
+            status_message = TelegramStatusMessage.query.filter_by(
+                chat_row_id=chat_row_id, scope=scope, scope_key=scope_key
+            ).first()
+            return status_message.message_id if status_message else None
+    return load
+
+def _remember_status_message_id(chat_row_id, scope, scope_key):
+    """Функция для очереди доставки: сохранить ID отправленного статусного сообщения"""
+    def save(message_id):
+        if not message_id:
+            return
+        with app_context():
+            try:
+                status_message = TelegramStatusMessage.query.filter_by(
+                    chat_row_id=chat_row_id, scope=scope, scope_key=scope_key
+                ).first()
+                if status_message is None:
+                    status_message = TelegramStatusMessage(chat_row_id=chat_row_id, scope=scope, scope_key=scope_key)
+                    db.session.add(status_message)
+                elif status_message.message_id == message_id:
+                    return
+                status_message.message_id = message_id
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Error saving status message_id for chat row {chat_row_id}: {e}")
+    return save
+
+class NotificationOutboxDispatcher:
+    """Доставка уведомлений из outbox.
+
+    Фоновый поток забирает готовые строки пачками (до batch_size чатов со
+    всеми их строками), группирует их по чатам и ставит в telegram_delivery: один базар - обычное
+    уведомление, несколько - сводка. Из нескольких строк об одном базаре
+    для чата отправляется только последняя. Строка помечается sent после
+    доставки; при ошибке повторяется с экспоненциальной задержкой, после
+    max_attempts попыток - failed. Строки, зависшие в held (цикл проверки
+    прервался) или sending (процесс перезапущен), по таймауту возвращаются в pending.
+    outbox разбирает только владелец аренды планировщика: лимиты
+    telegram_delivery действуют на процесс, и несколько разбирающих процессов
+    умножили бы их и перемешали порядок сообщений в чате.
+    """
+
+    def __init__(self, batch_size=200, poll_interval=5, max_attempts=10, backoff_base=30,
+                 stale_timeout=600, retention_days=7):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.stale_timeout = stale_timeout
+        self.retention_days = retention_days
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.stats = {
+            'claimed': 0,
+            'messages': 0,
+            'sent': 0,
+            'superseded': 0,
+            'repeats_skipped': 0,
+            'repeats_refreshed': 0,
+            'retried': 0,
+            'failed': 0
+        }
+
+    def _ensure_started(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread:
+                return
+            thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+            thread.start()
+            self._thread = thread
+            logger.info("Notification outbox dispatcher started")
+
+    def wake(self):
+        """Разбудить воркер (после коммита новых строк). Вне владельца аренды ничего не делает"""
+        if not scheduler_leader.is_leader():
+            return
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                if scheduler_leader.is_leader():
+                    with app_context():
+                        self.drain()
+            except Exception as e:
+                logger.error(f"Error draining notification outbox: {e}", exc_info=True)
+
+    def release_batch(self, batch_id):
+        """Отпустить уведомления цикла проверки в доставку"""
+        released = NotificationOutbox.query.filter_by(batch_id=batch_id, status='held').update(
+            {'status': 'pending', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if released:
+            self.wake()
+        return released
+
+    def maintain(self):
+        """Вернуть в доставку зависшие строки и удалить старые отправленные (задача 'outbox-maintenance')
+
+        held остается от цикла проверки, который прервался до конца сводки,
+        sending - от процесса, перезапущенного во время доставки. Задача
+        выполняется только во владельце аренды, поэтому здесь же запускается
+        поток доставки процесса, который перехватил аренду у упавшего владельца.
+        """
+        self._ensure_started()
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_timeout)
+        recovered = NotificationOutbox.query.filter(
+            NotificationOutbox.status.in_(('held', 'sending')),
+            NotificationOutbox.updated_at < cutoff
+        ).update({'status': 'pending', 'updated_at': now}, synchronize_session=False)
+        # Отправленные строки храним retention_days дней, чистим не чаще раза в час
+        if self.retention_days and time.monotonic() - self._last_cleanup > 3600:
+            self._last_cleanup = time.monotonic()
+            NotificationOutbox.query.filter(
+                NotificationOutbox.status == 'sent',
+                NotificationOutbox.sent_at < now - timedelta(days=self.retention_days)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        if recovered:
+            logger.warning(f"Recovered {recovered} stale notification outbox row(s)")
+            self.wake()
+        return recovered
+
+    def drain(self):
+        """Забрать готовые строки и поставить их в доставку. Возвращает число строк"""
+        now = datetime.utcnow()
+        total = 0
+        while scheduler_leader.is_leader():
+            # Пачка - до batch_size чатов со всеми их готовыми строками, чтобы сводка чата не дробилась
+            ready = db.and_(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now)
+            chat_row_ids = [chat_row_id for (chat_row_id,) in db.session.query(NotificationOutbox.chat_row_id).filter(
+                ready
+            ).group_by(NotificationOutbox.chat_row_id).order_by(db.func.min(NotificationOutbox.id)).limit(self.batch_size)]
+            if not chat_row_ids:
+                break
+            # Захватываем строки; строки, уже взятые другим процессом, не попадут в claim
+            claim = uuid.uuid4().hex
+            NotificationOutbox.query.filter(
+                NotificationOutbox.chat_row_id.in_(chat_row_ids),
+                ready
+            ).update({'status': 'sending', 'claimed_by': claim, 'updated_at': now}, synchronize_session=False)
+            db.session.commit()
+            rows = NotificationOutbox.query.filter_by(claimed_by=claim, status='sending').order_by(NotificationOutbox.id).all()
+            with self._lock:
+                self.stats['claimed'] += len(rows)
+            self._dispatch(rows)
+            total += len(rows)
+            if len(chat_row_ids) < self.batch_size:
+                break
+        return total
+
+    def _dispatch(self, rows):
+        bot_tokens = get_bot_tokens()
+        if not bot_tokens:
+            self._retry([row.id for row in rows], 'Telegram bot token not configured')
+            return
+        
+        chats = {
+            chat.id: chat
+            for chat in TelegramChatId.query.filter(TelegramChatId.id.in_({row.chat_row_id for row in rows}))
+        }
+        latest_by_chat = OrderedDict()
+        superseded_ids = []
+        for row in rows:
+            latest = latest_by_chat.setdefault(row.chat_row_id, OrderedDict())
+            if row.bazar_key in latest:
+                superseded_ids.append(latest[row.bazar_key].id)
+            latest[row.bazar_key] = row
+        if superseded_ids:
+            self._mark_sent(superseded_ids)
+            with self._lock:
+                self.stats['superseded'] += len(superseded_ids)
+        
+        for chat_row_id, latest in latest_by_chat.items():
+            chat_rows = list(latest.values())
+            chat = chats.get(chat_row_id)
+            if chat is None or not chat.enabled:
+                self._fail([row.id for row in chat_rows], 'Chat ID удален или выключен')
+                continue
+            bot_token = shard_bot_token(chat.chat_id, bot_tokens)
+            # Неизменившиеся напоминания только обновляют время в статусном сообщении базара и не попадают в сводку
+            refresh_rows = [row for row in chat_rows if row.refresh_only]
+            chat_rows = [row for row in chat_rows if not row.refresh_only]
+            for row in refresh_rows:
+                item = DigestItem(**json.loads(row.payload))
+                self._enqueue(bot_token, chat, [(row, item)], format_notification_digest([item]), 'bazar', item.bazar_key)
+            if not chat_rows:
+                continue
+            delivered = [(row, DigestItem(**json.loads(row.payload))) for row in chat_rows]
+            if len(delivered) == 1 or not TELEGRAM_DIGEST_ENABLED:
+                for row, item in delivered:
+                    self._enqueue(bot_token, chat, [(row, item)], format_notification_digest([item]), 'bazar', item.bazar_key)
+            else:
+                # Сводка - новое сообщение: её состав меняется от цикла к циклу, правка затерла бы
+                # прошлые алерты в истории чата и пришла бы без звука
+                self._enqueue(bot_token, chat, delivered, format_notification_digest([item for _, item in delivered]),
+                              None, None)
+
+    def _enqueue(self, bot_token, chat, delivered, messages, scope, scope_key):
+        """Поставить части сообщения в очередь доставки.
+
+        delivered - пары (строка outbox, DigestItem); после последней части
+        строки помечаются sent, а отпечатки их содержимого сохраняются.
+        scope/scope_key - статусное сообщение, которое редактируется на месте;
+        scope=None - всегда отправлять новые сообщения.
+        """
+        row_ids = [row.id for row, _ in delivered]
+        fingerprints = [(chat.id, item.bazar_key, notification_fingerprint(item)) for _, item in delivered]
+        tracker = {'remaining': len(messages), 'failed': False}
+        
+        def on_part_sent(remember):
+            def on_sent(message_id):
+                remember(message_id)
+                with self._lock:
+                    tracker['remaining'] -= 1
+                    done = tracker['remaining'] == 0 and not tracker['failed']
+                if done:
+                    self._mark_sent(row_ids)
+                    remember_notification_fingerprints(fingerprints)
+            return on_sent
+        
+        def on_failed(error):
+            with self._lock:
+                already_failed, tracker['failed'] = tracker['failed'], True
+            if not already_failed:
+                self._retry(row_ids, error)
+        
+        for message in messages:
+            if scope is None:
+                edit_message_id, remember = None, lambda message_id: None
+            else:
+                edit_message_id = _stored_status_message_id(chat.id, scope, scope_key)
+                remember = _remember_status_message_id(chat.id, scope, scope_key)
+            accepted = telegram_delivery.enqueue(
+                bot_token,
+                chat.chat_id,
+                message,
+                edit_message_id=edit_message_id,
+                on_sent=on_part_sent(remember),
+                on_failed=on_failed
+            )
+            if not accepted:
+                on_failed('Telegram delivery queue is full')
+                return
+            with self._lock:
+                self.stats['messages'] += 1
+
+    def _update_rows(self, row_ids, values):
+        with app_context():
+            try:
+                NotificationOutbox.query.filter(NotificationOutbox.id.in_(row_ids)).update(values, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error updating notification outbox rows {row_ids}: {e}", exc_info=True)
+
+    def _mark_sent(self, row_ids):
+        now = datetime.utcnow()
+        self._update_rows(row_ids, {'status': 'sent', 'sent_at': now, 'updated_at': now, 'last_error': None})
+        with self._lock:
+            self.stats['sent'] += len(row_ids)
+
+    def _fail(self, row_ids, error):
+        self._update_rows(row_ids, {'status': 'failed', 'last_error': error, 'updated_at': datetime.utcnow()})
+        with self._lock:
+            self.stats['failed'] += len(row_ids)
+
+    def _retry(self, row_ids, error):
+        """Вернуть строки в pending с задержкой или пометить failed после max_attempts попыток"""
+        now = datetime.utcnow()
+        with app_context():
+            try:
+                for row in NotificationOutbox.query.filter(NotificationOutbox.id.in_(row_ids)):
+                    row.attempts = (row.attempts or 0) + 1
+                    row.last_error = error
+                    if row.attempts >= self.max_attempts:
+                        row.status = 'failed'
+                        with self._lock:
+                            self.stats['failed'] += 1
+                    else:
+                        row.status = 'pending'
+                        row.next_attempt_at = now + timedelta(seconds=min(self.backoff_base * 2 ** (row.attempts - 1), 3600))
+                        with self._lock:
+                            self.stats['retried'] += 1
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error scheduling retry for notification outbox rows {row_ids}: {e}", exc_info=True)
+        logger.warning(f"Notification delivery failed for {len(row_ids)} outbox row(s), will retry: {error}")
+
+    def count_repeats(self, skipped=0, refreshed=0):
+        """Учесть повторные уведомления, отфильтрованные по отпечатку содержимого"""
+        with self._lock:
+            self.stats['repeats_skipped'] += skipped
+            self.stats['repeats_refreshed'] += refreshed
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['repeat_mode'] = TELEGRAM_REPEAT_MODE
+        stats['rows'] = {
+            status: count for status, count in
+            db.session.query(NotificationOutbox.status, db.func.count(NotificationOutbox.id)).group_by(NotificationOutbox.status)
+        }
+        return stats
+
+notification_outbox = NotificationOutboxDispatcher(
+    batch_size=int(os.environ.get('TELEGRAM_OUTBOX_BATCH_SIZE', 200)),
+    poll_interval=float(os.environ.get('TELEGRAM_OUTBOX_POLL_INTERVAL', 5)),
+    max_attempts=int(os.environ.get('TELEGRAM_OUTBOX_MAX_ATTEMPTS', 10)),
+    retention_days=int(os.environ.get('TELEGRAM_OUTBOX_RETENTION_DAYS', 7))
+)
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_outbox_on_commit(session):
+    if session.info.pop('outbox_written', False):
+        notification_outbox.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def _reset_outbox_on_rollback(session):
+    session.info.pop('outbox_written', None)
+
+# Параллельные опросы базаров при отправке текущего состояния в chat ID
+TELEGRAM_STATUS_PROBE_WORKERS = int(os.environ.get('TELEGRAM_STATUS_PROBE_WORKERS', 16))
+
+def _collect_current_status(service):
+    """Статистика камер базара: из снимка планировщика, если он свежий, иначе живой опрос.
+
+    Вызывается из пула потоков, поэтому работает только с уже загруженными полями service.
+    """
+    snapshot = get_camera_snapshot(service.id)
+    if _snapshot_is_fresh(snapshot):
+        return snapshot['stats']
+    endpoint = {
+        'ip': service.bazar_ip,
+        'port': service.bazar_port,
+        'backendPort': service.backend_port,
+        'pgPort': service.pg_port
+    }
+    result = fetch_bazar_info(endpoint)
+    camera_stats = result['data'] if result['success'] and isinstance(result['data'], dict) else None
+    if not result['success']:
+        logger.warning(f"Failed to fetch camera stats for {service.bazar_name}: {result.get('error', 'Unknown error')}")
+    update_camera_snapshot(service.id, camera_stats)
+    return camera_stats
+
+def send_current_status_to_chat_id(chat_id_obj, job=None):
+    """Отправить текущее состояние всех базаров с включенными уведомлениями в указанный chat ID
+
+    Статистика собирается параллельно (или берется из снимка), в чат уходит одна
+    сводка, при необходимости разбитая на части. job - словарь задачи
+    StatusPushJobs: в него записывается прогресс, а отправленные части
+    засчитываются в строку задачи job['id'].
+    """
+    job = job if job is not None else {}
+    logger.info(f"Sending current status to new chat ID: {chat_id_obj.chat_id} (type: {chat_id_obj.chat_type})")
+    
+    # Проверяем, что это числовой ID
+    if not normalize_chat_id(chat_id_obj.chat_id):
+        logger.warning(f"Skipping send_current_status for invalid chat_id {chat_id_obj.chat_id} - only numeric IDs are supported")
+        return 0
+    
+    bot_token = shard_bot_token(chat_id_obj.chat_id, get_bot_tokens())
+    if not bot_token:
+        raise RuntimeError("Telegram bot token not configured")
+    
+    # Получаем все сервисы с включенными уведомлениями и фильтруем по областям чата
+    services = BazarStatus.query.filter_by(telegram_notifications_enabled=True).all()
+    allowed_regions = chat_id_obj.get_allowed_regions()
+    if allowed_regions is not None:
+        allowed_regions_normalized = {normalize_region_name(r) for r in allowed_regions if r}
+        # Базары без области отправляем всем
+        services = [s for s in services if not s.city or normalize_region_name(s.city) in allowed_regions_normalized]
+    job['bazars'] = len(services)
+    
+    if not services:
+        logger.info("No services with enabled notifications found")
+        return 0
+    
+    with ThreadPoolExecutor(max_workers=min(TELEGRAM_STATUS_PROBE_WORKERS, len(services))) as executor:
+        all_stats = list(executor.map(_collect_current_status, services))
+    
+    items = []
+    for service, camera_stats in zip(services, all_stats):
+        if camera_stats is None:
+            notification_type, offline_cameras, total_cameras = 'unknown', 0, 0
+        else:
+            offline_cameras = camera_stats.get('offlineCameras', 0)
+            total_cameras = camera_stats.get('totalCameras', 0)
+            if total_cameras <= 0:
+                item_logger.debug("Skipping %s - no cameras found", service.bazar_name)
+                continue
+            notification_type = 'offline' if offline_cameras > 0 else 'online'
+        items.append(DigestItem(str(service.id), service.city, service.bazar_name, service.city,
+                                offline_cameras, total_cameras, notification_type, None))
+    
+    if not items:
+        return 0
+    
+    counts = {t: len([i for i in items if i.notification_type == t]) for t in ('offline', 'online', 'unknown')}
+    header = (
+        f"📋 *Текущее состояние базаров*\n"
+        f"⚠️ С неработающими камерами: {counts['offline']}   ✅ Все камеры работают: {counts['online']}"
+        + (f"   ❔ Нет данных: {counts['unknown']}" if counts['unknown'] else '') + "\n"
+        f"🕐 *Время:* {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+    )
+    messages = split_telegram_message(header, _region_blocks(items))
+    job['messages'] = len(messages)
+    
+    # Колбэки выполняются в потоке доставки, когда сессия задачи уже закрыта,
+    # поэтому атрибуты chat_id_obj читаем заранее
+    chat_row_id = chat_id_obj.id
+    chat_id = chat_id_obj.chat_id
+    last_message_id = chat_id_obj.last_message_id
+    
+    def on_sent(message_id, first=False):
+        status_push_jobs.count_sent(job.get('id'))
+        if first and message_id:
+            # Хранится только ID первой части: следующая отправка удалит её, а части 2..N
+            # длинной сводки останутся в чате
+            with app_context():
+                try:
+                    TelegramChatId.query.filter_by(id=chat_row_id).update({'last_message_id': message_id})
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"Error saving message_id for chat_id {chat_id}: {e}")
+    
+    for index, message in enumerate(messages):
+        first = index == 0
+        telegram_delivery.enqueue(
+            bot_token,
+            chat_id,
+            message,
+            # Удаляем предыдущее сообщение перед отправкой первой части
+            delete_message_id=last_message_id if first else None,
+            on_sent=lambda message_id, first=first: on_sent(message_id, first)
+        )
+    
+    logger.info(f"Queued current status for chat {chat_id}: {len(items)} bazar(s) in {len(messages)} message(s)")
+    return len(messages)
+
+class StatusPushJobs:
+    """Фоновые задачи отправки текущего состояния в новый или снова включенный chat ID.
+
+    Запрос администратора только ставит задачу и сразу возвращает её ID.
+    Задача выполняется в процессе, который её принял, а состояние и прогресс
+    хранятся в таблице telegram_status_job, поэтому опрос ответит любой
+    воркер. Задачи старше retention_days дней удаляются при постановке новых.
+    """
+
+    def __init__(self, workers=2, retention_days=7):
+        self.retention_days = retention_days
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='status-push')
+
+    def submit(self, chat_row_id):
+        """Поставить отправку состояния в очередь. Возвращает ID задачи"""
+        job = TelegramStatusJob(id=uuid.uuid4().hex, chat_row_id=chat_row_id, status='queued')
+        db.session.add(job)
+        if self.retention_days:
+            TelegramStatusJob.query.filter(
+                TelegramStatusJob.created_at < datetime.utcnow() - timedelta(days=self.retention_days)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        self._executor.submit(self._run, job.id, chat_row_id)
+        return job.id
+
+    def _update(self, job_id, values):
+        try:
+            TelegramStatusJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Error updating status job {job_id}: {e}")
+
+    def _run(self, job_id, chat_row_id):
+        with app_context():
+            self._update(job_id, {'status': 'running', 'started_at': datetime.utcnow()})
+            progress = {'id': job_id}
+            try:
+                chat = TelegramChatId.query.get(chat_row_id)
+                if chat is None:
+                    raise LookupError('Chat ID удален')
+                send_current_status_to_chat_id(chat, progress)
+                values = {'status': 'done'}
+            except Exception as e:
+                db.session.rollback()
+                values = {'status': 'failed', 'error': str(e)}
+                logger.error(f"Error sending current status to chat row {chat_row_id}: {e}", exc_info=True)
+            values.update(bazars=progress.get('bazars', 0), messages=progress.get('messages', 0),
+                          finished_at=datetime.utcnow())
+            self._update(job_id, values)
+            db.session.remove()
+
+    def count_sent(self, job_id):
+        """Засчитать отправленную часть (вызывается из воркера доставки)"""
+        if not job_id:
+            return
+        with app_context():
+            self._update(job_id, {'sent': TelegramStatusJob.sent + 1})
+
+    def get(self, job_id):
+        job = db.session.get(TelegramStatusJob, job_id)
+        return job.to_dict() if job else None
+
+status_push_jobs = StatusPushJobs(workers=int(os.environ.get('TELEGRAM_STATUS_PUSH_WORKERS', 2)))
+
+def check_and_notify_camera_changes(service, camera_stats):
+    """Проверить изменения статуса камер (онлайн/офлайн) и отправить уведомление при переходе"""
+    try:
+        # Проверяем, включены ли уведомления для этого базара
+        if not service.telegram_notifications_enabled:
+            return
+        
+        # Переходы отслеживает и уведомления пишет только владелец планировщика,
+        # иначе каждый воркер отправил бы свою копию уведомления
+        if not scheduler_leader.is_leader():
+            return
+        
+        # Получаем текущее состояние камер
+        offline_cameras = camera_stats.get('offlineCameras', 0)
+        total_cameras = camera_stats.get('totalCameras', 0)
+        online_cameras = camera_stats.get('onlineCameras', 0)
+        
+        # Определяем текущий статус: все камеры онлайн или есть офлайн
+        all_cameras_online = (offline_cameras == 0 and total_cameras > 0)
+        has_offline_cameras = (offline_cameras > 0)
+        
+        # Определяем предыдущий статус (используем last_offline_cameras_count как флаг)
+        # Если last_offline_cameras_count == 0, значит все камеры были онлайн
+        # Если last_offline_cameras_count > 0, значит были офлайн камеры
+        previous_all_online = (service.last_offline_cameras_count == 0)
+        previous_has_offline = (service.last_offline_cameras_count > 0)
+        
+        # Проверяем переходы статуса
+        should_notify = False
+        notification_type = None
+        
+        # Переход: все онлайн → появились офлайн камеры
+        if previous_all_online and has_offline_cameras:
+            should_notify = True
+            notification_type = 'offline'
+        
+        # Переход: были офлайн камеры → все камеры онлайн
+        elif previous_has_offline and all_cameras_online:
+            should_notify = True
+            notification_type = 'online'
+        
+        if should_notify:
+            # Отправляем уведомление
+            # Вычисляем время до следующего уведомления (только для офлайн уведомлений)
+            next_notification_in = None
+            if notification_type == 'offline':
+                check_interval = service.notification_check_interval or 3600
+                next_notification_in = check_interval
+            
+            success = send_telegram_notification(
+                service.bazar_name,
+                service.city,
+                offline_cameras,
+                total_cameras,
+                notification_type,
+                service=service,
+                next_notification_in=next_notification_in
+            )
+            
+            if success:
+                # Обновляем счетчик (0 если все онлайн, >0 если есть офлайн)
+                service.last_offline_cameras_count = offline_cameras
+                service.last_notification_time = datetime.utcnow()
+                db.session.commit()
+        else:
+            # Если камеры постоянно офлайн, отправляем периодические напоминания
+            # Используем настраиваемый интервал проверки для каждого базара
+            check_interval = service.notification_check_interval or 3600  # По умолчанию 1 час
+            if has_offline_cameras and service.last_notification_time:
+                time_diff = (datetime.utcnow() - service.last_notification_time).total_seconds()
+                # Отправляем напоминание если прошло больше заданного интервала
+                if time_diff >= check_interval:
+                    # Вычисляем время до следующего уведомления
+                    next_notification_in = check_interval
+                    
+                    success = send_telegram_notification(
+                        service.bazar_name,
+                        service.city,
+                        offline_cameras,
+                        total_cameras,
+                        'offline',
+                        service=service,
+                        next_notification_in=next_notification_in
+                    )
+                    if success:
+                        service.last_notification_time = datetime.utcnow()
+                        db.session.commit()
+            
+            # Обновляем счетчик без отправки уведомления
+            service.last_offline_cameras_count = offline_cameras
+            db.session.commit()
+                        
+    except Exception as e:
+        item_logger.error("Error checking camera changes: %s", e, exc_info=True)
+
+def _edit_or_send(bot_token, chat_id, message_id, message, reply_markup=None):
+    """Отредактировать сообщение с кнопками, при неудаче отправить новое"""
+    if message_id and edit_telegram_message(bot_token, chat_id, message_id, message, reply_markup).success:
+        return
+    send_telegram_message(bot_token, chat_id, message, reply_markup)
+
+def process_telegram_update(update):
+    """Обработать одно обновление от Telegram (выполняется в воркере webhook)"""
+    message = update.get('message')
+    callback_query = update.get('callback_query')
+    
+    # Получаем токен бота
+    bot_token = get_bot_token()
+    if not bot_token:
+        logger.warning(f"Skipping Telegram update {update.get('update_id')}: bot token not configured")
+        return
+    
+    # Обработка callback_query (нажатие на кнопку)
+    if callback_query:
+        chat_id = callback_query['message']['chat']['id']
+        data_text = callback_query['data']
+        
+        # Обработка команд
+        if data_text == 'list_bazars' or data_text == 'refresh_bazars':
+            message_text, keyboard = get_bazars_list_message()
+            send_telegram_message(bot_token, chat_id, message_text, keyboard)[0]  # Используем только success (message_id не нужен для интерактивных сообщений)
+            # Отвечаем на callback
+            answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        elif data_text.startswith('bazars:'):
+            # Переход по страницам списка (bazars:<область>:<страница>) - редактируем текущее сообщение
+            _, region_key, page = data_text.split(':', 2)
+            message_text, keyboard = get_bazars_list_message(int(page), region_key)
+            _edit_or_send(bot_token, chat_id, callback_query['message'].get('message_id'), message_text, keyboard)
+            answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        elif data_text.startswith('regions:'):
+            message_text, keyboard = get_regions_list_message(int(data_text.split(':', 1)[1]))
+            _edit_or_send(bot_token, chat_id, callback_query['message'].get('message_id'), message_text, keyboard)
+            answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        elif data_text == 'noop':
+            # Кнопка с номером страницы
+            answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        elif data_text.startswith('bazar_'):
+            service_id = int(data_text.split('_')[1])
+            card = get_bazar_card(service_id)
+            if card:
+                # Карточка из кэша, базар опрашивается только при устаревших данных
+                message_text, keyboard = card
+                # Редактируем сообщение вместо отправки нового
+                _edit_or_send(bot_token, chat_id, callback_query['message'].get('message_id'), message_text, keyboard)
+                # Отвечаем на callback
+                answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        elif data_text == 'overall_status':
+            # Общая статистика
+            services = BazarStatus.query.all()
+            online_count = len([s for s in services if s.status == 'online'])
+            offline_count = len([s for s in services if s.status == 'offline'])
+            
+            status_message = (
+                "📊 *Общая статистика*\n"
+                "━━━━━━━━━━━━━━━━━━━━\n\n"
+                f"🏪 Всего базаров: {len(services)}\n"
+                f"🟢 Онлайн: {online_count}\n"
+                f"🔴 Офлайн: {offline_count}\n\n"
+                "Используйте кнопку ниже для просмотра детальной информации"
+            )
+            keyboard = {
+                'inline_keyboard': [
+                    [{'text': '🏪 Список базаров', 'callback_data': 'list_bazars'}]
+                ]
+            }
+            _edit_or_send(bot_token, chat_id, callback_query['message'].get('message_id'), status_message, keyboard)
+            answer_telegram_callback_query(bot_token, callback_query['id'])
+        
+        return
+    
+    # Обработка обычных сообщений
+    if message:
+        chat_id = message['chat']['id']
+        text = message.get('text', '')
+        
+        # Обработка команд
+        if text.startswith('/start'):
+            # Получаем информацию о пользователе
+            chat = message.get('chat', {})
+            user_chat_id = str(chat.get('id'))
+            username = chat.get('username')
+            first_name = chat.get('first_name', '')
+            last_name = chat.get('last_name', '')
+            full_name = f"{first_name} {last_name}".strip()
+            
+            # Ищем запись только по числовому ID
+            chat_record = TelegramChatId.query.filter_by(chat_id=user_chat_id).first()
+            
+            # Если записи нет, логируем (не создаем автоматически)
+            if not chat_record:
+                logger.info(f"User {username} ({user_chat_id}) started bot but not in database. Add this chat_id manually: {user_chat_id}")
+            
+            welcome_message = (
+                "👋 *Добро пожаловать в систему мониторинга базаров!*\n\n"
+                "Доступные команды:\n"
+                "/bazars - Список всех базаров\n"
+                "/status - Общая статистика\n"
+                "/help - Справка\n\n"
+                "Используйте кнопки ниже для быстрого доступа:"
+            )
+            keyboard = {
+                'inline_keyboard': [
+                    [{'text': '🏪 Список базаров', 'callback_data': 'list_bazars'}],
+                    [{'text': '📊 Общая статистика', 'callback_data': 'overall_status'}]
+                ]
+            }
+            send_telegram_message(bot_token, chat_id, welcome_message, keyboard)[0]  # Используем только success
+        
+        elif text.startswith('/bazars') or text.startswith('/list'):
+            message_text, keyboard = get_bazars_list_message()
+            send_telegram_message(bot_token, chat_id, message_text, keyboard)[0]  # Используем только success (message_id не нужен для интерактивных сообщений)
+        
+        elif text.startswith('/status') or text.startswith('/stats'):
+            # Общая статистика
+            services = BazarStatus.query.all()
+            online_count = len([s for s in services if s.status == 'online'])
+            offline_count = len([s for s in services if s.status == 'offline'])
+            
+            status_message = (
+                "📊 *Общая статистика*\n"
+                "━━━━━━━━━━━━━━━━━━━━\n\n"
+                f"🏪 Всего базаров: {len(services)}\n"
+                f"🟢 Онлайн: {online_count}\n"
+                f"🔴 Офлайн: {offline_count}\n\n"
+                "Используйте /bazars для просмотра детальной информации"
+            )
+            keyboard = {
+                'inline_keyboard': [
+                    [{'text': '🏪 Список базаров', 'callback_data': 'list_bazars'}]
+                ]
+            }
+            send_telegram_message(bot_token, chat_id, status_message, keyboard)[0]  # Используем только success
+        
+        elif text.startswith('/help'):
+            help_message = (
+                "ℹ️ *Справка*\n\n"
+                "*Доступные команды:*\n"
+                "/start - Начать работу с ботом\n"
+                "/bazars - Список всех базаров\n"
+                "/status - Общая статистика\n"
+                "/help - Показать эту справку\n\n"
+                "Вы также можете использовать кнопки для навигации."
+            )
+            send_telegram_message(bot_token, chat_id, help_message)[0]  # Используем только success
+        
+        else:
+            # Неизвестная команда
+            help_message = (
+                "❓ Неизвестная команда.\n\n"
+                "Используйте /help для просмотра доступных команд."
+            )
+            keyboard = {
+                'inline_keyboard': [
+                    [{'text': '🏪 Список базаров', 'callback_data': 'list_bazars'}],
+                    [{'text': '📊 Статистика', 'callback_data': 'overall_status'}]
+                ]
+            }
+            send_telegram_message(bot_token, chat_id, help_message, keyboard)[0]  # Используем только success
+
+class TelegramUpdateDispatcher:
+    """Асинхронная обработка обновлений webhook Telegram.
+
+    Webhook только проверяет обновление, записывает его в таблицу
+    telegram_update и сразу отвечает, поэтому Telegram не повторяет доставку
+    из-за долгой обработки. update_id - первичный ключ, так что повторная
+    доставка того же обновления в любой воркер gunicorn не вставится второй
+    раз. Обрабатывает строки только владелец аренды планировщика: фоновый
+    поток забирает их по порядку update_id и распределяет по воркерам по
+    chat_id, поэтому порядок внутри чата сохраняется во всех процессах.
+    Строки, зависшие в processing (владелец перезапущен), по таймауту
+    возвращаются в pending, обработанные хранятся retention_hours часов.
+    """
+
+    def __init__(self, handler, workers=4, max_queue_size=1000, batch_size=100, poll_interval=1,
+                 stale_timeout=600, retention_hours=24):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.retention_hours = retention_hours
+        self._queues = []
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            'received': 0,
+            'duplicates': 0,
+            'dropped': 0,
+            'processed': 0,
+            'failed': 0
+        }
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            queues = [queue.Queue(maxsize=self.max_queue_size) for _ in range(self.workers)]
+            threads = [
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(worker_queue,),
+                    name=f'telegram-webhook-{index}',
+                    daemon=True
+                )
+                for index, worker_queue in enumerate(queues)
+            ]
+            threads.append(threading.Thread(target=self._run_poller, name='telegram-webhook-poller', daemon=True))
+            self._queues = queues
+            for thread in threads:
+                thread.start()
+            self._threads = threads
+            logger.info(f"Telegram webhook dispatcher started with {self.workers} worker(s)")
+
+    @staticmethod
+    def _chat_key(update):
+        """Ключ чата для распределения по воркерам"""
+        callback_query = update.get('callback_query') or {}
+        message = update.get('message') or callback_query.get('message') or {}
+        chat_id = (message.get('chat') or {}).get('id')
+        return str(chat_id if chat_id is not None else update['update_id'])
+
+    def submit(self, update):
+        """Записать обновление для обработки.
+
+        Возвращает 'queued', 'duplicate' (update_id уже принят этим или другим
+        процессом) или 'dropped' (не удалось записать - Telegram доставит
+        обновление повторно).
+        """
+        update_id = update['update_id']
+        with self._lock:
+            self.stats['received'] += 1
+        try:
+            db.session.add(TelegramUpdate(update_id=update_id, payload=json.dumps(update)))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            with self._lock:
+                self.stats['duplicates'] += 1
+            return 'duplicate'
+        except Exception as e:
+            db.session.rollback()
+            with self._lock:
+                self.stats['dropped'] += 1
+            logger.error(f"Could not store Telegram update {update_id}: {e}")
+            return 'dropped'
+        self.wake()
+        return 'queued'
+
+    def wake(self):
+        """Разбудить обработку (после записи обновления). Вне владельца аренды ничего не делает"""
+        if not scheduler_leader.is_leader():
+            return
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _run_poller(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                if scheduler_leader.is_leader():
+                    with app_context():
+                        self.drain()
+            except Exception as e:
+                logger.error(f"Error draining Telegram updates: {e}", exc_info=True)
+
+    def drain(self):
+        """Забрать ожидающие обновления по порядку update_id и раздать воркерам. Возвращает число строк"""
+        total = 0
+        while scheduler_leader.is_leader():
+            update_ids = [update_id for (update_id,) in db.session.query(TelegramUpdate.update_id).filter_by(
+                status='pending'
+            ).order_by(TelegramUpdate.update_id).limit(self.batch_size)]
+            if not update_ids:
+                break
+            claim = uuid.uuid4().hex
+            TelegramUpdate.query.filter(
+                TelegramUpdate.update_id.in_(update_ids),
+                TelegramUpdate.status == 'pending'
+            ).update({'status': 'processing', 'claimed_by': claim, 'updated_at': datetime.utcnow()},
+                     synchronize_session=False)
+            db.session.commit()
+            rows = TelegramUpdate.query.filter_by(claimed_by=claim, status='processing').order_by(
+                TelegramUpdate.update_id).all()
+            for row in rows:
+                update = json.loads(row.payload)
+                # Блокирующая постановка: переполненная очередь чата притормаживает выборку
+                self._queues[zlib.crc32(self._chat_key(update).encode()) % len(self._queues)].put(update)
+            total += len(rows)
+            if len(update_ids) < self.batch_size:
+                break
+        return total
+
+    def _finish(self, update_id, status):
+        try:
+            TelegramUpdate.query.filter_by(update_id=update_id).update(
+                {'status': status, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Error updating Telegram update {update_id}: {e}")
+
+    def _run_worker(self, worker_queue):
+        while True:
+            update = worker_queue.get()
+            with app_context():
+                try:
+                    self.handler(update)
+                    status = 'done'
+                    with self._lock:
+                        self.stats['processed'] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    status = 'failed'
+                    with self._lock:
+                        self.stats['failed'] += 1
+                    logger.error(f"Error processing Telegram update {update.get('update_id')}: {e}", exc_info=True)
+                self._finish(update['update_id'], status)
+            worker_queue.task_done()
+
+    def maintain(self):
+        """Вернуть зависшие обновления в обработку и удалить старые (задача 'telegram-updates-maintenance')
+
+        Задача выполняется только во владельце аренды, поэтому здесь же
+        запускаются потоки обработки процесса, который перехватил аренду.
+        """
+        self._ensure_started()
+        now = datetime.utcnow()
+        recovered = TelegramUpdate.query.filter(
+            TelegramUpdate.status == 'processing',
+            TelegramUpdate.updated_at < now - timedelta(seconds=self.stale_timeout)
+        ).update({'status': 'pending', 'updated_at': now}, synchronize_session=False)
+        TelegramUpdate.query.filter(
+            TelegramUpdate.status.in_(('done', 'failed')),
+            TelegramUpdate.received_at < now - timedelta(hours=self.retention_hours)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if recovered:
+            logger.warning(f"Recovered {recovered} stale Telegram update(s)")
+        self._wakeup.set()
+        return recovered
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['workers'] = len(self._queues)
+            stats['queued'] = sum(q.qsize() for q in self._queues)
+        stats['rows'] = {
+            status: count for status, count in
+            db.session.query(TelegramUpdate.status, db.func.count(TelegramUpdate.update_id)).group_by(TelegramUpdate.status)
+        }
+        return stats
+
+telegram_updates = TelegramUpdateDispatcher(
+    process_telegram_update,
+    workers=int(os.environ.get('TELEGRAM_WEBHOOK_WORKERS', 4)),
+    max_queue_size=int(os.environ.get('TELEGRAM_WEBHOOK_QUEUE_SIZE', 1000)),
+    poll_interval=float(os.environ.get('TELEGRAM_WEBHOOK_POLL_INTERVAL', 1)),
+    retention_hours=int(os.environ.get('TELEGRAM_WEBHOOK_RETENTION_HOURS', 24))
+)
@@ -0,0 +1,8 @@
+"""
+WSGI точка входа для продакшен-режима:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()
@@ -194,189 +194,21 @@ async function getDetailedCameraStatsForBazaar(bazar) {
 
 async function exportToExcel() {
     try {
-        // Получаем данные статистики
-        const statsData = getCurrentStatsData();
-
-        if (!statsData) {
-            showNotification('Нет данных для экспорта', 'warning');
-            return;
-        }
-
-        // Создаем рабочую книгу Excel
-        const wb = XLSX.utils.book_new();
-
-        // Определяем язык для экспорта
+        // Отчет формируется на сервере и скачивается потоком:
+        // браузер не опрашивает базары и не собирает книгу в памяти
         const isUzbek = currentLang === 'uz';
+        const exportUrl = `${API_BASE_URL}/reports/export?format=xlsx&lang=${isUzbek ? 'uz' : 'ru'}`;
 
-        // Лист 1: Общая статистика
-        const overviewData = [
-            [isUzbek ? 'Ko\'rsatkich' : 'Показатель', isUzbek ? 'Qiymat' : 'Значение'],
-            [isUzbek ? 'Jami bozorlar' : 'Всего базаров', statsData.totalBazars || 0],
-            [isUzbek ? 'Onlayn' : 'Онлайн', statsData.onlineBazars || 0],
-            [isUzbek ? 'Oflayn' : 'Оффлайн', statsData.offlineBazars || 0],
-            [isUzbek ? 'Jami kameralar' : 'Всего камер', statsData.totalCameras || 0],
-            [isUzbek ? 'Ishlamoqda kameralar' : 'Работает камер', statsData.onlineCameras || 0],
-            [isUzbek ? 'Ishlamaydi kameralar' : 'Не работает камер', statsData.offlineCameras || 0],
-            [isUzbek ? 'Mavjudlik foizi' : 'Процент доступности', `${statsData.uptimePercentage || 0}%`]
-        ];
-
-        const ws1 = XLSX.utils.aoa_to_sheet(overviewData);
-        XLSX.utils.book_append_sheet(wb, ws1, isUzbek ? 'Bozor statistikasi' : 'Общая статистика');
-
-        // Лист 2: Детальная статистика по базарам
-        const detailedData = [
-            [
-                isUzbek ? 'Nom' : 'Название',
-                isUzbek ? 'Shahar' : 'Город',
-                isUzbek ? 'Status' : 'Статус',
-                isUzbek ? 'Jami kameralar' : 'Всего камер',
-                isUzbek ? 'Onlayn kameralar' : 'Онлайн камер',
-                isUzbek ? 'Oflayn kameralar' : 'Офлайн камер',
-                isUzbek ? 'Kameralar ROI bilan' : 'Камеры с ROI'
-            ]
-        ];
-
-        // Добавляем данные по каждому базару
-        if (statsData.bazars && Array.isArray(statsData.bazars)) {
-            // Получаем детальную статистику для каждого базара
-            const detailedStatsPromises = statsData.bazars.map(async (bazar) => {
-                const detailedCameraStats = await getDetailedCameraStatsForBazaar(bazar);
-                return {
-                    bazar,
-                    detailedCameraStats
-                };
-            });
-
-            const detailedStatsResults = await Promise.allSettled(detailedStatsPromises);
-
-            detailedStatsResults.forEach(result => {
-                if (result.status === 'fulfilled') {
-                    const { bazar, detailedCameraStats } = result.value;
-                    detailedData.push([
-                        bazar.name || '',
-                        bazar.city || '',
-                        bazar.status === 'online' ? (isUzbek ? 'Onlayn' : 'Онлайн') : (isUzbek ? 'Oflayn' : 'Оффлайн'),
-                        detailedCameraStats.totalCameras || 0,
-                        detailedCameraStats.onlineCameras || 0,
-                        detailedCameraStats.offlineCameras || 0,
-                        detailedCameraStats.camerasWithROI || 0
-                    ]);
-                } else {
-                    // Если не удалось получить детальную статистику, добавляем базовые данные
-                    const bazar = result.reason?.bazar || {};
-                    detailedData.push([
-                        bazar.name || '',
-                        bazar.city || '',
-                        bazar.status === 'online' ? (isUzbek ? 'Onlayn' : 'Онлайн') : (isUzbek ? 'Oflayn' : 'Оффлайн'),
-                        0,
-                        0,
-                        0,
-                        0
-                    ]);
-                }
-            });
-        }
-
-        const ws2 = XLSX.utils.aoa_to_sheet(detailedData);
-
-        // Styling function
-        const applyHeaderStyle = (ws) => {
-            const range = XLSX.utils.decode_range(ws['!ref']);
-            for (let C = range.s.c; C <= range.e.c; ++C) {
-                const address = XLSX.utils.encode_cell({ r: 0, c: C });
-                if (!ws[address]) continue;
-                ws[address].s = {
-                    font: { bold: true, color: { rgb: "FFFFFF" } },
-                    fill: { fgColor: { rgb: "4F81BD" } },
-                    alignment: { horizontal: "center", vertical: "center" },
-                    border: {
-                        top: { style: "thin", color: { auto: 1 } },
-                        bottom: { style: "thin", color: { auto: 1 } },
-                        left: { style: "thin", color: { auto: 1 } },
-                        right: { style: "thin", color: { auto: 1 } }
-                    }
-                };
-            }
-        };
-
-        const applyCellStyle = (ws) => {
-            const range = XLSX.utils.decode_range(ws['!ref']);
-            for (let R = range.s.r + 1; R <= range.e.r; ++R) {
-                for (let C = range.s.c; C <= range.e.c; ++C) {
-                    const address = XLSX.utils.encode_cell({ r: R, c: C });
-                    if (!ws[address]) continue;
-                    ws[address].s = {
-                        alignment: { horizontal: "center", vertical: "center" },
-                        border: {
-                            top: { style: "thin", color: { auto: 1 } },
-                            bottom: { style: "thin", color: { auto: 1 } },
-                            left: { style: "thin", color: { auto: 1 } },
-                            right: { style: "thin", color: { auto: 1 } }
-                        }
-                    };
-                }
-            }
-        };
-
-        // Apply styles
-        applyHeaderStyle(ws1);
-        applyCellStyle(ws1);
-        ws1['!cols'] = [{ wch: 30 }, { wch: 15 }];
-
-        applyHeaderStyle(ws2);
-        applyCellStyle(ws2);
-        ws2['!cols'] = [{ wch: 30 }, { wch: 20 }, { wch: 15 }, { wch: 15 }, { wch: 15 }, { wch: 15 }, { wch: 15 }];
-
-        XLSX.utils.book_append_sheet(wb, ws2, isUzbek ? 'Bozorlar statistika' : 'Статистика базаров');
-
-        // Лист 3: Статистика по областям
-        const regionsData = [
-            [
-                isUzbek ? 'Viloyat' : 'Область',
-                isUzbek ? 'Jami bozorlar' : 'Всего базаров',
-                isUzbek ? 'Onlayn' : 'Онлайн',
-                isUzbek ? 'Oflayn' : 'Оффлайн',
-                isUzbek ? 'Jami kameralar' : 'Всего камер',
-                isUzbek ? 'Ishlamoqda kameralar' : 'Работает камер'
-            ]
-        ];
-
-        if (statsData.regionsStats && Object.keys(statsData.regionsStats).length > 0) {
-            Object.entries(statsData.regionsStats).forEach(([region, stats]) => {
-                regionsData.push([
-                    region,
-                    stats.totalBazars || 0,
-                    stats.onlineBazars || 0,
-                    stats.offlineBazars || 0,
-                    stats.totalCameras || 0,
-                    stats.onlineCameras || 0
-                ]);
-            });
-        } else {
-            // Если нет данных по областям, добавляем информационную строку
-            regionsData.push([isUzbek ? 'Viloyatlar bo\'yicha ma\'lumot yo\'q' : 'Нет данных по областям', '', '', '', '', '']);
-        }
-
-        const ws3 = XLSX.utils.aoa_to_sheet(regionsData);
-        applyHeaderStyle(ws3);
-        applyCellStyle(ws3);
-        ws3['!cols'] = [{ wch: 25 }, { wch: 15 }, { wch: 15 }, { wch: 15 }, { wch: 15 }, { wch: 15 }];
-
-        XLSX.utils.book_append_sheet(wb, ws3, isUzbek ? 'Viloyatlar statistika' : 'Статистика областей');
-
-        // Генерируем имя файла с текущей датой и языком
-        const now = new Date();
-        const dateStr = now.toISOString().split('T')[0];
-        const timeStr = now.toTimeString().split(' ')[0].replace(/:/g, '-');
-        const langSuffix = isUzbek ? '_uz' : '_ru';
-        const fileName = `bazar_statistics_${dateStr}_${timeStr}${langSuffix}.xlsx`;
-
-        // Скачиваем файл
-        XLSX.writeFile(wb, fileName);
+        const link = document.createElement('a');
+        link.href = exportUrl;
+        link.download = '';
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
 
         const successMessage = isUzbek ?
-            'Statistika muvaffaqiyatli Excel fayliga eksport qilindi!' :
-            'Статистика успешно экспортирована в Excel!';
+            'Excel fayli yuklab olinmoqda...' :
+            'Загрузка Excel файла началась...';
         showNotification(successMessage, 'success');
 
     } catch (error) {
@@ -389,29 +221,6 @@ async function exportToExcel() {
     }
 }
 
-function getCurrentStatsData() {
-    // Получаем данные из текущего состояния приложения
-    const statsData = {
-        totalBazars: parseInt(document.getElementById('totalBazarsStats')?.textContent) || 0,
-        onlineBazars: parseInt(document.getElementById('onlineBazarsStats')?.textContent) || 0,
-        offlineBazars: parseInt(document.getElementById('offlineBazarsStats')?.textContent) || 0,
-        totalCameras: parseInt(document.getElementById('totalCamerasStats')?.textContent) || 0,
-        onlineCameras: parseInt(document.getElementById('onlineCamerasStats')?.textContent) || 0,
-        offlineCameras: parseInt(document.getElementById('offlineCamerasStats')?.textContent) || 0,
-        uptimePercentage: 0,
-        bazars: bazarsData || [],
-        regionsStats: currentRegionsStats || {}
-    };
-
-    // Вычисляем процент доступности
-    if (statsData.totalBazars > 0) {
-        statsData.uptimePercentage = Math.round((statsData.onlineBazars / statsData.totalBazars) * 100);
-    }
-
-    console.log('Export data:', statsData);
-    return statsData;
-}
-
 // ===============================================
 
 // Real-time clock